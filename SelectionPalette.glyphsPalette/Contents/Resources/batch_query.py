@@ -0,0 +1,141 @@
+# encoding: utf-8
+
+from __future__ import print_function
+import os
+from collections import deque, namedtuple
+from selection_core import Operation, topology_for, perform_selection
+from selection_reference import select_nodes_by_type
+from node_classifier import EXTREME_TOLERANCE, numpy_available, layer_italic_angle
+from node_filters import ROW_TYPES, preset_expression, topology_filter_mask
+
+#
+# Font-wide queries
+#
+# Runs the palette's node rows over many glyphs at once, e.g. from the Macro panel:
+#
+#   matches = list(find_nodes(Glyphs.font, [("sharp_nodes", "non_extremes")], workers=0))
+#   open_in_tab(Glyphs.font, matches)
+#
+# A query is a list of (row, filter) terms, and a node matches when every term selects it,
+# evaluated through the rows' filter expressions like a click on the palette.
+# With workers, the layers are snapshotted into plain data on the calling thread, a chunk
+# at a time, and evaluated in a process pool on stand-in layers rebuilt from that data.
+# Glyphs can't spawn worker processes of its embedded Python, so use workers=0 there to
+# evaluate the live layers in place; either way matches stream out as they are found.
+#
+
+NodeMatch = namedtuple("NodeMatch", ("glyphName", "masterId", "layerId", "indices"))
+
+# plain, picklable copy of what the classifier reads from a layer
+LayerData = namedtuple("LayerData", ("glyphName", "masterId", "layerId", "italicAngle", "pathOffsets", "closed", "types", "smooth", "x", "y"))
+
+def layer_data(glyphName, layer):
+	topology = topology_for(layer)
+	return LayerData(
+		glyphName,
+		layer.associatedMasterId,
+		layer.layerId,
+		layer_italic_angle(layer),
+		list(topology.pathOffsets),
+		[bool(closed) for closed in topology.closed],
+		list(topology.types),
+		[bool(smooth) for smooth in topology.smooth],
+		list(topology.x),
+		list(topology.y),
+	)
+
+def layer_from_data(data):
+	from selection_model import Node, Path, Layer, Master
+	paths = []
+	for pathIndex, closed in enumerate(data.closed):
+		first, end = data.pathOffsets[pathIndex], data.pathOffsets[pathIndex + 1]
+		nodes = [Node(data.types[i], data.x[i], data.y[i], data.smooth[i]) for i in range(first, end)]
+		paths.append(Path(nodes, closed=closed))
+	master = Master(id=data.masterId, italicAngle=data.italicAngle)
+	return Layer(paths=paths, master=master, layerId=data.layerId)
+
+# flat node indices (as in the layer's topology) that every term of the query selects
+def evaluate_query(layer, query, tolerance=EXTREME_TOLERANCE):
+	topology = topology_for(layer)
+	if not query or not len(topology):
+		return []
+	if numpy_available():
+		italicAngle = layer_italic_angle(layer)
+		mask = None
+		for row, typeFilter in query:
+			rowMask = topology_filter_mask(topology, preset_expression(row, typeFilter), tolerance, italicAngle)
+			mask = rowMask if mask is None else mask & rowMask
+		return mask.nonzero()[0].tolist()
+	matches = None
+	for row, typeFilter in query:
+		type, smooth = ROW_TYPES[row]
+		# exact, upright extremes only
+		indices = {topology.index_of(node) for node in select_nodes_by_type(layer, type, smooth, typeFilter)}
+		matches = indices if matches is None else matches & indices
+		if not matches:
+			return []
+	return sorted(matches)
+
+def iter_layers(font, glyphNames=None, masterLayersOnly=True):
+	glyphs = font.glyphs if glyphNames is None else (font.glyphs[name] for name in glyphNames)
+	for glyph in glyphs:
+		if glyph is None:
+			continue
+		for layer in glyph.layers:
+			if masterLayersOnly and layer.layerId != layer.associatedMasterId:
+				continue
+			yield glyph.name, layer
+
+def _evaluate_chunk(query, tolerance, chunk):
+	matches = []
+	for data in chunk:
+		indices = evaluate_query(layer_from_data(data), query, tolerance)
+		if indices:
+			matches.append(NodeMatch(data.glyphName, data.masterId, data.layerId, indices))
+	return matches
+
+def find_nodes(font, query, workers=None, chunkSize=32, tolerance=EXTREME_TOLERANCE, glyphNames=None, masterLayersOnly=True):
+	layers = iter_layers(font, glyphNames, masterLayersOnly)
+	if workers == 0:
+		for glyphName, layer in layers:
+			indices = evaluate_query(layer, query, tolerance)
+			if indices:
+				yield NodeMatch(glyphName, layer.associatedMasterId, layer.layerId, indices)
+		return
+
+	# multiprocessing is slow to import and only needed here
+	from concurrent.futures import ProcessPoolExecutor
+	workers = workers or os.cpu_count() or 1
+	with ProcessPoolExecutor(workers) as executor:
+		# only a few chunks in flight, so snapshots never pile up for a whole font
+		pending = deque()
+		chunk = []
+		for glyphName, layer in layers:
+			chunk.append(layer_data(glyphName, layer))
+			if len(chunk) == chunkSize:
+				pending.append(executor.submit(_evaluate_chunk, query, tolerance, chunk))
+				chunk = []
+				if len(pending) >= workers * 2:
+					for match in pending.popleft().result():
+						yield match
+		if chunk:
+			pending.append(executor.submit(_evaluate_chunk, query, tolerance, chunk))
+		while pending:
+			for match in pending.popleft().result():
+				yield match
+
+# select the matched nodes in their layers, one selection change per layer
+def apply_matches(font, matches, operation=Operation.ADD):
+	for match in matches:
+		layer = font.glyphs[match.glyphName].layers[match.layerId]
+		nodes = topology_for(layer).nodes
+		perform_selection(layer, [nodes[index] for index in match.indices], operation)
+
+def open_in_tab(font, matches):
+	names = []
+	for match in matches:
+		if match.glyphName not in names:
+			names.append(match.glyphName)
+	if names:
+		font.newTab("/" + "/".join(names))
+	return names
@@ -0,0 +1,179 @@
+# encoding: utf-8
+
+from __future__ import print_function
+import io
+import json
+import time
+import weakref
+from collections import OrderedDict, deque
+
+#
+# Command metrics
+#
+# Times every command and its phases (snapshot, classify, set algebra, commit), counts
+# the nodes it looked at and the elements it hit, and keeps the last ROLLING_WINDOW
+# timings per command for percentiles. Each finished command can be appended to a JSON
+# lines log, and profile_next() runs the next command under cProfile.
+# The engine marks its phases with metrics.phase(...), which costs next to nothing
+# when no command is being timed.
+#
+
+ROLLING_WINDOW = 200
+PERCENTILES = (50, 90, 99)
+PROFILE_LINES = 25
+
+PHASE_SNAPSHOT = "snapshot"
+PHASE_CLASSIFY = "classify"
+PHASE_SET_ALGEBRA = "set_algebra"
+PHASE_COMMIT = "commit"
+
+class _NullPhase(object):
+	def __enter__(self):
+		return self
+	def __exit__(self, *exc):
+		return False
+
+_nullPhase = _NullPhase()
+
+class _Phase(object):
+	__slots__ = ("run", "name", "start")
+
+	def __init__(self, run, name):
+		self.run = run
+		self.name = name
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		phases = self.run.phases
+		phases[self.name] = phases.get(self.name, 0.0) + time.perf_counter() - self.start
+		return False
+
+class CommandRun(object):
+	def __init__(self, metrics, name):
+		self.metrics = metrics
+		self.name = name
+		self.phases = OrderedDict()
+		self.counts = {}
+		self.total = None
+		self.profile = None
+
+	def __enter__(self):
+		self.metrics.current = self
+		if self.metrics._profileNext:
+			import cProfile
+			self.metrics._profileNext = False
+			self.profile = cProfile.Profile()
+			self.profile.enable()
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		self.total = time.perf_counter() - self.start
+		if self.profile is not None:
+			self.profile.disable()
+		self.metrics.current = None
+		self.metrics._finish(self)
+		return False
+
+	def count(self, key, number):
+		self.counts[key] = self.counts.get(key, 0) + number
+
+	def record(self):
+		return OrderedDict((
+			("command", self.name),
+			("time", time.time()),
+			("total_ms", round(self.total * 1000, 3)),
+			("phases_ms", OrderedDict((name, round(seconds * 1000, 3)) for name, seconds in self.phases.items())),
+			("counts", self.counts),
+		))
+
+class CommandMetrics(object):
+	def __init__(self, window=ROLLING_WINDOW):
+		self.window = window
+		self.logPath = None
+		self.current = None
+		self.last = None
+		self.timings = {}
+		self.profileOutput = None
+		self._profileNext = False
+		# weak references to callables called with each finished CommandRun, e.g. to
+		# refresh a readout; see add_listener
+		self.listeners = []
+
+	# `with metrics.command("grow_selection"):` around a command; nested commands are part
+	# of the outer one
+	def command(self, name):
+		if self.current is not None:
+			return _nullPhase
+		return CommandRun(self, name)
+
+	def phase(self, name):
+		if self.current is None:
+			return _nullPhase
+		return _Phase(self.current, name)
+
+	def count(self, key, number):
+		if self.current is not None:
+			self.current.count(key, number)
+
+	# listeners are held weakly, so a closed palette and its readout can go away; whoever
+	# adds one keeps it alive
+	def add_listener(self, listener):
+		if hasattr(listener, "__self__"):
+			self.listeners.append(weakref.WeakMethod(listener))
+		else:
+			self.listeners.append(weakref.ref(listener))
+
+	def profile_next(self):
+		self._profileNext = True
+
+	def _finish(self, run):
+		self.last = run
+		timings = self.timings.get(run.name)
+		if timings is None:
+			timings = self.timings[run.name] = deque(maxlen=self.window)
+		timings.append(run.total)
+		if run.profile is not None:
+			import pstats
+			output = io.StringIO()
+			pstats.Stats(run.profile, stream=output).sort_stats("cumulative").print_stats(PROFILE_LINES)
+			self.profileOutput = output.getvalue()
+			print(self.profileOutput)
+		if self.logPath:
+			with open(self.logPath, "a") as log:
+				log.write(json.dumps(run.record()) + "\n")
+		listeners = []
+		for reference in self.listeners:
+			listener = reference()
+			if listener is not None:
+				listeners.append(reference)
+				listener(run)
+		self.listeners = listeners
+
+	# {percentile: seconds} over the rolling window of a command
+	def percentiles(self, name, percentiles=PERCENTILES):
+		timings = sorted(self.timings.get(name, ()))
+		if not timings:
+			return {}
+		return {p: timings[min(len(timings) - 1, int(len(timings) * p / 100.0))] for p in percentiles}
+
+	def summary(self, name):
+		percentiles = self.percentiles(name)
+		return "%s: %d runs, %s" % (name, len(self.timings.get(name, ())), ", ".join("p%d %.1f ms" % (p, seconds * 1000) for p, seconds in sorted(percentiles.items())))
+
+	def report(self):
+		return "\n".join(self.summary(name) for name in sorted(self.timings))
+
+	# one line for the palette: the last command, its phases and its rolling median
+	def readout(self):
+		run = self.last
+		if run is None:
+			return ""
+		phases = " ".join("%s %.1f" % (name[:2], seconds * 1000) for name, seconds in run.phases.items())
+		return "%.1f ms (%s) p50 %.1f" % (run.total * 1000, phases, self.percentiles(run.name).get(50, 0) * 1000)
+
+# shared by every command of the palette
+metrics = CommandMetrics()
@@ -0,0 +1,216 @@
+# encoding: utf-8
+
+from __future__ import print_function
+from collections import namedtuple
+from selection_core import LINE, CURVE, OFFCURVE, topology_for
+import node_classifier
+from node_classifier import TYPE_CURVE, TYPE_OFFCURVE, numpy_available, packed_layer
+
+#
+# Contour metrics
+#
+# Per path: node count, signed area, bounding box (of the nodes, handles included) and
+# direction, computed for every path of a layer in one pass over the cached topology
+# arrays and cached with it. The area is exact for lines and cubic curves: the shoelace
+# sum over all nodes, plus a correction per cubic segment for how far the curve bulges
+# beyond its handles. It is positive for counter-clockwise paths, which Glyphs uses for
+# outer contours, and negative for counters; open paths count as if they were closed.
+# Areas are rounded to AREA_DIGITS decimals, so a flat contour, whose sum only cancels out
+# up to rounding error, has no area and is neither an outer contour nor a counter.
+#
+
+AREA_DIGITS = 6
+TINY_AREA = 100
+MAX_NODES = 100
+CONTOUR_FILTERS = ("all", "outer", "counters", "open", "tiny", "complex", "duplicates")
+
+PathMetrics = namedtuple("PathMetrics", ("nodeCount", "closed", "area", "xMin", "yMin", "xMax", "yMax"))
+
+# twice the area of a cubic segment beyond its control polygon, from the cross products
+# c01, c02, c03, c12, c13, c23 of its points (cij = xi * yj - xj * yi)
+_CUBIC_CORRECTION = (-2 / 5.0, 3 / 10.0, 1 / 10.0, -7 / 10.0, 3 / 10.0, -2 / 5.0)
+
+def _metrics_numpy(topology):
+	packed = packed_layer(topology)
+	np = node_classifier.np
+	x = packed.x
+	y = packed.y
+	types = packed.types
+	offsets = np.array(topology.pathOffsets, dtype=np.intp)
+	nodeCount = offsets[1:] - offsets[:-1]
+	pathCount = len(nodeCount)
+	pathIndex = np.repeat(np.arange(pathCount, dtype=np.intp), nodeCount)
+	area = np.zeros(pathCount)
+	bounds = [np.zeros(pathCount) for _ in range(4)]
+	nonEmpty = nodeCount > 0
+	if len(x):
+		# the shoelace over every path, closing it with its last edge
+		p1 = packed.cyclicNext
+		twice = np.bincount(pathIndex, weights=x * y[p1] - x[p1] * y, minlength=pathCount)
+
+		# cubics end on a curve node after two handles
+		p3 = np.flatnonzero((types == TYPE_CURVE) & (types[packed.cyclicPrev] == TYPE_OFFCURVE) & (types[packed.cyclicPrev[packed.cyclicPrev]] == TYPE_OFFCURVE))
+		if len(p3):
+			p2 = packed.cyclicPrev[p3]
+			p1 = packed.cyclicPrev[p2]
+			p0 = packed.cyclicPrev[p1]
+			points = (p0, p1, p2, p3)
+			cross = lambda i, j: x[points[i]] * y[points[j]] - x[points[j]] * y[points[i]]
+			c01, c02, c03, c12, c13, c23 = _CUBIC_CORRECTION
+			correction = c01 * cross(0, 1) + c02 * cross(0, 2) + c03 * cross(0, 3) + c12 * cross(1, 2) + c13 * cross(1, 3) + c23 * cross(2, 3)
+			twice += np.bincount(pathIndex[p3], weights=correction, minlength=pathCount)
+		area = np.round(twice / 2, AREA_DIGITS)
+
+		starts = offsets[:-1][nonEmpty]
+		for bound, reduce, values in zip(bounds, (np.minimum, np.minimum, np.maximum, np.maximum), (x, y, x, y)):
+			bound[nonEmpty] = reduce.reduceat(values, starts)
+	return PathMetrics(nodeCount.tolist(), list(topology.closed), area.tolist(), *(bound.tolist() for bound in bounds))
+
+def _metrics_python(topology):
+	x = topology.x
+	y = topology.y
+	types = topology.types
+	prev = topology.cyclicPrev
+	c01, c02, c03, c12, c13, c23 = _CUBIC_CORRECTION
+	metrics = PathMetrics([], list(topology.closed), [], [], [], [], [])
+	for pathIndex in range(len(topology.closed)):
+		first, end = topology.path_range(pathIndex)
+		metrics.nodeCount.append(end - first)
+		twice = 0
+		for i in range(first, end):
+			j = topology.cyclicNext[i]
+			twice += x[i] * y[j] - x[j] * y[i]
+			if types[i] == CURVE and types[prev[i]] == OFFCURVE and types[prev[prev[i]]] == OFFCURVE:
+				points = (prev[prev[prev[i]]], prev[prev[i]], prev[i], i)
+				cross = lambda a, b: x[points[a]] * y[points[b]] - x[points[b]] * y[points[a]]
+				twice += c01 * cross(0, 1) + c02 * cross(0, 2) + c03 * cross(0, 3) + c12 * cross(1, 2) + c13 * cross(1, 3) + c23 * cross(2, 3)
+		metrics.area.append(round(twice / 2.0, AREA_DIGITS))
+		pathX = x[first:end] or [0]
+		pathY = y[first:end] or [0]
+		metrics.xMin.append(min(pathX))
+		metrics.yMin.append(min(pathY))
+		metrics.xMax.append(max(pathX))
+		metrics.yMax.append(max(pathY))
+	return metrics
+
+def path_metrics(layer):
+	return topology_path_metrics(topology_for(layer))
+
+def topology_path_metrics(topology):
+	metrics = topology.cache.get("pathMetrics")
+	if metrics is None:
+		metrics = topology.cache["pathMetrics"] = _metrics_numpy(topology) if numpy_available() else _metrics_python(topology)
+	return metrics
+
+#
+# Duplicates
+#
+
+# a path's nodes as (x, y, kind), from the start node and in the direction that sort first,
+# so the same outline gives the same tuple however it was drawn. Closed paths can start at
+# any node, open ones only at either end. Reversing a path turns its curve nodes into
+# lines and back, so line and curve nodes both count as on-curve
+def _outline_key(topology, pathIndex):
+	first, end = topology.path_range(pathIndex)
+	nodes = [
+		(x, y, "oncurve" if type in (LINE, CURVE) else type)
+		for x, y, type in zip(topology.x[first:end], topology.y[first:end], topology.types[first:end])
+	]
+	candidates = []
+	for sequence in (nodes, nodes[::-1]):
+		if topology.closed[pathIndex]:
+			# only rotations starting at the smallest node can sort first
+			smallest = min(sequence)
+			candidates.extend(sequence[i:] + sequence[:i] for i, node in enumerate(sequence) if node == smallest)
+		else:
+			candidates.append(sequence)
+	return tuple(min(candidates))
+
+# paths that are the same as an earlier one (the same nodes in the same order, from any
+# start node and in either direction), which lie exactly on top of it
+def duplicate_paths(topology):
+	duplicates = topology.cache.get("duplicatePaths")
+	if duplicates is not None:
+		return duplicates
+	metrics = topology_path_metrics(topology)
+	# only paths with the same size, bounds and area can be the same
+	candidates = {}
+	for pathIndex, nodeCount in enumerate(metrics.nodeCount):
+		if nodeCount:
+			key = (nodeCount, metrics.closed[pathIndex], round(abs(metrics.area[pathIndex]), 3), metrics.xMin[pathIndex], metrics.yMin[pathIndex], metrics.xMax[pathIndex], metrics.yMax[pathIndex])
+			candidates.setdefault(key, []).append(pathIndex)
+	duplicates = []
+	for pathIndices in candidates.values():
+		if len(pathIndices) < 2:
+			continue
+		seen = set()
+		for pathIndex in pathIndices:
+			outline = _outline_key(topology, pathIndex)
+			if outline in seen:
+				duplicates.append(pathIndex)
+			else:
+				seen.add(outline)
+	duplicates.sort()
+	topology.cache["duplicatePaths"] = duplicates
+	return duplicates
+
+#
+# Selecting contours
+#
+
+# indices of the paths a contour row filter selects
+def contour_paths(topology, contourFilter, tinyArea=TINY_AREA, maxNodes=MAX_NODES):
+	if contourFilter == "duplicates":
+		return duplicate_paths(topology)
+	metrics = topology_path_metrics(topology)
+	closed = metrics.closed
+	area = metrics.area
+	if contourFilter == "all":
+		test = lambda p: True
+	elif contourFilter == "outer":
+		test = lambda p: closed[p] and area[p] > 0
+	elif contourFilter == "counters":
+		test = lambda p: closed[p] and area[p] < 0
+	elif contourFilter == "open":
+		test = lambda p: not closed[p]
+	elif contourFilter == "tiny":
+		test = lambda p: closed[p] and abs(area[p]) < tinyArea
+	elif contourFilter == "complex":
+		test = lambda p: metrics.nodeCount[p] > maxNodes
+	else:
+		return []
+	return [p for p, nodeCount in enumerate(metrics.nodeCount) if nodeCount and test(p)]
+
+def _path_node_indices(topology, pathIndices):
+	offsets = topology.pathOffsets
+	indices = []
+	for pathIndex in pathIndices:
+		indices.extend(range(offsets[pathIndex], offsets[pathIndex + 1]))
+	return indices
+
+# every node of the paths the filter selects
+def select_contours(layer, contourFilter, tinyArea=TINY_AREA, maxNodes=MAX_NODES):
+	topology = topology_for(layer)
+	nodes = topology.nodes
+	return [nodes[index] for index in _path_node_indices(topology, contour_paths(topology, contourFilter, tinyArea, maxNodes))]
+
+# every node of the paths that have a selected node
+def select_whole_contours(layer):
+	topology = topology_for(layer)
+	pathIndices = set()
+	for element in layer.selection:
+		index = topology.index_of(element)
+		if index is not None:
+			pathIndices.add(topology.pathIndex[index])
+	nodes = topology.nodes
+	return [nodes[index] for index in _path_node_indices(topology, sorted(pathIndices))]
+
+# the same over a whole font, as batch_query.NodeMatch per layer with matches; use
+# batch_query.apply_matches or open_in_tab with the result
+def find_contours(font, contourFilter, tinyArea=TINY_AREA, maxNodes=MAX_NODES, glyphNames=None, masterLayersOnly=True):
+	from batch_query import NodeMatch, iter_layers
+	for glyphName, layer in iter_layers(font, glyphNames, masterLayersOnly):
+		topology = topology_for(layer)
+		indices = _path_node_indices(topology, contour_paths(topology, contourFilter, tinyArea, maxNodes))
+		if indices:
+			yield NodeMatch(glyphName, layer.associatedMasterId, layer.layerId, indices)
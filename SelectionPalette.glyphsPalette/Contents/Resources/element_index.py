@@ -0,0 +1,288 @@
+# encoding: utf-8
+
+from __future__ import print_function
+import fnmatch
+import re
+from collections import OrderedDict, namedtuple
+from selection_core import Operation, CORNER, CAP, SEGMENT, PATH_COMPONENT_TYPES, replace_selection, perform_selection
+from selection_sets import SelectionSet
+from layer_snapshot import GuideRecord, snapshot_for
+
+#
+# Element indexes
+#
+# Lookups over a layer's non-node elements, built once per layer revision and cached on
+# its topology, so a command costs a lookup per selected element instead of a scan over
+# every element per selected element.
+#
+
+#
+# Hint links
+#
+
+# which corner components, caps and segments reference each node
+class HintLinks(object):
+	def __init__(self, hints):
+		self.hints = hints
+		self.hintIds = tuple(id(hint) for hint in hints)
+		self._byNode = {}
+		# keeps the nodes alive, so their ids stay theirs
+		self._nodes = []
+		for hint in hints:
+			if hint.type not in PATH_COMPONENT_TYPES:
+				continue
+			originNode = hint.originNode
+			targetNode = hint.targetNode
+			# a hint from a node to itself is linked to it once
+			for node in (originNode, targetNode) if targetNode is not originNode else (originNode,):
+				if node is None:
+					continue
+				linked = self._byNode.get(id(node))
+				if linked is None:
+					linked = self._byNode[id(node)] = []
+					self._nodes.append(node)
+				linked.append(hint)
+
+	# from a layer snapshot's hint records
+	@classmethod
+	def from_snapshot(cls, snapshot):
+		records = snapshot.hintRecords
+		return cls.from_indices(snapshot.hints, [record.type for record in records], [(record.originIndex, record.targetIndex) for record in records], snapshot.topology.nodes)
+
+	# from hints already resolved to node indices, [(originIndex, targetIndex), ...] with None
+	# for missing nodes: only reads Python lists, so it can run off the main thread
+	@classmethod
+	def from_indices(cls, hints, types, nodeIndices, nodes):
+		links = cls(())
+		links.hints = hints
+		links.hintIds = tuple(id(hint) for hint in hints)
+		for hint, type, (originIndex, targetIndex) in zip(hints, types, nodeIndices):
+			if type not in PATH_COMPONENT_TYPES:
+				continue
+			for index in (originIndex, targetIndex) if targetIndex != originIndex else (originIndex,):
+				if index is None:
+					continue
+				node = nodes[index]
+				linked = links._byNode.get(id(node))
+				if linked is None:
+					linked = links._byNode[id(node)] = []
+					links._nodes.append(node)
+				linked.append(hint)
+		return links
+
+	def hints_for(self, node):
+		return self._byNode.get(id(node), ())
+
+	# the selected elements that have hints, and those hints
+	def linked(self, selection):
+		linkedNodes = []
+		linkedHints = []
+		for element in selection:
+			hints = self._byNode.get(id(element))
+			if hints:
+				linkedNodes.append(element)
+				linkedHints.extend(hints)
+		return linkedNodes, linkedHints
+
+def hint_links_for(layer):
+	snapshot = snapshot_for(layer)
+	topology = snapshot.topology
+	links = topology.cache.get("hintLinks")
+	if links is None or links.hintIds != snapshot.ids[0]:
+		links = topology.cache["hintLinks"] = HintLinks.from_snapshot(snapshot)
+	return links
+
+# Transfers selection from nodes to their connected corner components, caps and segments.
+# With an operation, the nodes stay as they are and the linked hints are added to the
+# selection (ADD), removed from it (SUBTRACT) or become the whole selection (INTERSECT).
+def select_linked_hints(layer, operation=None):
+	result = linked_hints_result(layer, operation)
+	if result is not None:
+		replace_selection(layer, result)
+
+# the layer's selection after the transfer, None if it wouldn't change
+def linked_hints_result(layer, operation=None):
+	selection = SelectionSet(layer.selection)
+	linkedNodes, linkedHints = hint_links_for(layer).linked(selection)
+	if operation is None:
+		result = selection.difference(linkedNodes).union(linkedHints)
+	elif operation == Operation.ADD:
+		result = selection.union(linkedHints)
+	elif operation == Operation.SUBTRACT:
+		result = selection.difference(linkedHints)
+	elif operation == Operation.INTERSECT:
+		result = SelectionSet(linkedHints)
+	else:
+		return None
+	if result.list() == selection.list():
+		return None
+	return result
+
+#
+# Element partitions
+#
+# Anchors, components, path component hints and guides split up by every filter of their
+# palette row, so a row is a lookup instead of a scan with string tests per element. They
+# are made from the records of the layer's snapshot (see layer_snapshot) and live as long
+# as it does. Master guides change without a new layer revision, so their partitions are
+# keyed by the guides and their lock state.
+#
+
+def _anchor_parts(anchor):
+	name = anchor.name
+	yield "all"
+	yield "underscored_anchors" if name[:1] == "_" else "anchors"
+	name = name.lower()
+	if "entry" in name:
+		yield "entry"
+	if "exit" in name:
+		yield "exit"
+
+def _lock_parts(element):
+	yield "all"
+	yield "locked" if element.locked else "unlocked"
+
+_HINT_PARTS = {CORNER: "corners", CAP: "caps", SEGMENT: "segments"}
+
+def _hint_parts(hint):
+	part = _HINT_PARTS.get(hint.type)
+	if part is not None:
+		yield "all"
+		yield part
+
+# elements split up by what parts(record) yields for their records
+class Partitions(object):
+	def __init__(self, elements, records, parts):
+		self.elements = elements
+		self._parts = {}
+		for element, record in zip(elements, records):
+			for part in parts(record):
+				partition = self._parts.get(part)
+				if partition is None:
+					partition = self._parts[part] = []
+				partition.append(element)
+
+	# the elements a row filter selects, in layer order
+	def __getitem__(self, part):
+		return self._parts.get(part, ())
+
+class LayerElements(object):
+	def __init__(self, snapshot):
+		self.snapshot = snapshot
+		self.anchors = Partitions(snapshot.anchors, snapshot.anchorRecords, _anchor_parts)
+		self.components = Partitions(snapshot.components, snapshot.componentRecords, _lock_parts)
+		self.hints = Partitions(snapshot.hints, snapshot.hintRecords, _hint_parts)
+		self.guides = Partitions(snapshot.guides, snapshot.guideRecords, _lock_parts)
+		# anchor name: indices, and (pattern, regex): indices, made on first use
+		self._anchorNames = None
+		self._anchorPatterns = {}
+
+	# indices of the anchors whose name matches, see anchor_name_matcher
+	def anchors_named(self, pattern, regex=False):
+		indices = self._anchorPatterns.get((pattern, regex))
+		if indices is not None:
+			return indices
+		if self._anchorNames is None:
+			self._anchorNames = OrderedDict()
+			for index, anchor in enumerate(self.snapshot.anchorRecords):
+				self._anchorNames.setdefault(anchor.name, []).append(index)
+		if not regex and not _GLOB_CHARACTERS.search(pattern):
+			indices = self._anchorNames.get(pattern, [])
+		else:
+			matches = anchor_name_matcher(pattern, regex)
+			indices = sorted(index for name, nameIndices in self._anchorNames.items() if matches(name) for index in nameIndices)
+		self._anchorPatterns[(pattern, regex)] = indices
+		return indices
+
+def layer_elements_for(layer):
+	snapshot = snapshot_for(layer)
+	topology = snapshot.topology
+	elements = topology.cache.get("elements")
+	if elements is None or elements.snapshot is not snapshot:
+		elements = topology.cache["elements"] = LayerElements(snapshot)
+	return elements
+
+MASTER_GUIDES_CACHE_SIZE = 16
+_masterGuides = OrderedDict()
+
+def master_guide_partitions(guides):
+	guides = list(guides)
+	key = tuple((id(guide), bool(guide.locked)) for guide in guides)
+	partitions = _masterGuides.get(key)
+	if partitions is None:
+		# the entry holds on to the guides, so their ids can't be reused
+		partitions = _masterGuides[key] = Partitions(guides, [GuideRecord(locked) for guideId, locked in key], _lock_parts)
+		while len(_masterGuides) > MASTER_GUIDES_CACHE_SIZE:
+			_masterGuides.popitem(last=False)
+	else:
+		_masterGuides.move_to_end(key)
+	return partitions
+
+#
+# Rows
+#
+# The palette's non-node rows; selection_reference has the loops they replace.
+#
+
+def select_anchors(layer, typeFilter):
+	return list(layer_elements_for(layer).anchors[typeFilter])
+
+def select_components(layer, typeFilter):
+	return list(layer_elements_for(layer).components[typeFilter])
+
+def select_path_components(layer, typeFilter):
+	return list(layer_elements_for(layer).hints[typeFilter])
+
+# global guides live on the master, local guides on the layer
+def select_guides(layer, globalGuides, typeFilter):
+	globalPartitions = master_guide_partitions(globalGuides)
+	localPartitions = layer_elements_for(layer).guides
+	if typeFilter == "global":
+		return list(globalPartitions["all"])
+	if typeFilter == "local":
+		return list(localPartitions["all"])
+	return list(globalPartitions[typeFilter]) + list(localPartitions[typeFilter])
+
+#
+# Anchor names
+#
+
+_GLOB_CHARACTERS = re.compile(r"[*?\[]")
+
+# a function telling whether an anchor name matches: a glob like "_top" or "*.alt" (the
+# whole name), or a regular expression (anywhere in the name unless anchored)
+def anchor_name_matcher(pattern, regex=False):
+	if regex:
+		return re.compile(pattern).search
+	return re.compile(fnmatch.translate(pattern)).match
+
+# "/…/" is a regular expression, anything else a glob; returns (pattern, regex)
+def parse_anchor_pattern(text):
+	text = text.strip()
+	if len(text) > 1 and text.startswith("/") and text.endswith("/"):
+		return text[1:-1], True
+	return text, False
+
+def select_anchors_named(layer, pattern, regex=False):
+	elements = layer_elements_for(layer)
+	anchors = elements.anchors.elements
+	return [anchors[index] for index in elements.anchors_named(pattern, regex)]
+
+AnchorMatch = namedtuple("AnchorMatch", ("glyphName", "masterId", "layerId", "indices"))
+
+# the anchors named like `pattern` in every (master) layer of the font, as an AnchorMatch
+# per layer that has any; use apply_anchor_matches, or batch_query.open_in_tab with the result
+def find_anchors(font, pattern, regex=False, glyphNames=None, masterLayersOnly=True):
+	from batch_query import iter_layers
+	# an invalid expression fails here rather than on the first layer with anchors
+	anchor_name_matcher(pattern, regex)
+	for glyphName, layer in iter_layers(font, glyphNames, masterLayersOnly):
+		indices = layer_elements_for(layer).anchors_named(pattern, regex)
+		if indices:
+			yield AnchorMatch(glyphName, layer.associatedMasterId, layer.layerId, list(indices))
+
+def apply_anchor_matches(font, matches, operation=Operation.ADD):
+	for match in matches:
+		layer = font.glyphs[match.glyphName].layers[match.layerId]
+		anchors = layer_elements_for(layer).anchors.elements
+		perform_selection(layer, [anchors[index] for index in match.indices], operation)
@@ -0,0 +1,114 @@
+# encoding: utf-8
+
+from __future__ import print_function
+from selection_core import topology_for, topologyStats, selection_result
+from selection_transactions import transactions
+from command_metrics import metrics, PHASE_SNAPSHOT, PHASE_CLASSIFY, PHASE_SET_ALGEBRA, PHASE_COMMIT
+
+#
+# Layer sets
+#
+# Runs a selection command on several layers at once: the layers selected in the Edit
+# view, every master of the current glyph or everything in the current tab. Each layer is
+# evaluated from its own cached topology and all new selections are committed together,
+# with interface updates held back until the last one. Across compatible masters a
+# node row that only looks at node types and path structure runs on the first layer only
+# and its nodes are mapped to the others by index; every other command, and anything that
+# reads the selection or node positions, runs on each layer with that layer's own selection.
+#
+
+SCOPE_CURRENT = "current"
+SCOPE_SELECTED_LAYERS = "selected_layers"
+SCOPE_MASTERS = "masters"
+SCOPE_TAB = "tab"
+SCOPES = (SCOPE_CURRENT, SCOPE_SELECTED_LAYERS, SCOPE_MASTERS, SCOPE_TAB)
+
+def _unique_layers(layers):
+	seen = set()
+	unique = []
+	for layer in layers:
+		# skip line breaks and other placeholders in the Edit view
+		if layer is None or not hasattr(layer, "paths") or id(layer) in seen:
+			continue
+		seen.add(id(layer))
+		unique.append(layer)
+	return unique
+
+# the layers a command applies to, the current layer first
+def scope_layers(font, scope=SCOPE_CURRENT):
+	selectedLayers = list(font.selectedLayers or ())
+	if not selectedLayers:
+		return []
+	current = selectedLayers[0]
+	if scope == SCOPE_SELECTED_LAYERS:
+		return _unique_layers(selectedLayers)
+	if scope == SCOPE_MASTERS:
+		glyph = current.parent
+		masterLayers = [layer for layer in glyph.layers if layer.layerId == layer.associatedMasterId]
+		return _unique_layers([current] + masterLayers)
+	if scope == SCOPE_TAB:
+		tab = getattr(font, "currentTab", None)
+		tabLayers = list(tab.layers) if tab is not None else []
+		return _unique_layers([current] + tabLayers)
+	return [current]
+
+# same paths, same node counts, types and smooth flags: node indices mean the same thing
+# in both layers
+def outline_signature(topology):
+	signature = topology.cache.get("signature")
+	if signature is None:
+		signature = topology.cache["signature"] = (tuple(topology.pathOffsets), bytes(topology.closed), tuple(topology.types), bytes(topology.smooth))
+	return signature
+
+def are_compatible(layer, otherLayer):
+	return outline_signature(topology_for(layer)) == outline_signature(topology_for(otherLayer))
+
+# the nodes at the same indices in another layer; None if the layers aren't compatible or
+# the elements aren't all nodes
+def map_nodes(layer, nodes, otherLayer):
+	if not are_compatible(layer, otherLayer):
+		return None
+	topology = topology_for(layer)
+	otherNodes = topology_for(otherLayer).nodes
+	mapped = []
+	for node in nodes:
+		index = topology.index_of(node)
+		if index is None:
+			return None
+		mapped.append(otherNodes[index])
+	return mapped
+
+# new selections of several layers as one batch: a single interface update for all of them.
+# The old selections go onto the selection history, unless this is an undo or redo
+def commit_selections(changes, font=None, record=True):
+	with metrics.phase(PHASE_COMMIT):
+		transactions.commit(changes, font, record)
+
+# selector(layer) returns the elements to add, subtract or intersect with in that layer.
+# mirror is only for selectors that pick the same node indices in every compatible layer
+# whatever is selected; the others run on every layer
+def run_on_layers(layers, selector, operation, mirror=False, font=None):
+	changes = []
+	sourceLayer = None
+	sourceElements = None
+	for layer in layers:
+		with metrics.phase(PHASE_SNAPSHOT):
+			reused = topologyStats["reused"]
+			topology = topology_for(layer)
+			metrics.count("nodes", len(topology))
+			if topologyStats["reused"] > reused:
+				metrics.count("bridgeReadsSaved", topology.bridgeReads)
+			if topology.cache.get("precomputed"):
+				metrics.count("precomputed", 1)
+		with metrics.phase(PHASE_CLASSIFY):
+			elements = None
+			if mirror and sourceLayer is not None:
+				elements = map_nodes(sourceLayer, sourceElements, layer)
+			if elements is None:
+				elements = selector(layer)
+				if sourceLayer is None:
+					sourceLayer, sourceElements = layer, elements
+		metrics.count("hits", len(elements))
+		with metrics.phase(PHASE_SET_ALGEBRA):
+			changes.append((layer, selection_result(layer, elements, operation)))
+	commit_selections(changes, font)
@@ -0,0 +1,163 @@
+# encoding: utf-8
+
+from __future__ import print_function
+import sys
+from selection_core import topology_for, topologyStats
+
+#
+# Layer snapshots
+#
+# Everything the commands read from a layer, read across the PyObjC bridge once per layer
+# revision: the outline as the layer's topology (typed arrays, see selection_core), and a
+# small __slots__ record per hint, anchor, component and guide with just the fields the
+# commands look at. Commands filter, index and compare records; the live objects are only
+# kept in the snapshot's element lists, in the same order as the records, to hand a result
+# back to the layer's selection when it is committed.
+#
+# A snapshot lives in its topology's cache, so an edit to the outline replaces it. Elements
+# can change without touching the outline, so it is also replaced when the layer's element
+# lists no longer hold the same objects, or when an anchor or component is renamed, moved,
+# locked or unlocked, or a guide is locked or unlocked. Those fields are read again on
+# every reuse; what reuse saves is the hint reads and building the records.
+#
+
+# attribute reads per hint (type, originNode, targetNode), anchor (name, position),
+# component (locked, position) and guide (locked), and the layer's four element lists
+HINT_READS = 3
+ANCHOR_READS = 2
+COMPONENT_READS = 2
+GUIDE_READS = 1
+LIST_READS = 4
+
+class HintRecord(object):
+	__slots__ = ("type", "originIndex", "targetIndex")
+
+	def __init__(self, type, originIndex, targetIndex):
+		self.type = type
+		# flat node indices in the topology, None for no node or one on another layer
+		self.originIndex = originIndex
+		self.targetIndex = targetIndex
+
+class AnchorRecord(object):
+	__slots__ = ("name", "x", "y")
+
+	def __init__(self, name, x, y):
+		self.name = name
+		self.x = x
+		self.y = y
+
+class ComponentRecord(object):
+	__slots__ = ("locked", "x", "y")
+
+	def __init__(self, locked, x, y):
+		self.locked = locked
+		self.x = x
+		self.y = y
+
+class GuideRecord(object):
+	__slots__ = ("locked",)
+
+	def __init__(self, locked):
+		self.locked = locked
+
+def _node_index(topology, node):
+	return None if node is None else topology.index_of(node)
+
+def _ids(elements):
+	return tuple(id(element) for element in elements)
+
+def _anchor_fields(anchor):
+	position = anchor.position
+	return (anchor.name, position.x, position.y)
+
+def _component_fields(component):
+	position = component.position
+	return (bool(component.locked), position.x, position.y)
+
+class LayerSnapshot(object):
+	__slots__ = (
+		"topology", "hints", "anchors", "components", "guides",
+		"hintRecords", "anchorRecords", "componentRecords", "guideRecords",
+		"ids", "fields", "elementReads",
+	)
+
+	def __init__(self, topology, hints, anchors, components, guides):
+		self.topology = topology
+		self.hints = hints
+		self.anchors = anchors
+		self.components = components
+		self.guides = guides
+		self.hintRecords = [HintRecord(hint.type, _node_index(topology, hint.originNode), _node_index(topology, hint.targetNode)) for hint in hints]
+		anchorFields = [_anchor_fields(anchor) for anchor in anchors]
+		componentFields = [_component_fields(component) for component in components]
+		guideFields = [bool(guide.locked) for guide in guides]
+		self.anchorRecords = [AnchorRecord(*fields) for fields in anchorFields]
+		self.componentRecords = [ComponentRecord(*fields) for fields in componentFields]
+		self.guideRecords = [GuideRecord(locked) for locked in guideFields]
+		# the snapshot holds on to the elements, so their ids stay theirs
+		self.ids = (_ids(hints), _ids(anchors), _ids(components), _ids(guides))
+		# everything the records hold, to check the snapshot against the layer
+		self.fields = (anchorFields, componentFields, guideFields)
+		self.elementReads = LIST_READS + HINT_READS * len(hints) + ANCHOR_READS * len(anchors) + COMPONENT_READS * len(components) + GUIDE_READS * len(guides)
+
+	def matches(self, hints, anchors, components, guides):
+		if self.ids != (_ids(hints), _ids(anchors), _ids(components), _ids(guides)):
+			return False
+		anchorFields, componentFields, guideFields = self.fields
+		return (
+			anchorFields == [_anchor_fields(anchor) for anchor in anchors]
+			and componentFields == [_component_fields(component) for component in components]
+			and guideFields == [bool(guide.locked) for guide in guides]
+		)
+
+	# bridge reads to check the snapshot against the layer
+	@property
+	def checkReads(self):
+		return LIST_READS + ANCHOR_READS * len(self.anchors) + COMPONENT_READS * len(self.components) + GUIDE_READS * len(self.guides)
+
+	@property
+	def bridgeReads(self):
+		return self.topology.bridgeReads + self.elementReads
+
+	# bytes held by the snapshot and its topology, not counting the live objects or caches
+	def footprint(self):
+		size = self.topology.footprint()
+		for records in (self.hintRecords, self.anchorRecords, self.componentRecords, self.guideRecords):
+			size += sys.getsizeof(records) + sum(sys.getsizeof(record) for record in records)
+		for elements in (self.hints, self.anchors, self.components, self.guides):
+			size += sys.getsizeof(elements)
+		return size
+
+# snapshots built and reused, and the bridge reads for elements the reuses didn't make
+snapshotStats = {"built": 0, "reused": 0, "readsSaved": 0}
+
+SNAPSHOT_KEY = "snapshot"
+
+def snapshot_for(layer):
+	topology = topology_for(layer)
+	current = (list(layer.hints), list(layer.anchors), list(layer.components), list(layer.guides))
+	snapshot = topology.cache.get(SNAPSHOT_KEY)
+	if snapshot is None or not snapshot.matches(*current):
+		snapshot = topology.cache[SNAPSHOT_KEY] = LayerSnapshot(topology, *current)
+		snapshotStats["built"] += 1
+	else:
+		snapshotStats["reused"] += 1
+		snapshotStats["readsSaved"] += snapshot.elementReads - snapshot.checkReads
+	return snapshot
+
+# the layer's snapshot in a line, and how many bridge reads reusing snapshots saved so far
+def snapshot_report(layer=None):
+	lines = []
+	if layer is not None:
+		snapshot = snapshot_for(layer)
+		nodeCount = len(snapshot.topology)
+		footprint = snapshot.footprint()
+		lines.append("%d nodes, %d hints, %d anchors, %d components, %d guides: %d bridge reads per snapshot, %.1f KB (%.1f bytes per node)" % (
+			nodeCount, len(snapshot.hints), len(snapshot.anchors), len(snapshot.components), len(snapshot.guides),
+			snapshot.bridgeReads, footprint / 1024.0, footprint / float(nodeCount or 1),
+		))
+	lines.append("outlines read %d times, reused %d times; elements read %d times, reused %d times; %d bridge reads saved" % (
+		topologyStats["built"], topologyStats["reused"], snapshotStats["built"], snapshotStats["reused"],
+		topologyStats["readsSaved"] + snapshotStats["readsSaved"],
+	))
+	return "\n".join(lines)
@@ -0,0 +1,117 @@
+# encoding: utf-8
+
+from __future__ import print_function
+import zlib
+from array import array
+from selection_core import topology_for
+from selection_history import OTHER_ELEMENTS, SelectionSnapshot, snapshot_selection, snapshot_elements
+
+#
+# Named selections
+#
+# Selections saved under a name in the layer's userData, so they survive with the font.
+# Each one is stored as text: node index runs ("0:12,40:41", half-open), the indices of
+# selected anchors, components, hints and guides, and a fingerprint of the outline
+# structure (node count, path lengths, closed flags and node types) it was saved on.
+# Node positions aren't part of the fingerprint, so a saved selection still applies after
+# nodes were moved, and to every compatible master by index; once a path or node is added,
+# removed or changes type, the fingerprint no longer matches and the selection is stale.
+#
+
+USERDATA_KEY = "com.DanielGamage.SelectionPalette.namedSelections"
+OUTLINE_KEY = "outline"
+NODES_KEY = "nodes"
+
+def outline_fingerprint(topology):
+	fingerprint = topology.cache.get("outlineFingerprint")
+	if fingerprint is None:
+		pathOffsets = topology.pathOffsets
+		structure = ";".join(
+			"%d%s" % (pathOffsets[p + 1] - pathOffsets[p], "c" if closed else "o")
+			for p, closed in enumerate(topology.closed)
+		) + "|" + ",".join(str(type) for type in topology.types)
+		fingerprint = topology.cache["outlineFingerprint"] = "%d/%08x" % (len(topology), zlib.crc32(structure.encode("utf-8")) & 0xffffffff)
+	return fingerprint
+
+def encode_runs(runs):
+	return ",".join("%d:%d" % (runs[i], runs[i + 1]) for i in range(0, len(runs), 2))
+
+def decode_runs(text):
+	runs = array("l")
+	for run in text.split(",") if text else ():
+		start, stop = run.split(":")
+		runs.append(int(start))
+		runs.append(int(stop))
+	return runs
+
+def encode_indices(indices):
+	return ",".join(str(index) for index in indices)
+
+def decode_indices(text):
+	return array("l", (int(index) for index in text.split(","))) if text else array("l")
+
+# name: stored selection, straight from userData
+def named_selections(layer):
+	userData = getattr(layer, "userData", None)
+	if userData is None:
+		return {}
+	return userData[USERDATA_KEY] or {}
+
+def named_selection_names(layer):
+	return sorted(named_selections(layer).keys())
+
+def _store(layer, selections):
+	# userData only notices a new value, not changes inside the stored dict
+	if selections:
+		layer.userData[USERDATA_KEY] = selections
+	else:
+		del layer.userData[USERDATA_KEY]
+
+def encode_selection(layer):
+	snapshot = snapshot_selection(layer)
+	stored = {
+		OUTLINE_KEY: outline_fingerprint(topology_for(layer)),
+		NODES_KEY: encode_runs(snapshot.runs),
+	}
+	for kind, indices in snapshot.others:
+		stored[kind] = encode_indices(indices)
+	return stored
+
+# saves the layer's current selection as `name`, and the same nodes by index in each of
+# `otherLayers` with the same outline structure; returns the layers it was saved on
+def save_named_selection(layer, name, otherLayers=()):
+	stored = encode_selection(layer)
+	saved = []
+	for targetLayer in [layer] + [other for other in otherLayers if other is not layer]:
+		if targetLayer is not layer and outline_fingerprint(topology_for(targetLayer)) != stored[OUTLINE_KEY]:
+			continue
+		selections = dict(named_selections(targetLayer))
+		selections[name] = dict(stored)
+		_store(targetLayer, selections)
+		saved.append(targetLayer)
+	return saved
+
+def delete_named_selection(layer, name):
+	selections = dict(named_selections(layer))
+	if selections.pop(name, None) is not None:
+		_store(layer, selections)
+		return True
+	return False
+
+# whether the outline changed since the selection was saved; None if there is no such selection
+def is_stale(layer, name, stored=None):
+	stored = stored or named_selections(layer).get(name)
+	if stored is None:
+		return None
+	return stored.get(OUTLINE_KEY) != outline_fingerprint(topology_for(layer))
+
+# the elements of a saved selection, looked up in `layer` or else in `sourceLayer`;
+# None if neither has it or it's stale
+def named_selection_elements(layer, name, sourceLayer=None):
+	stored = named_selections(layer).get(name)
+	if stored is None and sourceLayer is not None:
+		stored = named_selections(sourceLayer).get(name)
+	if stored is None or is_stale(layer, name, stored):
+		return None
+	others = tuple((kind, decode_indices(stored[kind])) for kind, getter in OTHER_ELEMENTS if stored.get(kind))
+	return snapshot_elements(layer, SelectionSnapshot(None, decode_runs(stored.get(NODES_KEY)), others))
@@ -0,0 +1,281 @@
+# encoding: utf-8
+
+from __future__ import print_function
+import threading
+from math import atan2, pi, radians, tan
+from collections import OrderedDict
+from selection_core import LINE, CURVE, TYPE_LINE, TYPE_CURVE, TYPE_OFFCURVE, TYPE_OTHER, TYPE_CODES, topology_for
+from selection_reference import select_nodes_by_type
+
+# numpy is by far the heaviest import here, so it's only imported once a node row is used.
+# It isn't bundled with every Glyphs Python; without it classify_nodes() falls back to the
+# reference loop.
+np = None
+_numpyChecked = False
+
+def numpy_available():
+	global np, _numpyChecked
+	if not _numpyChecked:
+		_numpyChecked = True
+		try:
+			import numpy
+			np = numpy
+		except ImportError:
+			np = None
+	return np is not None
+
+#
+# Vectorized node classifier
+#
+# Packs a layer's cached topology into NumPy arrays once, then answers the smooth/sharp/line/handle
+# rows with whole-array masks instead of a Python loop with sibling lookups per node.
+# Results are identical to selection_reference.select_nodes_by_type, except that they come back
+# in outline order without duplicates.
+#
+
+class PackedLayer(object):
+	def __init__(self, topology):
+		count = len(topology)
+		self.nodes = topology.nodes
+		# views of the topology's typed arrays, not copies
+		self.types = np.frombuffer(topology.typeCodes, dtype=np.int8)
+		self.smooth = np.frombuffer(topology.smooth, dtype=bool)
+		self.x = np.frombuffer(topology.x, dtype=np.float64)
+		self.y = np.frombuffer(topology.y, dtype=np.float64)
+		pathOffsets = np.array(topology.pathOffsets, dtype=np.intp)
+		nonEmpty = pathOffsets[1:] > pathOffsets[:-1]
+		self.firsts = pathOffsets[:-1][nonEmpty]
+		self.lasts = pathOffsets[1:][nonEmpty] - 1
+		pathClosed = np.frombuffer(topology.closed, dtype=bool)[nonEmpty]
+		self.closed = np.repeat(pathClosed, self.lasts - self.firsts + 1)
+
+		index = np.arange(count, dtype=np.intp)
+		self.isEnd = np.zeros(count, dtype=bool)
+		self.isEnd[self.firsts] = True
+		self.isEnd[self.lasts] = True
+
+		# siblings that wrap around every path, like node.prevNode/nextNode
+		self.cyclicPrev = np.roll(index, 1)
+		self.cyclicPrev[self.firsts] = self.lasts
+		self.cyclicNext = np.roll(index, -1)
+		self.cyclicNext[self.lasts] = self.firsts
+
+		# siblings that stop at the ends of open paths, like selection_reference.get_sibling
+		openFirsts = self.firsts[~pathClosed]
+		openLasts = self.lasts[~pathClosed]
+		self.prev = self.cyclicPrev.copy()
+		self.prev[openFirsts] = openFirsts
+		self.next = self.cyclicNext.copy()
+		self.next[openLasts] = openLasts
+
+	def __len__(self):
+		return len(self.nodes)
+
+	def elements(self, mask):
+		nodes = self.nodes
+		return [nodes[i] for i in np.flatnonzero(mask)]
+
+def packed_layer(topology):
+	numpy_available()
+	packed = topology.cache.get("packed")
+	if packed is None:
+		packed = topology.cache["packed"] = PackedLayer(topology)
+	return packed
+
+#
+# Extremes
+#
+# An on-curve node is an extreme when the handles on both sides of it point the same way
+# along an axis, and a handle is one when it and its on-curve node do. The reference rule
+# compares the angles with ==; here `tolerance` (in degrees) can allow for rounding, and
+# italic masters are deslanted by their italic angle first, so handles parallel to the
+# italic axis count as vertical. With tolerance=0 and italicAngle=0 the result is exactly
+# selection_reference.is_node_extreme.
+#
+
+# exact by default; the palette reads its tolerance from the extremeTolerance default
+EXTREME_TOLERANCE = 0
+
+def extreme_mask(packed, tolerance=0, italicAngle=0, indices=None):
+	types = packed.types
+	prev = packed.cyclicPrev
+	next = packed.cyclicNext
+	if indices is None:
+		indices = np.arange(len(types), dtype=np.intp)
+	onCurve = (types == TYPE_LINE) | (types == TYPE_CURVE)
+	offCurve = types == TYPE_OFFCURVE
+	nodePrev = prev[indices]
+	nodeNext = next[indices]
+
+	# an on-curve node between handles, or a handle and the on-curve node it belongs to
+	throughNode = onCurve[indices] & (offCurve[nodePrev] | offCurve[nodeNext])
+	afterNode = ~throughNode & offCurve[indices] & onCurve[nodePrev]
+	beforeNode = ~throughNode & offCurve[indices] & ~onCurve[nodePrev] & onCurve[nodeNext]
+
+	node1 = np.where(throughNode, nodePrev, np.where(afterNode, prev[nodePrev], indices))
+	node2 = np.where(afterNode, nodePrev, np.where(beforeNode, nodeNext, indices))
+	node3 = np.where(throughNode, nodeNext, np.where(beforeNode, next[nodeNext], indices))
+
+	x = packed.x
+	y = packed.y
+	if italicAngle:
+		x = x - y * np.tan(np.radians(italicAngle))
+	angle1 = np.arctan2(y[node2] - y[node1], x[node2] - x[node1]) * 180 / np.pi
+	angle2 = np.arctan2(y[node3] - y[node2], x[node3] - x[node2]) * 180 / np.pi
+	if tolerance:
+		turn = np.abs(np.mod(angle2 - angle1 + 180, 360) - 180)
+		offAxis = np.abs(np.mod(angle1 + 45, 90) - 45)
+		isExtreme = (turn <= tolerance) & (offAxis <= tolerance)
+	else:
+		isExtreme = (angle1 == angle2) & (np.mod(angle1 + 360, 90) == 0)
+	return (throughNode | afterNode | beforeNode) & isExtreme
+
+# the same rule without numpy, as a flag per node of the topology
+def extreme_flags(topology, tolerance=0, italicAngle=0):
+	types = topology.typeCodes
+	prev = topology.cyclicPrev
+	next = topology.cyclicNext
+	x = topology.x
+	y = topology.y
+	if italicAngle:
+		slant = tan(radians(italicAngle))
+		x = [nodeX - nodeY * slant for nodeX, nodeY in zip(x, y)]
+	onCurve = (TYPE_LINE, TYPE_CURVE)
+	flags = []
+	for index, type in enumerate(types):
+		nodePrev = prev[index]
+		nodeNext = next[index]
+		# an on-curve node between handles, or a handle and the on-curve node it belongs to
+		if type in onCurve and (types[nodePrev] == TYPE_OFFCURVE or types[nodeNext] == TYPE_OFFCURVE):
+			node1, node2, node3 = nodePrev, index, nodeNext
+		elif type == TYPE_OFFCURVE and types[nodePrev] in onCurve:
+			node1, node2, node3 = prev[nodePrev], nodePrev, index
+		elif type == TYPE_OFFCURVE and types[nodeNext] in onCurve:
+			node1, node2, node3 = index, nodeNext, next[nodeNext]
+		else:
+			flags.append(False)
+			continue
+		angle1 = atan2(y[node2] - y[node1], x[node2] - x[node1]) * 180 / pi
+		angle2 = atan2(y[node3] - y[node2], x[node3] - x[node2]) * 180 / pi
+		if tolerance:
+			turn = abs((angle2 - angle1 + 180) % 360 - 180)
+			offAxis = abs((angle1 + 45) % 90 - 45)
+			flags.append(turn <= tolerance and offAxis <= tolerance)
+		else:
+			flags.append(angle1 == angle2 and (angle1 + 360) % 90 == 0)
+	return flags
+
+# extreme flags of a path only depend on its own nodes, so they are cached by path content:
+# after an edit only the paths that actually changed are recomputed
+PATH_EXTREMES_CACHE_SIZE = 100000
+_pathExtremes = OrderedDict()
+# the idle-time precompute fills it from a worker thread
+_pathExtremesLock = threading.Lock()
+
+# e.g. to time extremes from scratch
+def clear_path_extremes():
+	with _pathExtremesLock:
+		_pathExtremes.clear()
+
+def extremes_for(topology, tolerance=EXTREME_TOLERANCE, italicAngle=0):
+	cacheKey = ("extremes", tolerance, italicAngle)
+	mask = topology.cache.get(cacheKey)
+	if mask is not None:
+		return mask
+
+	packed = packed_layer(topology)
+	mask = np.zeros(len(packed), dtype=bool)
+	dirty = []
+	for pathIndex in range(len(topology.paths)):
+		first, end = topology.path_range(pathIndex)
+		if first == end:
+			continue
+		key = (topology.path_fingerprint(pathIndex), tolerance, italicAngle)
+		with _pathExtremesLock:
+			pathMask = _pathExtremes.get(key)
+			if pathMask is not None:
+				_pathExtremes.move_to_end(key)
+		if pathMask is None:
+			dirty.append((first, end, key))
+		else:
+			mask[first:end] = pathMask
+
+	if dirty:
+		indices = np.concatenate([np.arange(first, end, dtype=np.intp) for first, end, key in dirty])
+		mask[indices] = extreme_mask(packed, tolerance, italicAngle, indices)
+		with _pathExtremesLock:
+			for first, end, key in dirty:
+				_pathExtremes[key] = mask[first:end].copy()
+			while len(_pathExtremes) > PATH_EXTREMES_CACHE_SIZE:
+				_pathExtremes.popitem(last=False)
+
+	topology.cache[cacheKey] = mask
+	return mask
+
+# same rules as selection_reference.select_nodes_by_type, as a mask over packed.nodes
+def node_type_mask(packed, type, smooth, typeFilter="all", extremes=None):
+	types = packed.types
+	nodeSmooth = packed.smooth
+	prevTypes = types[packed.prev]
+	nextTypes = types[packed.next]
+
+	end_of_open_path = ~packed.closed & packed.isEnd
+	neighboring_offcurve = (prevTypes == TYPE_OFFCURVE) | (nextTypes == TYPE_OFFCURVE)
+	isLine = types == TYPE_LINE
+	sharp_line_that_neighbors_offcurve = isLine & ~nodeSmooth & neighboring_offcurve
+	smooth_end_of_open_path = end_of_open_path & ((nodeSmooth & (type == CURVE)) | isLine)
+	smooth_line = isLine & nodeSmooth
+
+	mask = np.ones(len(types), dtype=bool)
+	if typeFilter in ("extremes", "non_extremes"):
+		if extremes is None:
+			extremes = extreme_mask(packed)
+		mask &= extremes if typeFilter == "extremes" else ~extremes
+
+	if type:
+		typeMask = types == TYPE_CODES.get(type, TYPE_OTHER)
+		if smooth is not None:
+			typeMask &= nodeSmooth == smooth
+
+		if type == CURVE and smooth is True:
+			# ignore end of open paths, include smooth lines
+			mask &= ~end_of_open_path
+			mask &= smooth_line | typeMask
+		elif type == CURVE and smooth is False:
+			# ignore end of open paths that don't neighbor offcurves,
+			# include sharp lines that neighbor offcurves and smooth ends of open paths
+			mask &= ~(end_of_open_path & ~neighboring_offcurve)
+			mask &= sharp_line_that_neighbors_offcurve | smooth_end_of_open_path | typeMask
+		else:
+			if type == LINE:
+				# ignore those that neighbor offcurves AND are the end of a path
+				mask &= ~(end_of_open_path & neighboring_offcurve)
+			mask &= typeMask
+
+	if type == LINE:
+		# select neighboring (non-OFFCURVE) nodes of lines as well
+		neighbors = np.zeros(len(types), dtype=bool)
+		neighbors[packed.prev[mask]] = True
+		neighbors[packed.next[mask]] = True
+		mask |= neighbors & (types != TYPE_OFFCURVE)
+
+	return mask
+
+def layer_italic_angle(layer):
+	return getattr(getattr(layer, "master", None), "italicAngle", 0) or 0
+
+# italicAngle defaults to the layer's master
+def classify_nodes(layer, type, smooth, typeFilter="all", tolerance=EXTREME_TOLERANCE, italicAngle=None):
+	if not numpy_available():
+		# exact, upright extremes only
+		return select_nodes_by_type(layer, type, smooth, typeFilter)
+	topology = topology_for(layer)
+	if not len(topology):
+		return []
+	packed = packed_layer(topology)
+	extremes = None
+	if typeFilter in ("extremes", "non_extremes"):
+		if italicAngle is None:
+			italicAngle = layer_italic_angle(layer)
+		extremes = extremes_for(topology, tolerance, italicAngle)
+	return packed.elements(node_type_mask(packed, type, smooth, typeFilter, extremes))
@@ -0,0 +1,370 @@
+# encoding: utf-8
+
+from __future__ import print_function
+import re
+from collections import OrderedDict, namedtuple
+from selection_core import LINE, CURVE, OFFCURVE, topology_for
+from selection_reference import select_nodes_by_type
+import node_classifier
+from node_classifier import TYPE_LINE, TYPE_CURVE, TYPE_OFFCURVE, EXTREME_TOLERANCE, numpy_available, packed_layer, extremes_for, layer_italic_angle
+
+#
+# Filter expressions
+#
+# A small predicate language over the nodes of a layer, e.g.
+#
+#   smooth & extreme & !selected
+#   line & open_end
+#   offcurve & handle_len > 50
+#   grow(sharp_nodes & extreme) & !offcurve
+#
+# Names are node properties (see ATOMS), numeric fields (see FIELDS) compared with
+# < <= > >= == !=, or the palette rows (see ROW_EXPRESSIONS); & binds tighter than |,
+# ! negates and grow(...) adds the on- and off-curve neighbors of what's inside.
+# An expression is compiled once into a chain of closures over whole-array masks, cached
+# by its text, and evaluated over the layer's packed node arrays. Masks of expressions that
+# don't depend on the selection are cached with the topology until the layer changes.
+#
+
+class FilterError(ValueError):
+	pass
+
+# the palette's node rows; {filter} is replaced with one of FILTER_TERMS. These are the
+# rules of selection_reference.select_nodes_by_type, spelled out
+ROW_EXPRESSIONS = OrderedDict((
+	("smooth_nodes", "smooth & (curve | line) & !open_end & {filter}"),
+	("sharp_nodes", "(curve & !smooth | line & !smooth & next_to_handle | open_end & (smooth | line)) & !(open_end & !next_to_handle) & {filter}"),
+	("line_nodes", "grow(line & !(open_end & next_to_handle) & {filter}) & !offcurve"),
+	("handle_nodes", "offcurve & {filter}"),
+))
+ROW_TYPES = {
+	"smooth_nodes": (CURVE, True),
+	"sharp_nodes": (CURVE, False),
+	"line_nodes": (LINE, None),
+	"handle_nodes": (OFFCURVE, None),
+}
+FILTER_TERMS = OrderedDict((
+	("all", "all"),
+	("extremes", "extreme"),
+	("non_extremes", "!extreme"),
+))
+
+def preset_expression(row, typeFilter="all"):
+	return ROW_EXPRESSIONS[row].format(filter=FILTER_TERMS[typeFilter])
+
+# custom rows take the same filters as the node rows
+def row_expression(expression, typeFilter="all"):
+	if expression in ROW_EXPRESSIONS:
+		return preset_expression(expression, typeFilter)
+	if typeFilter == "all":
+		return expression
+	return "(%s) & %s" % (expression, FILTER_TERMS[typeFilter])
+
+_presets = {preset_expression(row, typeFilter): (row, typeFilter) for row in ROW_EXPRESSIONS for typeFilter in FILTER_TERMS}
+
+#
+# Evaluation context
+#
+
+class FilterContext(object):
+	def __init__(self, layer, topology, tolerance=EXTREME_TOLERANCE, italicAngle=0):
+		self.layer = layer
+		self.topology = topology
+		self.packed = packed_layer(topology)
+		self.tolerance = tolerance
+		self.italicAngle = italicAngle
+
+	# per-topology cache for masks and fields that only depend on the outline
+	def cached(self, key, compute):
+		value = self.topology.cache.get(key)
+		if value is None:
+			value = self.topology.cache[key] = compute(self)
+		return value
+
+def _np():
+	return node_classifier.np
+
+def _on_curve(context):
+	types = context.packed.types
+	return (types == TYPE_LINE) | (types == TYPE_CURVE)
+
+def _open_end(context):
+	packed = context.packed
+	return ~packed.closed & packed.isEnd
+
+def _next_to_handle(context):
+	packed = context.packed
+	offCurve = packed.types == TYPE_OFFCURVE
+	return offCurve[packed.prev] | offCurve[packed.next]
+
+def _selected(context):
+	np = _np()
+	return np.frombuffer(bytes(context.topology.selection_mask(context.layer.selection)), dtype=np.uint8).astype(bool)
+
+def _extreme(context):
+	return extremes_for(context.topology, context.tolerance, context.italicAngle)
+
+# name: (compute, cacheable)
+ATOMS = {
+	"all": (lambda context: _np().ones(len(context.packed), dtype=bool), True),
+	"line": (lambda context: context.packed.types == TYPE_LINE, True),
+	"curve": (lambda context: context.packed.types == TYPE_CURVE, True),
+	"offcurve": (lambda context: context.packed.types == TYPE_OFFCURVE, True),
+	"oncurve": (_on_curve, True),
+	"smooth": (lambda context: context.packed.smooth, True),
+	"open": (lambda context: ~context.packed.closed, True),
+	"closed": (lambda context: context.packed.closed, True),
+	"open_end": (_open_end, True),
+	"next_to_handle": (_next_to_handle, True),
+	# cached by extremes_for itself, per tolerance and italic angle
+	"extreme": (_extreme, False),
+	"selected": (_selected, False),
+}
+ATOMS["handle"] = ATOMS["offcurve"]
+
+# length of a handle, or of the longer handle of an on-curve node
+def _handle_len(context):
+	np = _np()
+	packed = context.packed
+	offCurve = packed.types == TYPE_OFFCURVE
+	onCurve = _on_curve(context)
+	prev = packed.cyclicPrev
+	next = packed.cyclicNext
+	toPrev = np.hypot(packed.x - packed.x[prev], packed.y - packed.y[prev])
+	toNext = np.hypot(packed.x - packed.x[next], packed.y - packed.y[next])
+	# a handle belongs to the on-curve node before it, or else to the one after it
+	handleLength = np.where(onCurve[prev], toPrev, np.where(onCurve[next], toNext, 0))
+	nodeLength = np.maximum(np.where(offCurve[prev], toPrev, 0), np.where(offCurve[next], toNext, 0))
+	return np.where(offCurve, handleLength, np.where(onCurve, nodeLength, 0))
+
+def _path_index(context):
+	np = _np()
+	packed = context.packed
+	return np.arange(len(packed)) - np.repeat(packed.firsts, packed.lasts - packed.firsts + 1)
+
+FIELDS = {
+	"x": lambda context: context.packed.x,
+	"y": lambda context: context.packed.y,
+	"handle_len": _handle_len,
+	# position of the node in its path
+	"index": _path_index,
+}
+
+def _grow(context, mask):
+	packed = context.packed
+	grown = mask.copy()
+	grown[packed.prev[mask]] = True
+	grown[packed.next[mask]] = True
+	return grown
+
+FUNCTIONS = {
+	"grow": _grow,
+}
+
+COMPARISONS = {
+	"<": lambda values, number: values < number,
+	"<=": lambda values, number: values <= number,
+	">": lambda values, number: values > number,
+	">=": lambda values, number: values >= number,
+	"==": lambda values, number: values == number,
+	"!=": lambda values, number: values != number,
+}
+
+#
+# Compiler
+#
+
+_token = re.compile(r"\s*(?:(?P<number>-?\d+(?:\.\d*)?|-?\.\d+)|(?P<name>[A-Za-z_]\w*)|(?P<op><=|>=|==|!=|[&|!()<>]))")
+
+def _tokenize(expression):
+	tokens = []
+	position = 0
+	expression = expression.rstrip()
+	while position < len(expression):
+		match = _token.match(expression, position)
+		if match is None:
+			raise FilterError("Unexpected %r at %d in %r" % (expression[position:position + 1], position, expression))
+		kind = match.lastgroup
+		tokens.append((kind, match.group(kind), match.start(kind)))
+		position = match.end()
+	tokens.append(("end", None, len(expression)))
+	return tokens
+
+class _Parser(object):
+	def __init__(self, expression):
+		self.expression = expression
+		self.tokens = _tokenize(expression)
+		self.position = 0
+		self.usesSelection = False
+		# reads node positions, so it can differ between compatible masters
+		self.usesPositions = False
+
+	def peek(self):
+		return self.tokens[self.position]
+
+	def take(self, value=None):
+		token = self.tokens[self.position]
+		if value is not None and token[1] != value:
+			self.fail(token, "expected %r" % value)
+		self.position += 1
+		return token
+
+	def fail(self, token, message):
+		found = "end of expression" if token[0] == "end" else repr(token[1])
+		raise FilterError("%s, found %s at %d in %r" % (message, found, token[2], self.expression))
+
+	def parse(self):
+		evaluate = self.parse_or()
+		if self.peek()[0] != "end":
+			self.fail(self.peek(), "expected & or |")
+		return evaluate
+
+	def parse_or(self):
+		terms = [self.parse_and()]
+		while self.peek()[1] == "|":
+			self.take()
+			terms.append(self.parse_and())
+		if len(terms) == 1:
+			return terms[0]
+		def evaluate(context):
+			mask = terms[0](context)
+			for term in terms[1:]:
+				mask = mask | term(context)
+			return mask
+		return evaluate
+
+	def parse_and(self):
+		terms = [self.parse_not()]
+		while self.peek()[1] == "&":
+			self.take()
+			terms.append(self.parse_not())
+		if len(terms) == 1:
+			return terms[0]
+		def evaluate(context):
+			mask = terms[0](context)
+			for term in terms[1:]:
+				mask = mask & term(context)
+			return mask
+		return evaluate
+
+	def parse_not(self):
+		if self.peek()[1] == "!":
+			self.take()
+			term = self.parse_not()
+			return lambda context: ~term(context)
+		return self.parse_primary()
+
+	def parse_primary(self):
+		token = self.take()
+		kind, value, position = token
+		if value == "(":
+			evaluate = self.parse_or()
+			self.take(")")
+			return evaluate
+		if kind != "name":
+			self.fail(token, "expected a name or (")
+
+		if value in FUNCTIONS:
+			function = FUNCTIONS[value]
+			self.take("(")
+			argument = self.parse_or()
+			self.take(")")
+			return lambda context: function(context, argument(context))
+
+		if value in FIELDS:
+			field = FIELDS[value]
+			comparison = self.take()
+			if comparison[1] not in COMPARISONS:
+				self.fail(comparison, "expected a comparison after %s" % value)
+			number = self.take()
+			if number[0] != "number":
+				self.fail(number, "expected a number")
+			compare = COMPARISONS[comparison[1]]
+			if value != "index":
+				self.usesPositions = True
+			threshold = float(number[1])
+			key = ("field", value)
+			return lambda context: compare(context.cached(key, field), threshold)
+
+		if value in ROW_EXPRESSIONS:
+			# a row on its own means all of its nodes
+			row = _Parser(preset_expression(value))
+			evaluate = row.parse()
+			self.usesSelection = self.usesSelection or row.usesSelection
+			self.usesPositions = self.usesPositions or row.usesPositions
+			return evaluate
+
+		if value in ATOMS:
+			compute, cacheable = ATOMS[value]
+			if value == "selected":
+				self.usesSelection = True
+			elif value == "extreme":
+				self.usesPositions = True
+			if cacheable:
+				key = ("atom", value)
+				return lambda context: context.cached(key, compute)
+			return compute
+
+		self.fail(token, "unknown name")
+
+CompiledFilter = namedtuple("CompiledFilter", ("expression", "evaluate", "usesSelection", "usesPositions"))
+
+COMPILED_CACHE_SIZE = 256
+_compiled = OrderedDict()
+
+def compile_filter(expression):
+	compiled = _compiled.get(expression)
+	if compiled is not None:
+		_compiled.move_to_end(expression)
+		return compiled
+	parser = _Parser(expression)
+	evaluate = parser.parse()
+	compiled = CompiledFilter(expression, evaluate, parser.usesSelection, parser.usesPositions)
+	_compiled[expression] = compiled
+	while len(_compiled) > COMPILED_CACHE_SIZE:
+		_compiled.popitem(last=False)
+	return compiled
+
+# whether the expression picks the same node indices in every compatible master: it only
+# looks at node types and path structure, not at positions or the selection
+def is_topological(expression):
+	compiled = compile_filter(expression)
+	return not (compiled.usesSelection or compiled.usesPositions)
+
+#
+# Applying
+#
+
+# italicAngle defaults to the layer's master
+def filter_mask(layer, expression, tolerance=EXTREME_TOLERANCE, italicAngle=None):
+	if italicAngle is None:
+		italicAngle = layer_italic_angle(layer)
+	return topology_filter_mask(topology_for(layer), expression, tolerance, italicAngle, layer)
+
+# the same from a topology alone; expressions that use the selection need the layer too
+def topology_filter_mask(topology, expression, tolerance=EXTREME_TOLERANCE, italicAngle=0, layer=None):
+	compiled = compile_filter(expression)
+	cacheKey = None
+	if not compiled.usesSelection:
+		cacheKey = ("filter", expression, tolerance, italicAngle)
+		mask = topology.cache.get(cacheKey)
+		if mask is not None:
+			return mask
+	mask = compiled.evaluate(FilterContext(layer, topology, tolerance, italicAngle))
+	if cacheKey is not None:
+		topology.cache[cacheKey] = mask
+	return mask
+
+def filter_nodes(layer, expression, tolerance=EXTREME_TOLERANCE, italicAngle=None):
+	if not numpy_available():
+		preset = _presets.get(expression)
+		if preset is None:
+			raise FilterError("Filter expressions need numpy: %r" % expression)
+		row, typeFilter = preset
+		type, smooth = ROW_TYPES[row]
+		# exact, upright extremes only
+		return select_nodes_by_type(layer, type, smooth, typeFilter)
+	topology = topology_for(layer)
+	if not len(topology):
+		return []
+	return packed_layer(topology).elements(filter_mask(layer, expression, tolerance, italicAngle))
@@ -0,0 +1,188 @@
+# encoding: utf-8
+
+from __future__ import print_function
+from math import atan2, hypot, pi, floor
+from collections import namedtuple
+from selection_core import topology_for
+import node_classifier
+from node_classifier import TYPE_LINE, TYPE_CURVE, TYPE_OTHER, TYPE_OFFCURVE, EXTREME_TOLERANCE, numpy_available, packed_layer, extremes_for, extreme_flags, layer_italic_angle
+from batch_query import NodeMatch, iter_layers
+
+#
+# Similar nodes
+#
+# Every node gets a feature vector: type, smooth, extreme, the lengths of its incoming and
+# outgoing handles and the angle of its tangent. A handle's "in" length is its own length
+# and its angle the direction it points in from its on-curve node. The vectors are
+# bucketed by their exact fields and by the continuous ones quantized to the tolerance, so
+# a node's matches are all in its own bucket or a neighboring one, and only those few
+# candidates are compared. The index is cached per layer revision and tolerance.
+#
+
+LENGTH_TOLERANCE = 5
+ANGLE_TOLERANCE = 2
+
+NodeFeatures = namedtuple("NodeFeatures", ("types", "smooth", "extreme", "inLength", "outLength", "angle"))
+
+def _features_numpy(topology, extremes):
+	np = node_classifier.np
+	packed = packed_layer(topology)
+	types = packed.types
+	x = packed.x
+	y = packed.y
+	# open-aware, so the ends of open paths have no handle on their outer side
+	prev = packed.prev
+	next = packed.next
+	offCurve = types == TYPE_OFFCURVE
+	onCurve = ~offCurve & (types != TYPE_OTHER)
+
+	toPrev = np.hypot(x - x[prev], y - y[prev])
+	toNext = np.hypot(x - x[next], y - y[next])
+	# a handle belongs to the on-curve node before it, or else to the one after it
+	owner = np.where(onCurve[prev], prev, np.where(onCurve[next], next, np.arange(len(types))))
+	inLength = np.where(offCurve, np.hypot(x - x[owner], y - y[owner]), np.where(offCurve[prev], toPrev, 0))
+	outLength = np.where(offCurve, 0, np.where(offCurve[next], toNext, 0))
+	angle = np.where(
+		offCurve,
+		np.arctan2(y - y[owner], x - x[owner]),
+		np.arctan2(y[next] - y[prev], x[next] - x[prev]),
+	) * 180 / np.pi % 360
+	return NodeFeatures(types.tolist(), packed.smooth.tolist(), extremes.tolist(), inLength.tolist(), outLength.tolist(), angle.tolist())
+
+# the same without numpy; node types other than line, curve and handle own no handles
+def _features_python(topology, extremes):
+	types = list(topology.typeCodes)
+	onCurve = (TYPE_LINE, TYPE_CURVE)
+	x = topology.x
+	y = topology.y
+	inLength = []
+	outLength = []
+	angle = []
+	for index, type in enumerate(types):
+		prev = topology.prev[index]
+		next = topology.next[index]
+		if type == TYPE_OFFCURVE:
+			owner = prev if types[prev] in onCurve else next if types[next] in onCurve else index
+			inLength.append(hypot(x[index] - x[owner], y[index] - y[owner]))
+			outLength.append(0)
+			angle.append(atan2(y[index] - y[owner], x[index] - x[owner]) * 180 / pi % 360)
+		else:
+			inLength.append(hypot(x[index] - x[prev], y[index] - y[prev]) if types[prev] == TYPE_OFFCURVE else 0)
+			outLength.append(hypot(x[index] - x[next], y[index] - y[next]) if types[next] == TYPE_OFFCURVE else 0)
+			angle.append(atan2(y[next] - y[prev], x[next] - x[prev]) * 180 / pi % 360)
+	return NodeFeatures(types, [bool(smooth) for smooth in topology.smooth], extremes, inLength, outLength, angle)
+
+def node_features(topology, tolerance=EXTREME_TOLERANCE, italicAngle=0):
+	cacheKey = ("features", tolerance, italicAngle)
+	features = topology.cache.get(cacheKey)
+	if features is None:
+		if numpy_available() and len(topology):
+			features = _features_numpy(topology, extremes_for(topology, tolerance, italicAngle))
+		else:
+			features = _features_python(topology, extreme_flags(topology, tolerance, italicAngle))
+		topology.cache[cacheKey] = features
+	return features
+
+class SimilarityIndex(object):
+	def __init__(self, features, lengthTolerance=LENGTH_TOLERANCE, angleTolerance=ANGLE_TOLERANCE):
+		self.features = features
+		self.lengthTolerance = lengthTolerance
+		self.angleTolerance = angleTolerance
+		# buckets are at least as wide as the tolerance; angle buckets divide the circle evenly,
+		# so the neighbors of the last one wrap around to the first
+		self.lengthWidth = lengthTolerance or 1e-9
+		self.angleBuckets = max(int(360 // angleTolerance), 1) if angleTolerance else 360 * 10 ** 9
+		self.angleWidth = 360.0 / self.angleBuckets
+		self.buckets = {}
+		for index, vector in enumerate(zip(features.types, features.smooth, features.extreme, features.inLength, features.outLength, features.angle)):
+			key = self.bucket_key(vector)
+			bucket = self.buckets.get(key)
+			if bucket is None:
+				self.buckets[key] = [index]
+			else:
+				bucket.append(index)
+
+	def bucket_key(self, vector):
+		type, smooth, extreme, inLength, outLength, angle = vector
+		return (type, smooth, extreme, int(floor(inLength / self.lengthWidth)), int(floor(outLength / self.lengthWidth)), int(floor(angle / self.angleWidth)) % self.angleBuckets)
+
+	# indices of the nodes whose features are within tolerance of `vector`
+	def similar(self, vector):
+		type, smooth, extreme, inLength, outLength, angle = vector
+		features = self.features
+		lengthTolerance = self.lengthTolerance
+		angleTolerance = self.angleTolerance
+		key = self.bucket_key(vector)
+		angleKeys = {(key[5] + step) % self.angleBuckets for step in (-1, 0, 1)}
+		result = []
+		for inStep in (-1, 0, 1):
+			for outStep in (-1, 0, 1):
+				for angleKey in angleKeys:
+					bucket = self.buckets.get(key[:3] + (key[3] + inStep, key[4] + outStep, angleKey))
+					if not bucket:
+						continue
+					for index in bucket:
+						if abs(features.inLength[index] - inLength) > lengthTolerance:
+							continue
+						if abs(features.outLength[index] - outLength) > lengthTolerance:
+							continue
+						if abs((features.angle[index] - angle + 180) % 360 - 180) > angleTolerance:
+							continue
+						result.append(index)
+		return result
+
+	def vector(self, index):
+		features = self.features
+		return (features.types[index], features.smooth[index], features.extreme[index], features.inLength[index], features.outLength[index], features.angle[index])
+
+def similarity_index_for(layer, lengthTolerance=LENGTH_TOLERANCE, angleTolerance=ANGLE_TOLERANCE, tolerance=EXTREME_TOLERANCE):
+	topology = topology_for(layer)
+	italicAngle = layer_italic_angle(layer)
+	cacheKey = ("similarity", lengthTolerance, angleTolerance, tolerance, italicAngle)
+	index = topology.cache.get(cacheKey)
+	if index is None:
+		index = topology.cache[cacheKey] = SimilarityIndex(node_features(topology, tolerance, italicAngle), lengthTolerance, angleTolerance)
+	return index
+
+# feature vectors of the selected nodes, each once
+def selected_vectors(layer, lengthTolerance=LENGTH_TOLERANCE, angleTolerance=ANGLE_TOLERANCE):
+	index = similarity_index_for(layer, lengthTolerance, angleTolerance)
+	topology = topology_for(layer)
+	vectors = []
+	seen = set()
+	for element in layer.selection:
+		nodeIndex = topology.index_of(element)
+		if nodeIndex is None:
+			continue
+		vector = index.vector(nodeIndex)
+		if vector not in seen:
+			seen.add(vector)
+			vectors.append(vector)
+	return vectors
+
+# flat indices of the nodes of `layer` similar to any of the vectors, in outline order
+def similar_indices(layer, vectors, lengthTolerance=LENGTH_TOLERANCE, angleTolerance=ANGLE_TOLERANCE):
+	index = similarity_index_for(layer, lengthTolerance, angleTolerance)
+	found = set()
+	for vector in vectors:
+		found.update(index.similar(vector))
+	return sorted(found)
+
+# nodes that look like the selected ones
+def select_similar(layer, lengthTolerance=LENGTH_TOLERANCE, angleTolerance=ANGLE_TOLERANCE):
+	vectors = selected_vectors(layer, lengthTolerance, angleTolerance)
+	if not vectors:
+		return []
+	nodes = topology_for(layer).nodes
+	return [nodes[index] for index in similar_indices(layer, vectors, lengthTolerance, angleTolerance)]
+
+# the same over a whole font, as batch_query.NodeMatch per layer with matches; use
+# batch_query.apply_matches or open_in_tab with the result
+def find_similar(font, layer, lengthTolerance=LENGTH_TOLERANCE, angleTolerance=ANGLE_TOLERANCE, glyphNames=None, masterLayersOnly=True):
+	vectors = selected_vectors(layer, lengthTolerance, angleTolerance)
+	if not vectors:
+		return
+	for glyphName, otherLayer in iter_layers(font, glyphNames, masterLayersOnly):
+		indices = similar_indices(otherLayer, vectors, lengthTolerance, angleTolerance)
+		if indices:
+			yield NodeMatch(glyphName, otherLayer.associatedMasterId, otherLayer.layerId, indices)
@@ -1,69 +1,228 @@
 # encoding: utf-8
 
 from __future__ import print_function
-from enum import Enum
-from importlib.metadata import distribution
+import time
+_importStart = time.perf_counter()
 import objc
-from AppKit import NSMenuItem, NSImage, NSAlternateKeyMask, NSCommandKeyMask
-from GlyphsApp import *
-from GlyphsApp import Glyphs, EDIT_MENU, LINE, CURVE, OFFCURVE, CORNER, CAP, SEGMENT
-from GlyphsApp.plugins import *
-from vanilla import Window, ImageButton, Group, TextBox, VerticalStackView, HorizontalStackView, ImageView, HorizontalLine
-import traceback, os
-from math import atan2, pi
+from AppKit import NSObject, NSMenu, NSMenuItem, NSImage, NSAlternateKeyMask, NSCommandKeyMask, NSOnState, NSOffState
+from GlyphsApp import Glyphs, EDIT_MENU, UPDATEINTERFACE, DOCUMENTCLOSED, AskString, Message, GetSaveFile
+from GlyphsApp.plugins import PalettePlugin
+import traceback, os, re
+from selection_core import Operation, grow_selection, shrink_selection, fill_selection, continue_selection, continue_selection_to_end, CONTINUE_PATTERN_LENGTH
+from node_filters import FILTER_TERMS, FilterError, compile_filter, is_topological, row_expression, filter_nodes
+from element_index import linked_hints_result, select_anchors, select_components, select_guides, select_path_components, select_anchors_named, parse_anchor_pattern, anchor_name_matcher, find_anchors, apply_anchor_matches
+from spatial_index import select_within_radius, select_nearest, select_in_selection_bounds
+from contour_metrics import TINY_AREA, MAX_NODES, select_contours, select_whole_contours, find_contours
+from selection_history import history
+from selection_transactions import transactions
+from command_metrics import metrics, PHASE_SNAPSHOT, PHASE_CLASSIFY, PHASE_COMMIT
+from node_classifier import EXTREME_TOLERANCE
+from precompute import IDLE_DELAY, PRESET_EXPRESSIONS, precomputer
+from layer_sets import SCOPE_CURRENT, SCOPE_SELECTED_LAYERS, SCOPE_MASTERS, SCOPE_TAB, scope_layers, run_on_layers, commit_selections
+# node_similarity, batch_query, named_selections, selection_audit and the snapshot report
+# are imported by the commands that use them, so they stay out of plugin load
 
 # 
 # Translations
 # 
 
-translations = {
-	"undo_selection": Glyphs.localize({ 'en': "Undo Selection" }),
-	"shrink_selection": Glyphs.localize({ 'en': "Shrink Selection" }),
-	"select_between": Glyphs.localize({ 'en': "Select Between" }),
-	"grow_selection": Glyphs.localize({ 'en': "Grow Selection" }),
-	"continue_selection": Glyphs.localize({ 'en': "Continue Selection", "de": "Auswahl fortsetzen" }),
-	"select_linked_hints": Glyphs.localize({ 'en': "Select Linked Caps/Corners" }),
-	"select_extremes": Glyphs.localize({ 'en': "Select Extremes" }),
+# Localized on first use rather than at plugin load
+_strings = {
+	"undo_selection": { 'en': "Undo Selection" },
+	"redo_selection": { 'en': "Redo Selection" },
+	"shrink_selection": { 'en': "Shrink Selection" },
+	"select_between": { 'en': "Select Between" },
+	"grow_selection": { 'en': "Grow Selection" },
+	"grow_selection_by": { 'en': "Grow Selection By…" },
+	"shrink_selection_by": { 'en': "Shrink Selection By…" },
+	"steps_prompt": { 'en': "Number of nodes:" },
+	"select_within_radius": { 'en': "Select Within Radius…" },
+	"radius_prompt": { 'en': "Radius in units:" },
+	"select_nearest": { 'en': "Select Nearest Nodes…" },
+	"select_in_bounds": { 'en': "Select Inside Selection Bounds" },
+	"continue_selection": { 'en': "Continue Selection", "de": "Auswahl fortsetzen" },
+	"continue_selection_to_end": { 'en': "Continue Selection to End" },
+	"continue_pattern_to_end": { 'en': "Continue Pattern to End" },
+	"select_linked_hints": { 'en': "Select Linked Caps/Corners" },
+	"linked_hints": { 'en': "Linked Caps/Corners" },
+	"select_extremes": { 'en': "Select Extremes" },
+	"select_matching": { 'en': "Select Nodes Matching…" },
+	"select_similar": { 'en': "Select Similar" },
+	"select_similar_in_font": { 'en': "Select Similar in Font" },
+	"similarity_tolerance": { 'en': "Similarity Tolerance…" },
+	"similarity_prompt": { 'en': "Handle length tolerance in units:" },
+	"similarity_angle_prompt": { 'en': "Tangent angle tolerance in degrees:" },
+	"filter_prompt": { 'en': "Filter expression, e.g. smooth & extreme & !selected:" },
+	"filter_error": { 'en': "Invalid filter expression" },
+	"select_anchors_named": { 'en': "Select Anchors Named…" },
+	"select_anchors_named_in_font": { 'en': "Select Anchors Named in Font…" },
+	"anchor_pattern_prompt": { 'en': "Anchor name, with * and ? as wildcards, or a /regular expression/:" },
+	"anchor_pattern_error": { 'en': "Invalid regular expression" },
+	"select_whole_contours": { 'en': "Select Whole Contours" },
+	"select_contours_in_font": { 'en': "Select Filtered Contours in Font" },
+	"tiny_contour_area": { 'en': "Tiny Contour Area…" },
+	"tiny_contour_prompt": { 'en': "Contours smaller than, in square units:" },
+	"contour_node_limit": { 'en': "Contour Node Limit…" },
+	"contour_node_prompt": { 'en': "Contours with more nodes than:" },
 	"boolean_add": lambda label: Glyphs.localize({'en': "Add %s to selection" % label,}),
 	"boolean_remove": lambda label: Glyphs.localize({'en': "Remove %s from selection" % label,}),
 	"boolean_intersect": lambda label: Glyphs.localize({'en': "Select only %s" % label,}),
-	"smooth_nodes": Glyphs.localize({ 'en': "Smooth Curves" }),
-	"sharp_nodes": Glyphs.localize({ 'en': "Sharp Curves" }),
-	"line_nodes": Glyphs.localize({ 'en': "Lines" }),
-	"handle_nodes": Glyphs.localize({ 'en': "Handles" }),
-	"components": Glyphs.localize({ 'en': "Components" }),
-	"path_components": Glyphs.localize({ 'en': "Path Components" }),
-	"anchors": Glyphs.localize({ 'en': "Anchors" }),
-	"guides": Glyphs.localize({ 'en': "Guides" }),
-	"all": Glyphs.localize({ 'en': "All" }),
-	"extremes": Glyphs.localize({ 'en': "Extremes" }),
-	"non_extremes": Glyphs.localize({ 'en': "Non-extremes" }),
-	"unlocked": Glyphs.localize({ 'en': "Unlocked" }),
-	"locked": Glyphs.localize({ 'en': "Locked" }),
-	"corners": Glyphs.localize({ 'en': "Corners" }),
-	"caps": Glyphs.localize({ 'en': "Caps" }),
-	"segments": Glyphs.localize({ 'en': "Segments" }),
-	"anchors": Glyphs.localize({ 'en': "Anchors" }),
-	"underscored_anchors": Glyphs.localize({ 'en': "Underscored Anchors" }),
-	"entry": Glyphs.localize({ 'en': "Entry" }),
-	"exit": Glyphs.localize({ 'en': "Exit" }),
-	"global": Glyphs.localize({ 'en': "Global" }),
-	"local": Glyphs.localize({ 'en': "Local" }),
+	"smooth_nodes": { 'en': "Smooth Curves" },
+	"sharp_nodes": { 'en': "Sharp Curves" },
+	"line_nodes": { 'en': "Lines" },
+	"handle_nodes": { 'en': "Handles" },
+	"components": { 'en': "Components" },
+	"path_components": { 'en': "Path Components" },
+	"contours": { 'en': "Contours" },
+	"anchors": { 'en': "Anchors" },
+	"guides": { 'en': "Guides" },
+	"all": { 'en': "All" },
+	"extremes": { 'en': "Extremes" },
+	"non_extremes": { 'en': "Non-extremes" },
+	"unlocked": { 'en': "Unlocked" },
+	"locked": { 'en': "Locked" },
+	"corners": { 'en': "Corners" },
+	"caps": { 'en': "Caps" },
+	"segments": { 'en': "Segments" },
+	"anchors": { 'en': "Anchors" },
+	"underscored_anchors": { 'en': "Underscored Anchors" },
+	"entry": { 'en': "Entry" },
+	"exit": { 'en': "Exit" },
+	"outer": { 'en': "Outer Contours" },
+	"counters": { 'en': "Counters" },
+	"open": { 'en': "Open Paths" },
+	"tiny": { 'en': "Tiny Contours" },
+	"complex": { 'en': "Contours with Many Nodes" },
+	"duplicates": { 'en': "Duplicate Contours" },
+	"global": { 'en': "Global" },
+	"local": { 'en': "Local" },
+	"save_named_selection": { 'en': "Save Selection As…" },
+	"restore_named_selection": { 'en': "Restore Saved Selection…" },
+	"delete_named_selection": { 'en': "Delete Saved Selection…" },
+	"named_selection_prompt": { 'en': "Name:" },
+	"named_selection_saved": { 'en': "Saved: %s" },
+	"named_selection_missing": { 'en': "No saved selection by that name fits this outline. It was saved on a layer with different paths or nodes, or the outline changed since." },
+	"profile_next_command": { 'en': "Profile Next Selection Command" },
+	"print_command_stats": { 'en': "Print Selection Command Timings" },
+	"export_selection_audit": { 'en': "Export Selection Audit…" },
+	"selection_audit_written": { 'en': "SelectionPalette audit: %d layers written to %s" },
+	"selection_scope": { 'en': "Selection Scope" },
+	"scope_current": { 'en': "Current Layer" },
+	"scope_selected_layers": { 'en': "Selected Layers" },
+	"scope_masters": { 'en': "All Masters" },
+	"scope_tab": { 'en': "All Layers in Tab" },
 }
 
-class Operation(Enum):
-	ADD = 0
-	SUBTRACT = 1
-	INTERSECT = 2
+class Translations(dict):
+	def __missing__(self, key):
+		value = _strings[key]
+		if isinstance(value, dict):
+			value = Glyphs.localize(value)
+		self[key] = value
+		return value
+
+translations = Translations()
+
+STEPS_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.steps"
+SCOPE_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.scope"
+RADIUS_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.radius"
+NEAREST_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.nearest"
+# handle lengths in units, tangent angles in degrees
+SIMILAR_LENGTH_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.similarLengthTolerance"
+SIMILAR_ANGLE_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.similarAngleTolerance"
+# seconds after a command during which the next one joins its undo step; 0 records every
+# command on its own
+BURST_WINDOW_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.burstWindow"
+# show the last command's timing under the palette rows
+SHOW_STATS_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.showStats"
+# file to append a JSON line per command to
+METRICS_LOG_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.metricsLog"
+# how many selection changes per layer Undo Selection can go back
+HISTORY_DEPTH_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.historyDepth"
+NAMED_SELECTION_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.namedSelection"
+FILTER_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.filterExpression"
+ANCHOR_PATTERN_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.anchorPattern"
+# thresholds of the contours row's tiny and complex filters
+TINY_AREA_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.tinyContourArea"
+MAX_NODES_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.contourNodeLimit"
+# degrees a handle may be off an axis and still count as an extreme, 0 for exact
+EXTREME_TOLERANCE_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.extremeTolerance"
+# extra palette rows, a list of filter expressions
+CUSTOM_ROWS_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.customRows"
+# False to compute the rows only when they're clicked
+PRECOMPUTE_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.precompute"
+
+# 
+# Icons
+# 
+# Every icon is read from disk once per app session and the NSImage is shared by the
+# palettes of all open documents.
+_icons = {}
+iconStats = {"loads": 0, "hits": 0}
+# seconds each settings() call took to build a palette
+paletteBuildTimes = []
+# seconds spent importing this file, and in each start()
+startupTimings = {"import": None, "start": []}
+STARTUP_LOG_DEFAULTS_KEY = "com.DanielGamage.SelectionPalette.logStartup"
+
+def startupReport():
+	return "SelectionPalette startup: import %.1f ms, settings() %s ms, start() %s ms, icons %d loaded / %d cached" % (
+		(startupTimings["import"] or 0) * 1000,
+		", ".join("%.1f" % (seconds * 1000) for seconds in paletteBuildTimes) or "-",
+		", ".join("%.1f" % (seconds * 1000) for seconds in startupTimings["start"]) or "-",
+		iconStats["loads"],
+		iconStats["hits"],
+	)
 
 def getImageViewFromPath(path):
+	icon = _icons.get(path)
+	if icon is not None:
+		iconStats["hits"] += 1
+		return icon
 	osource_image = os.path.join(os.path.dirname(__file__), "icons/" + path + '.svg')
 	icon = NSImage.alloc().initWithContentsOfFile_(osource_image)
 	icon.setTemplate_(True)
+	_icons[path] = icon
+	iconStats["loads"] += 1
 	return icon
 
+# so that cycling through filters never has to wait for the disk
+def preloadIcons(paths):
+	for path in paths:
+		if path not in _icons:
+			getImageViewFromPath(path)
+
+# row icon for a custom filter expression, after the first node type it names
+EXPRESSION_ICONS = (
+	("smooth", "smooth_nodes"),
+	("sharp", "sharp_nodes"),
+	("line", "line_nodes"),
+	("handle", "handle_nodes"),
+	("offcurve", "handle_nodes"),
+)
+
+def expressionIcon(expression):
+	matches = [(expression.find(word), key) for word, key in EXPRESSION_ICONS if word in expression]
+	return "base/Icon=" + (min(matches)[1] if matches else "smooth_nodes")
+
+def extremeTolerance():
+	tolerance = Glyphs.defaults[EXTREME_TOLERANCE_DEFAULTS_KEY]
+	return EXTREME_TOLERANCE if tolerance is None else float(tolerance)
+
+def customRows():
+	rows = []
+	for expression in Glyphs.defaults[CUSTOM_ROWS_DEFAULTS_KEY] or ():
+		try:
+			compile_filter(expression)
+		except FilterError as e:
+			print("SelectionPalette: skipping custom row: %s" % e)
+			continue
+		rows.append(expression)
+	return rows
+
 # createImageButton def with 3 named arguments for icon, callback and tooltip
 def createImageButton(icon, callback, tooltip):
+	from vanilla import ImageButton
 	addButton = ImageButton(
 		"auto",
 		bordered=False,
@@ -73,48 +232,99 @@ def createImageButton(icon, callback, tooltip):
 	addButton.getNSButton().setToolTip_(tooltip)
 	return addButton
 
-# utils
-getAngleBetweenPoints = lambda p1, p2: atan2(p2.y - p1.y, p2.x - p1.x) * 180 / pi
-isMultipleOf90 = lambda angle: (angle + 360) % 90 == 0
-
-def is_node_extreme(node):
-	node1 = None
-	node2 = None
-	node3 = None
-
-	if (node.type in [CURVE, LINE]) and (node.prevNode.type == OFFCURVE or node.nextNode.type == OFFCURVE):
-		node1 = node.prevNode
-		node2 = node
-		node3 = node.nextNode
-	elif node.type == OFFCURVE:
-		if node.prevNode.type in [CURVE, LINE]:
-			node1 = node.prevNode.prevNode
-			node2 = node.prevNode
-			node3 = node
-		elif node.nextNode.type in [CURVE, LINE]:
-			node1 = node
-			node2 = node.nextNode
-			node3 = node.nextNode.nextNode
-
-	if (node1 and node2 and node3):
-		angle1 = getAngleBetweenPoints(node1, node2)
-		angle2 = getAngleBetweenPoints(node2, node3)
-		# TODO: check italic angle for masters with an italic angle
-
-		is_extreme = angle1 == angle2 and isMultipleOf90(angle1)
-		return is_extreme
-	else:
-		return False
+# the last command's timing under the palette rows; metrics only holds on to it weakly, so
+# it goes away with its palette
+class StatsReadout(object):
+	def __init__(self, textBox):
+		self.textBox = textBox
+
+	def update(self, run):
+		try:
+			self.textBox.set(metrics.readout())
+		except:
+			print(traceback.format_exc())
+
+# 
+# Timers
+# 
+# Delayed work shared by every palette: flushing a burst of commands and precomputing the
+# active layer. It lives at module level, with one interface callback for the whole app,
+# so nothing the app calls back into keeps a closed window's palette alive. The callbacks
+# are added by the first palette to start and removed when the last font is closed.
+class SelectionPaletteTimers(NSObject):
+	# a burst of commands is flushed once the keys have been quiet for `delay` seconds
+	@objc.python_method
+	def scheduleFlush(self, delay):
+		NSObject.cancelPreviousPerformRequestsWithTarget_selector_object_(self, "flushSelectionTransactions:", None)
+		self.performSelector_withObject_afterDelay_("flushSelectionTransactions:", None, delay)
+	def flushSelectionTransactions_(self, sender):
+		try:
+			transactions.flush()
+		except:
+			print(traceback.format_exc())
+
+	# the active layer is handed to the worker once the interface has been quiet for
+	# IDLE_DELAY seconds, after switching layers or editing
+	@objc.python_method
+	def schedulePrecompute(self):
+		NSObject.cancelPreviousPerformRequestsWithTarget_selector_object_(self, "precomputeCurrentLayer:", None)
+		self.performSelector_withObject_afterDelay_("precomputeCurrentLayer:", None, IDLE_DELAY)
+	def precomputeCurrentLayer_(self, sender):
+		try:
+			font = Glyphs.font
+			if font is None or transactions.isOpen:
+				return
+			layers = font.selectedLayers
+			if layers:
+				precomputer.submit(layers[0])
+		except:
+			print(traceback.format_exc())
+
+timers = SelectionPaletteTimers.alloc().init()
+_callbacks = {"added": False}
+
+def interfaceUpdated(sender):
+	timers.schedulePrecompute()
+
+def documentClosed(notification):
+	try:
+		closedFont = getattr(notification.object(), "font", None)
+		if not any(font is not closedFont for font in Glyphs.fonts):
+			removeCallbacks()
+	except:
+		print(traceback.format_exc())
+
+def addCallbacks():
+	if _callbacks["added"]:
+		return
+	Glyphs.addCallback(interfaceUpdated, UPDATEINTERFACE)
+	Glyphs.addCallback(documentClosed, DOCUMENTCLOSED)
+	_callbacks["added"] = True
+
+def removeCallbacks():
+	if not _callbacks["added"]:
+		return
+	Glyphs.removeCallback(interfaceUpdated)
+	Glyphs.removeCallback(documentClosed)
+	NSObject.cancelPreviousPerformRequestsWithTarget_(timers)
+	transactions.flush()
+	_callbacks["added"] = False
 
 class SelectionPalette(PalettePlugin):
 	def settings(self):
 		try:
+			buildStart = time.perf_counter()
+			from vanilla import Window, Group, VerticalStackView, HorizontalStackView, ImageView, TextBox
 			self.name = "SelectionPalette"
 			# cache for vanilla buttons https://github.com/robotools/vanilla/issues/165
 			self.buttonList = []
 			# TODO width does not update on panel resize
 			self.width = 180
-			self.height = 200
+			custom = customRows()
+			self.height = 224 + 24 * len(custom)
+			showStats = bool(Glyphs.defaults[SHOW_STATS_DEFAULTS_KEY])
+			if showStats:
+				self.height += 16
 			types = (
 				("smooth_nodes", self.selectSmoothCurves_withOperation_, [
 					"all",
@@ -136,6 +346,15 @@ class SelectionPalette(PalettePlugin):
 					"extremes",
 					"non_extremes",
 				]),
+				("contours", self.selectContours_withOperation_, [
+					"all",
+					"outer",
+					"counters",
+					"open",
+					"tiny",
+					"complex",
+					"duplicates",
+				]),
 				("components", self.selectComponents_withOperation_, [
 					"unlocked",
 					"locked",
@@ -161,12 +380,17 @@ class SelectionPalette(PalettePlugin):
 					"local",
 					"all",
 				]),
-				)
+				) + tuple(
+				(expression, lambda sender, operation, expression=expression: self.selectNodesMatching_withOperation_andKey_(expression, operation, expression), [
+					"all",
+					"extremes",
+					"non_extremes",
+				]) for expression in custom)
 			# generate list from types
 			self.rowSettings = list(map(lambda type: {
 				"key": type[0],
-				"icon": getImageViewFromPath("base/Icon=" + type[0]),
-				"label": translations[type[0]],
+				"icon": getImageViewFromPath(("base/Icon=" + type[0]) if type[0] in _strings else expressionIcon(type[0])),
+				"label": translations[type[0]] if type[0] in _strings else type[0],
 				"callback": type[1],
 				"filters": type[2],
 				"filter": 0,
@@ -181,7 +405,7 @@ class SelectionPalette(PalettePlugin):
 			intersectIcon = getImageViewFromPath('boolean/intersect')
 			for idx, (type,callback,filters) in enumerate(types):
 				rowSettings = self.rowSettings[idx]
-				typeLabel = translations[type]
+				typeLabel = rowSettings["label"]
 				
 				addButton = createImageButton(
 					icon=addIcon,
@@ -210,7 +434,7 @@ class SelectionPalette(PalettePlugin):
 				
 				self.buttonList.extend([addButton, subtractButton, intersectionButton, filterButton])
 				
-				rowIcon = getImageViewFromPath("base/Icon=" + type)
+				rowIcon = rowSettings["icon"]
 				rowImageView = ImageView((0, 0, 32, 32))
 				rowImageView.setImage(imageObject=rowIcon)
 				row = HorizontalStackView(
@@ -244,13 +468,36 @@ class SelectionPalette(PalettePlugin):
 				)
 				self.paletteView.group.stack.appendView(row)
 
+			# timing of the last command, see command_metrics.py
+			if showStats:
+				self.statsReadout = StatsReadout(TextBox("auto", metrics.readout(), sizeStyle="mini", alignment="center"))
+				self.paletteView.group.stack.appendView(self.statsReadout.textBox)
+				metrics.add_listener(self.statsReadout.update)
+
 			# Set dialog to NSView
 			self.dialog = self.paletteView.group.getNSView()
 
+			preloadIcons(["filter/Filter=" + typeFilter for row in self.rowSettings for typeFilter in row["filters"]])
+			paletteBuildTimes.append(time.perf_counter() - buildStart)
+
 		except:
 			print(traceback.format_exc())
 	def start(self):
+		startStart = time.perf_counter()
+		if Glyphs.defaults[HISTORY_DEPTH_DEFAULTS_KEY]:
+			history.depth = int(Glyphs.defaults[HISTORY_DEPTH_DEFAULTS_KEY])
+		if Glyphs.defaults[BURST_WINDOW_DEFAULTS_KEY] is not None:
+			transactions.window = float(Glyphs.defaults[BURST_WINDOW_DEFAULTS_KEY])
+		transactions.scheduleFlush = timers.scheduleFlush
+		metrics.logPath = Glyphs.defaults[METRICS_LOG_DEFAULTS_KEY]
+		if Glyphs.defaults[PRECOMPUTE_DEFAULTS_KEY] is not False:
+			precomputer.tolerance = extremeTolerance()
+			precomputer.expressions = PRESET_EXPRESSIONS + tuple(row_expression(expression, typeFilter) for expression in customRows() for typeFilter in FILTER_TERMS)
+			addCallbacks()
 		self.addMenuItems()
+		startupTimings["start"].append(time.perf_counter() - startStart)
+		if Glyphs.defaults[STARTUP_LOG_DEFAULTS_KEY]:
+			print(startupReport())
 		
 	@objc.python_method
 	def updateFilter(self, sender, callback, idx):
@@ -287,11 +534,35 @@ class SelectionPalette(PalettePlugin):
 			selectionItemIndex += 1
 			menuItems = (
 				(translations["undo_selection"],       self.undoSelection_,       "undo",      "["),
+				(translations["redo_selection"],       self.redoSelection_,       "undo",      ""),
 				(translations["continue_selection"],   self.continueSelection_,   "continue",  "]"),
+				(translations["continue_selection_to_end"], self.continueSelectionToEnd_, "continue", "}"),
+				(translations["continue_pattern_to_end"], self.continuePatternToEnd_, "continue", ""),
 				(translations["shrink_selection"],     self.shrinkSelection_,     "shrink",    "-"),
 				(translations["grow_selection"],       self.growSelection_,       "grow",      "+"),
+				(translations["shrink_selection_by"],  self.shrinkSelectionBy_,   "shrink",    ""),
+				(translations["grow_selection_by"],    self.growSelectionBy_,     "grow",      ""),
 				(translations["select_between"],       self.fillSelection_,       "between",   ":"),
+				(translations["select_within_radius"], self.selectWithinRadius_,  "grow",      ""),
+				(translations["select_nearest"],       self.selectNearest_,       "grow",      ""),
+				(translations["select_in_bounds"],     self.selectInSelectionBounds_, "between", ""),
+				(translations["select_similar"],       self.selectSimilar_,       "grow",      ""),
+				(translations["select_similar_in_font"], self.selectSimilarInFont_, "grow",    ""),
+				(translations["similarity_tolerance"], self.setSimilarityTolerance_, "grow",   ""),
+				(translations["select_matching"],      self.selectMatching_,      "between",   ""),
+				(translations["select_anchors_named"], self.selectAnchorsNamed_,  "between",   ""),
+				(translations["select_anchors_named_in_font"], self.selectAnchorsNamedInFont_, "between", ""),
+				(translations["select_whole_contours"], self.selectWholeContours_, "grow",     ""),
+				(translations["select_contours_in_font"], self.selectContoursInFont_, "grow", ""),
+				(translations["tiny_contour_area"],    self.setTinyContourArea_,  "grow",      ""),
+				(translations["contour_node_limit"],   self.setContourNodeLimit_, "grow",      ""),
+				(translations["save_named_selection"], self.saveNamedSelection_,  "undo",      ""),
+				(translations["restore_named_selection"], self.restoreNamedSelection_, "undo", ""),
+				(translations["delete_named_selection"], self.deleteNamedSelection_, "undo",   ""),
 				(translations["select_linked_hints"],  self.selectLinkedHints_,   "corners",   "<"),
+				(translations["boolean_add"](translations["linked_hints"]),       self.addLinkedHints_,       "corners", ""),
+				(translations["boolean_remove"](translations["linked_hints"]),    self.removeLinkedHints_,    "corners", ""),
+				(translations["boolean_intersect"](translations["linked_hints"]), self.intersectLinkedHints_, "corners", ""),
 			)
 			for menuItemLabel,menuItemCallback,menuItemIconKey,menuItemKey in menuItems:
 				item = NSMenuItem.alloc().initWithTitle_action_keyEquivalent_(menuItemLabel, menuItemCallback, menuItemKey)
@@ -299,361 +570,485 @@ class SelectionPalette(PalettePlugin):
 				item.setTarget_(self)
 				Glyphs.menu[EDIT_MENU].submenu().insertItem_atIndex_(item, selectionItemIndex)
 				selectionItemIndex += 1
+
+			# timings, see command_metrics.py, and the font-wide audit, see selection_audit.py
+			for menuItemLabel, menuItemCallback in (
+				(translations["profile_next_command"], self.profileNextCommand_),
+				(translations["print_command_stats"], self.printCommandStats_),
+				(translations["export_selection_audit"], self.exportSelectionAudit_),
+			):
+				item = NSMenuItem.alloc().initWithTitle_action_keyEquivalent_(menuItemLabel, menuItemCallback, "")
+				item.setTarget_(self)
+				Glyphs.menu[EDIT_MENU].submenu().insertItem_atIndex_(item, selectionItemIndex)
+				selectionItemIndex += 1
+
+			# which layers the commands and palette rows apply to
+			self.scopeMenu = NSMenu.alloc().initWithTitle_(translations["selection_scope"])
+			for scope in (SCOPE_CURRENT, SCOPE_SELECTED_LAYERS, SCOPE_MASTERS, SCOPE_TAB):
+				item = NSMenuItem.alloc().initWithTitle_action_keyEquivalent_(translations["scope_" + scope], self.setScope_, "")
+				item.setRepresentedObject_(scope)
+				item.setTarget_(self)
+				self.scopeMenu.addItem_(item)
+			scopeItem = NSMenuItem.alloc().initWithTitle_action_keyEquivalent_(translations["selection_scope"], None, "")
+			scopeItem.setSubmenu_(self.scopeMenu)
+			Glyphs.menu[EDIT_MENU].submenu().insertItem_atIndex_(scopeItem, selectionItemIndex)
+			self.updateScopeMenu()
 		except:
 			print(traceback.format_exc())
 			
 	# Helpers
-	def layer(self):
-		return Glyphs.font.selectedLayers[0]
-	@objc.python_method
-	def getSibling(self, node, next):
-		path = node.parent
-		length = len(path.nodes)
-		siblingIndex = 0
-		crossesBounds = False
-		
-		if next == True:
-			siblingIndex = (node.index + 1) % length
-			if siblingIndex == 0:
-				crossesBounds = True
-		else:
-			siblingIndex = (node.index - 1 + length) % length
-			if siblingIndex == length - 1:
-				crossesBounds = True
-		
-		if not path.closed and crossesBounds:
-			return node
-		else:
-			return path.nodes[siblingIndex]
 	@objc.python_method
-	def nextNode(self, node):
-		return self.getSibling(node, True)
+	def askSteps(self, title):
+		return self.askNumber(title, translations["steps_prompt"], STEPS_DEFAULTS_KEY, 2)
+	# a positive number, remembered for next time; None if cancelled or invalid
 	@objc.python_method
-	def prevNode(self, node):
-		return self.getSibling(node, False)
+	def askNumber(self, title, prompt, defaultsKey, default, numberType=int):
+		number = AskString(prompt, value=str(Glyphs.defaults[defaultsKey] or default), title=title)
+		try:
+			number = numberType(number)
+		except (TypeError, ValueError):
+			return None
+		if number <= 0:
+			return None
+		Glyphs.defaults[defaultsKey] = number
+		return number
 	
 	# 
 	# Selection methods
 	# 
 	def continueSelection_(self, sender):
 		try:
-			#  Need at least two nodes to infer a pattern
-			if len(self.layer().selection) >= 2:
-				lastNode = self.layer().selection[-1]
-				originNode = self.layer().selection[-2]
-				
-				# TODO make sure https://github.com/danielgamage/SelectionPalette/issues/8 doesn't regress
-				# Ensure that the last two nodes are on the same path
-				if (lastNode.parent == originNode.parent):
-					# Get difference of two nodes
-					if lastNode.index > originNode.index:
-						# normal diff
-						rhythm = lastNode.index - originNode.index
-					else:
-						# crossing bounds of path
-						rhythm = abs(originNode.index - len(originNode.parent.nodes)) + lastNode.index
-
-					# Move to node width rhythm
-					nodeToSelect = lastNode
-					i = 0
-					while i < rhythm:
-						nodeToSelect = nodeToSelect.nextNode
-						i += 1
-
-					# Select it
-					nodeToSelect.selected = True
+			self.selectWith_(lambda layer: [node for node in [continue_selection(layer)] if node], name="continue_selection")
+		except:
+			print(traceback.format_exc())
+	def continueSelectionToEnd_(self, sender):
+		try:
+			self.selectWith_(continue_selection_to_end, name="continue_selection_to_end")
+		except:
+			print(traceback.format_exc())
+	def continuePatternToEnd_(self, sender):
+		try:
+			self.selectWith_(lambda layer: continue_selection_to_end(layer, CONTINUE_PATTERN_LENGTH), name="continue_pattern_to_end")
 		except:
 			print(traceback.format_exc())
 	def undoSelection_(self, sender):
 		try: 
-			# Get last-selected node
-			lastNode = self.layer().selection[-1]
-
-			# Deselect it
-			lastNode.selected = False
+			with metrics.command("undo_selection"):
+				layers = self.layers()
+				if any(history.can_undo(layer) for layer in layers):
+					with metrics.phase(PHASE_SNAPSHOT):
+						changes = [(layer, history.undo(layer)) for layer in layers]
+					commit_selections(changes, Glyphs.font, record=False)
+				else:
+					# nothing to go back to, deselect last-selected node
+					self.deselectWith_(lambda layer: layer.selection[-1:], name="undo_selection")
+		except:
+			print(traceback.format_exc())
+	def redoSelection_(self, sender):
+		try:
+			with metrics.command("redo_selection"):
+				with metrics.phase(PHASE_SNAPSHOT):
+					changes = [(layer, history.redo(layer)) for layer in self.layers()]
+				commit_selections(changes, Glyphs.font, record=False)
 		except:
 			print(traceback.format_exc())
 	def growSelection_(self, sender):
 		try:
-			nodesToSelect = []
-
-			# Get nodes on outside edges of selection
-			for path in self.layer().paths:
-				for node in path.nodes:
-					if not node.selected:
-						if self.nextNode(node).selected or self.prevNode(node).selected:
-							nodesToSelect.append(node)
-
-			self.selectElements_(nodesToSelect)
+			self.selectWith_(grow_selection, name="grow_selection")
 		except:
 			print(traceback.format_exc())
 	def shrinkSelection_(self, sender):
 		try:
-			nodesToDeselect = []
-
-			# Get nodes on inside edges of selection
-			for path in self.layer().paths:
-				for node in path.nodes:
-					if node.selected:
-						if not self.nextNode(node).selected or not self.prevNode(node).selected:
-							nodesToDeselect.append(node)
-
-			self.deselectElements_(nodesToDeselect)
+			self.deselectWith_(shrink_selection, name="shrink_selection")
+		except:
+			print(traceback.format_exc())
+	def growSelectionBy_(self, sender):
+		try:
+			steps = self.askSteps(translations["grow_selection_by"])
+			if steps:
+				self.selectWith_(lambda layer: grow_selection(layer, steps), name="grow_selection_by")
+		except:
+			print(traceback.format_exc())
+	def shrinkSelectionBy_(self, sender):
+		try:
+			steps = self.askSteps(translations["shrink_selection_by"])
+			if steps:
+				self.deselectWith_(lambda layer: shrink_selection(layer, steps), name="shrink_selection_by")
 		except:
 			print(traceback.format_exc())
 	def fillSelection_(self, sender):
 		try:
-			nodesToSelect = []
-
-			if len(self.layer().selection) < 2: return
-
-			lastNode = self.layer().selection[-1]
-			originNode = self.layer().selection[-2]
-
-			# only allow filling if nodes are on same path
-			if (lastNode.parent == originNode.parent):
-				path = lastNode.parent
-
-				# sort nodes by index
-				if (lastNode.index > originNode.index):
-					node1 = originNode
-					node2 = lastNode
-				else:
-					node1 = lastNode
-					node2 = originNode
-
-				# check if shortest path is direct from node 1 to node 2
-				is_contiguous_shortest = (node2.index - node1.index <= node1.index + len(path.nodes) - node2.index)
-				is_contiguous = (not path.closed) or is_contiguous_shortest
+			self.selectWith_(fill_selection, name="fill_selection")
+		except:
+			print(traceback.format_exc())
+	def selectWithinRadius_(self, sender):
+		try:
+			radius = self.askNumber(translations["select_within_radius"], translations["radius_prompt"], RADIUS_DEFAULTS_KEY, 50, float)
+			if radius:
+				self.selectWith_(lambda layer: select_within_radius(layer, radius), name="select_within_radius")
+		except:
+			print(traceback.format_exc())
+	def selectNearest_(self, sender):
+		try:
+			count = self.askNumber(translations["select_nearest"], translations["steps_prompt"], NEAREST_DEFAULTS_KEY, 4)
+			if count:
+				self.selectWith_(lambda layer: select_nearest(layer, count), name="select_nearest")
+		except:
+			print(traceback.format_exc())
+	def selectInSelectionBounds_(self, sender):
+		try:
+			self.selectWith_(select_in_selection_bounds, name="select_in_selection_bounds")
+		except:
+			print(traceback.format_exc())
+	@objc.python_method
+	def similarityTolerances(self):
+		from node_similarity import LENGTH_TOLERANCE, ANGLE_TOLERANCE
+		lengthTolerance = Glyphs.defaults[SIMILAR_LENGTH_DEFAULTS_KEY]
+		angleTolerance = Glyphs.defaults[SIMILAR_ANGLE_DEFAULTS_KEY]
+		return (
+			LENGTH_TOLERANCE if lengthTolerance is None else float(lengthTolerance),
+			ANGLE_TOLERANCE if angleTolerance is None else float(angleTolerance),
+		)
+	def selectSimilar_(self, sender):
+		try:
+			from node_similarity import select_similar
+			lengthTolerance, angleTolerance = self.similarityTolerances()
+			self.selectWith_(lambda layer: select_similar(layer, lengthTolerance, angleTolerance), name="select_similar")
+		except:
+			print(traceback.format_exc())
+	# selects the matches in every master layer of the font and opens their glyphs in a tab
+	def selectSimilarInFont_(self, sender):
+		try:
+			font = Glyphs.font
+			layer = font.selectedLayers[0] if font and font.selectedLayers else None
+			if layer is None:
+				return
+			from node_similarity import find_similar
+			from batch_query import apply_matches, open_in_tab
+			lengthTolerance, angleTolerance = self.similarityTolerances()
+			with metrics.command("select_similar_in_font"):
+				with metrics.phase(PHASE_CLASSIFY):
+					matches = list(find_similar(font, layer, lengthTolerance, angleTolerance))
+				metrics.count("hits", sum(len(match.indices) for match in matches))
+				with metrics.phase(PHASE_COMMIT):
+					font.disableUpdateInterface()
+					try:
+						apply_matches(font, matches)
+					finally:
+						font.enableUpdateInterface()
+			open_in_tab(font, matches)
+		except:
+			print(traceback.format_exc())
+	def setSimilarityTolerance_(self, sender):
+		try:
+			from node_similarity import LENGTH_TOLERANCE, ANGLE_TOLERANCE
+			if self.askNumber(translations["similarity_tolerance"], translations["similarity_prompt"], SIMILAR_LENGTH_DEFAULTS_KEY, LENGTH_TOLERANCE, float) is None:
+				return
+			self.askNumber(translations["similarity_tolerance"], translations["similarity_angle_prompt"], SIMILAR_ANGLE_DEFAULTS_KEY, ANGLE_TOLERANCE, float)
+		except:
+			print(traceback.format_exc())
+	def selectMatching_(self, sender):
+		try:
+			expression = AskString(translations["filter_prompt"], value=Glyphs.defaults[FILTER_DEFAULTS_KEY] or "smooth & extreme", title=translations["select_matching"])
+			if not expression:
+				return
+			try:
+				compile_filter(expression)
+			except FilterError as e:
+				Message(str(e), translations["filter_error"])
+				return
+			Glyphs.defaults[FILTER_DEFAULTS_KEY] = expression
+			tolerance = extremeTolerance()
+			self.selectWith_(lambda layer: filter_nodes(layer, expression, tolerance), name="select_matching")
+		except:
+			print(traceback.format_exc())
 
-				if (is_contiguous):
-					# shortest (or only) path is direct from node 1 to node 2
-					nodesToSelect.extend(path.nodes[node1.index:node2.index])
-				else:
-					# shortest path crosses path bounds
-					nodesToSelect.extend(path.nodes[0:node1.index])
-					nodesToSelect.extend(path.nodes[node2.index:])
+	# (pattern, regex) from the user, None if cancelled or not a valid regular expression
+	@objc.python_method
+	def askAnchorPattern(self, title):
+		text = AskString(translations["anchor_pattern_prompt"], value=Glyphs.defaults[ANCHOR_PATTERN_DEFAULTS_KEY] or "_top", title=title)
+		if not text or not text.strip():
+			return None
+		pattern, regex = parse_anchor_pattern(text)
+		try:
+			anchor_name_matcher(pattern, regex)
+		except re.error as e:
+			Message(str(e), translations["anchor_pattern_error"])
+			return None
+		Glyphs.defaults[ANCHOR_PATTERN_DEFAULTS_KEY] = text
+		return pattern, regex
+	def selectAnchorsNamed_(self, sender):
+		try:
+			query = self.askAnchorPattern(translations["select_anchors_named"])
+			if query:
+				self.selectWith_(lambda layer: select_anchors_named(layer, *query), name="select_anchors_named")
+		except:
+			print(traceback.format_exc())
+	# selects them in every master layer of the font and opens the glyphs that have them in a tab
+	def selectAnchorsNamedInFont_(self, sender):
+		try:
+			font = Glyphs.font
+			if font is None:
+				return
+			query = self.askAnchorPattern(translations["select_anchors_named_in_font"])
+			if not query:
+				return
+			from batch_query import open_in_tab
+			with metrics.command("select_anchors_named_in_font"):
+				with metrics.phase(PHASE_CLASSIFY):
+					matches = list(find_anchors(font, *query))
+				metrics.count("hits", sum(len(match.indices) for match in matches))
+				with metrics.phase(PHASE_COMMIT):
+					font.disableUpdateInterface()
+					try:
+						apply_anchor_matches(font, matches)
+					finally:
+						font.enableUpdateInterface()
+			open_in_tab(font, matches)
+		except:
+			print(traceback.format_exc())
 
-				self.selectElements_(nodesToSelect)
+	@objc.python_method
+	def contourThresholds(self):
+		tinyArea = Glyphs.defaults[TINY_AREA_DEFAULTS_KEY]
+		maxNodes = Glyphs.defaults[MAX_NODES_DEFAULTS_KEY]
+		return (
+			TINY_AREA if tinyArea is None else float(tinyArea),
+			MAX_NODES if maxNodes is None else int(maxNodes),
+		)
+	def selectWholeContours_(self, sender):
+		try:
+			self.selectWith_(select_whole_contours, name="select_whole_contours")
+		except:
+			print(traceback.format_exc())
+	# selects the contours the row's filter picks in every master layer of the font, and
+	# opens the glyphs that have them in a tab
+	def selectContoursInFont_(self, sender):
+		try:
+			font = Glyphs.font
+			if font is None:
+				return
+			contourFilter = self.getFilter("contours")
+			tinyArea, maxNodes = self.contourThresholds()
+			from batch_query import apply_matches, open_in_tab
+			with metrics.command("select_contours_in_font"):
+				with metrics.phase(PHASE_CLASSIFY):
+					matches = list(find_contours(font, contourFilter, tinyArea, maxNodes))
+				metrics.count("hits", sum(len(match.indices) for match in matches))
+				with metrics.phase(PHASE_COMMIT):
+					font.disableUpdateInterface()
+					try:
+						apply_matches(font, matches)
+					finally:
+						font.enableUpdateInterface()
+			open_in_tab(font, matches)
+		except:
+			print(traceback.format_exc())
+	def setTinyContourArea_(self, sender):
+		try:
+			self.askNumber(translations["tiny_contour_area"], translations["tiny_contour_prompt"], TINY_AREA_DEFAULTS_KEY, TINY_AREA, float)
+		except:
+			print(traceback.format_exc())
+	def setContourNodeLimit_(self, sender):
+		try:
+			self.askNumber(translations["contour_node_limit"], translations["contour_node_prompt"], MAX_NODES_DEFAULTS_KEY, MAX_NODES)
 		except:
 			print(traceback.format_exc())
 
 	# 
 	# Selection utils
 	# 
-	def selectElements_withBooleanOperation_(self, elements, booleanOperation):
+	@objc.python_method
+	def scope(self):
+		return Glyphs.defaults[SCOPE_DEFAULTS_KEY] or SCOPE_CURRENT
+	@objc.python_method
+	def layers(self):
+		return scope_layers(Glyphs.font, self.scope())
+
+	# selector(layer) returns the elements of a layer to add, subtract or intersect with,
+	# for every layer in scope; mirror if it picks the same nodes in every compatible master
+	@objc.python_method
+	def performSelector_withOperation_(self, selector, operation, name="selection", mirror=False):
 		try:
-			self.layer().beginChanges()
-			
-			if (booleanOperation):
-				# selecting
-				self.layer().selection.extend(elements)
-			else:
-				# deselecting
-				for element in elements:
-					self.layer().selection.remove(element)
-
-			self.layer().endChanges()
-			# Glyphs.font.currentTab.redraw()
-		except:
-			print(traceback.format_exc())
-	def selectElements_(self, elements):
-		self.selectElements_withBooleanOperation_(elements, True)
-	def deselectElements_(self, elements):
-		self.selectElements_withBooleanOperation_(elements, False)
-
-	def performSelectionOnArray_andOperation_(self, selectionArray, operation):
-		try:
-			if operation == Operation.ADD:
-				self.selectElements_(selectionArray)
-			elif operation == Operation.SUBTRACT:
-				self.deselectElements_(selectionArray)
-			elif operation == Operation.INTERSECT:
-				elementsToDeselect = []
-				for element in self.layer().selection:
-					if not element in selectionArray:
-						elementsToDeselect.append(element)
-				self.deselectElements_(elementsToDeselect)
-		except:
-			print(traceback.format_exc())
-
-	def selectNodesByType_andSmooth_withOperation_andKey_(self, type, smooth, operation, key):
-		try:
-			selectionArray = []
-
-			# Get nodes on outside edges of selection
-			for path in self.layer().paths:
-				for node in path.nodes:
-					conditions = []
-					
-					typeFilter = self.getFilter(key)
-					if (typeFilter == "extremes"):
-						conditions.append(is_node_extreme(node))
-					if (typeFilter == "non_extremes"):
-						conditions.append(not is_node_extreme(node))
-
-					# properties
-					end_of_open_path = not path.closed and (node.index == 0 or node.index == len(path.nodes) - 1)
-					sharp_line_that_neighbors_offcurve = node.type == LINE and node.smooth is not True and (self.prevNode(node).type == OFFCURVE or self.nextNode(node).type == OFFCURVE)
-					smooth_end_of_open_path = end_of_open_path and ((node.smooth and type == CURVE) or node.type == LINE)
-					neighboring_offcurve = self.prevNode(node).type == OFFCURVE or self.nextNode(node).type == OFFCURVE
-					smooth_line = node.type == LINE and node.smooth is True
-
-					if type:
-						# for smooth curves, ignore end of open paths
-						if type == CURVE and (smooth is True):
-							if end_of_open_path:
-								conditions.append(False)
-						# for lines ignore those that neighbor offcurves AND are the end of a path
-						if type == LINE:
-							if end_of_open_path and neighboring_offcurve:
-								conditions.append(False)
-						# for sharp curves, ignore end of open paths that don't neighbor offcurves
-						if type == CURVE and (smooth is False) and end_of_open_path and not neighboring_offcurve:
-							conditions.append(False)
-
-						# for sharp curves, include sharp lines that neighbors offcurves
-						if type == CURVE and (smooth is False) and sharp_line_that_neighbors_offcurve:
-							conditions.append(True)
-						# for sharp curves, include smooth ends of open paths
-						elif type == CURVE and (smooth is False) and smooth_end_of_open_path:
-							conditions.append(True)
-						# for smooth curves, include smooth lines
-						elif type == CURVE and (smooth is True) and smooth_line:
-							conditions.append(True)
-						else:
-							conditions.append(node.type == type)
-							if smooth is not None:
-								conditions.append(node.smooth == smooth)
-
-					# if all conditions pass...
-					if all(conditions):
-						selectionArray.append(node)
-						# if looking for LINEs, select neighboring (non-OFFCURVE) node as well
-						if type == LINE:
-							if node.type == LINE:
-								if self.prevNode(node) and self.prevNode(node).type != OFFCURVE:
-									selectionArray.append(self.prevNode(node))
-							if self.nextNode(node).type != OFFCURVE:
-								selectionArray.append(self.nextNode(node))
-					
-
-			# Select them
-			self.performSelectionOnArray_andOperation_(selectionArray, operation)
+			with metrics.command(name):
+				scope = self.scope()
+				run_on_layers(scope_layers(Glyphs.font, scope), selector, operation, mirror=(mirror and scope == SCOPE_MASTERS), font=Glyphs.font)
 		except:
 			print(traceback.format_exc())
+	@objc.python_method
+	def selectWith_(self, selector, name="selection"):
+		self.performSelector_withOperation_(selector, Operation.ADD, name)
+	@objc.python_method
+	def deselectWith_(self, selector, name="selection"):
+		self.performSelector_withOperation_(selector, Operation.SUBTRACT, name)
+
+	# expression is a palette row key or a custom row's filter expression; the row's
+	# filter is added to it
+	@objc.python_method
+	def selectNodesMatching_withOperation_andKey_(self, expression, operation, key):
+		expression = row_expression(expression, self.getFilter(key))
+		try:
+			mirror = is_topological(expression)
+		except FilterError:
+			# filter_nodes reports it
+			mirror = False
+		tolerance = extremeTolerance()
+		self.performSelector_withOperation_(lambda layer: filter_nodes(layer, expression, tolerance), operation, name=key, mirror=mirror)
 	
 	# 
 	# Selection Types
 	# 
 	def selectSmoothCurves_withOperation_(self, sender, operation):
-		self.selectNodesByType_andSmooth_withOperation_andKey_(CURVE, True, operation, "smooth_nodes")
+		self.selectNodesMatching_withOperation_andKey_("smooth_nodes", operation, "smooth_nodes")
 	def selectSharpCurves_withOperation_(self, sender, operation):
-		self.selectNodesByType_andSmooth_withOperation_andKey_(CURVE, False, operation, "sharp_nodes")
+		self.selectNodesMatching_withOperation_andKey_("sharp_nodes", operation, "sharp_nodes")
 	def selectLines_withOperation_(self, sender, operation):
-		self.selectNodesByType_andSmooth_withOperation_andKey_(LINE, None, operation, "line_nodes")
+		self.selectNodesMatching_withOperation_andKey_("line_nodes", operation, "line_nodes")
 	def selectHandles_withOperation_(self, sender, operation):
-		self.selectNodesByType_andSmooth_withOperation_andKey_(OFFCURVE, None, operation, "handle_nodes")
+		self.selectNodesMatching_withOperation_andKey_("handle_nodes", operation, "handle_nodes")
 	def selectAnchors_withOperation_(self, sender, operation):
-		selectionArray = []
-		
 		typeFilter = self.getFilter("anchors")
-		
-		anchors = self.layer().anchors
-		for anchor in anchors:
-			if typeFilter == "all":
-				selectionArray.append(anchor)
-			elif typeFilter == "anchors" and anchor.name[0] != "_":
-				selectionArray.append(anchor)
-			elif typeFilter == "underscored_anchors" and anchor.name[0] == "_":
-				selectionArray.append(anchor)
-			elif typeFilter == "entry" and "entry" in anchor.name.lower():
-				selectionArray.append(anchor)
-			elif typeFilter == "exit" and "exit" in anchor.name.lower():
-				selectionArray.append(anchor)
-
-		self.performSelectionOnArray_andOperation_(selectionArray, operation)
-
+		self.performSelector_withOperation_(lambda layer: select_anchors(layer, typeFilter), operation, name="anchors")
+	# whole paths, picked by direction, area, node count or being a duplicate
+	def selectContours_withOperation_(self, sender, operation):
+		contourFilter = self.getFilter("contours")
+		tinyArea, maxNodes = self.contourThresholds()
+		self.performSelector_withOperation_(lambda layer: select_contours(layer, contourFilter, tinyArea, maxNodes), operation, name="contours")
 	def selectComponents_withOperation_(self, sender, operation):
-		selectionArray = []
-		
 		typeFilter = self.getFilter("components")
-		
-		for component in self.layer().components:
-			if typeFilter == "all":
-				selectionArray.append(component)
-			elif typeFilter == "locked" and component.locked:
-				selectionArray.append(component)
-			elif typeFilter == "unlocked" and not component.locked:
-				selectionArray.append(component)
-
-		self.performSelectionOnArray_andOperation_(selectionArray, operation)
+		self.performSelector_withOperation_(lambda layer: select_components(layer, typeFilter), operation, name="components")
 	def selectGuides_withOperation_(self, sender, operation):
-		try:
-			selectionArray = []
-
-			allGuides = []
-			globalGuides = Glyphs.font.selectedFontMaster.guides
-			localGuides = self.layer().guides
-			allGuides.extend(globalGuides)
-			allGuides.extend(localGuides)
-
-			typeFilter = self.getFilter("guides")
-
-			for guide in allGuides:
-				if typeFilter == "all":
-					selectionArray.append(guide)
-				elif typeFilter == "locked" and guide.locked:
-					selectionArray.append(guide)
-				elif typeFilter == "unlocked" and not guide.locked:
-					selectionArray.append(guide)
-				elif typeFilter == "global" and guide in globalGuides:
-					selectionArray.append(guide)
-				elif typeFilter == "local" and guide in localGuides:
-					selectionArray.append(guide)
+		typeFilter = self.getFilter("guides")
+		self.performSelector_withOperation_(lambda layer: select_guides(layer, layer.master.guides, typeFilter), operation, name="guides")
+	def selectPathComponents_withOperation_(self, sender, operation):
+		typeFilter = self.getFilter("path_components")
+		self.performSelector_withOperation_(lambda layer: select_path_components(layer, typeFilter), operation, name="path_components")
 
-			self.performSelectionOnArray_andOperation_(selectionArray, operation)
+	# 
+	# Named selections
+	# 
+	@objc.python_method
+	def askSelectionName(self, title, layer):
+		from named_selections import named_selection_names
+		names = named_selection_names(layer)
+		prompt = translations["named_selection_prompt"]
+		if names:
+			prompt += "\n" + translations["named_selection_saved"] % ", ".join(names)
+		name = AskString(prompt, value=Glyphs.defaults[NAMED_SELECTION_DEFAULTS_KEY] or (names[0] if names else ""), title=title)
+		if not name:
+			return None
+		Glyphs.defaults[NAMED_SELECTION_DEFAULTS_KEY] = name
+		return name
+	# saved on the current layer and, by node index, on the other compatible layers in scope
+	def saveNamedSelection_(self, sender):
+		try:
+			layers = self.layers()
+			if not layers:
+				return
+			name = self.askSelectionName(translations["save_named_selection"], layers[0])
+			if name:
+				from named_selections import save_named_selection
+				save_named_selection(layers[0], name, layers[1:])
 		except:
 			print(traceback.format_exc())
-
-	def selectPathComponents_withOperation_(self, sender, operation):
+	def restoreNamedSelection_(self, sender):
 		try:
-			selectionArray = []
-
-			typeFilter = self.getFilter("path_components")
-
-			for hint in self.layer().hints:
-				# if hint.type is in [CORNER, CAP, SEGMENT]
-				if typeFilter == "all"        and hint.type in [CORNER, CAP, SEGMENT]:
-					selectionArray.append(hint)
-				elif typeFilter == "corners"  and hint.type == CORNER:
-					selectionArray.append(hint)
-				elif typeFilter == "caps"     and hint.type == CAP:
-					selectionArray.append(hint)
-				elif typeFilter == "segments" and hint.type == SEGMENT:
-					selectionArray.append(hint)
-
-			self.performSelectionOnArray_andOperation_(selectionArray, operation)
+			layers = self.layers()
+			if not layers:
+				return
+			name = self.askSelectionName(translations["restore_named_selection"], layers[0])
+			if not name:
+				return
+			from named_selections import named_selection_elements
+			with metrics.command("restore_named_selection"):
+				with metrics.phase(PHASE_SNAPSHOT):
+					changes = [(layer, named_selection_elements(layer, name, sourceLayer=layers[0])) for layer in layers]
+				if not all(elements is None for layer, elements in changes):
+					commit_selections(changes, Glyphs.font)
+					return
+			Message(translations["named_selection_missing"], translations["restore_named_selection"])
+		except:
+			print(traceback.format_exc())
+	def deleteNamedSelection_(self, sender):
+		try:
+			layers = self.layers()
+			if not layers:
+				return
+			name = self.askSelectionName(translations["delete_named_selection"], layers[0])
+			if name:
+				from named_selections import delete_named_selection
+				for layer in layers:
+					delete_named_selection(layer, name)
 		except:
 			print(traceback.format_exc())
 
 	# 
 	# Transfers, Links
-	# TODO: make these transfers optional, and allow for removing from selection or adding to selection
 	# 
 	
 	# Transfers selection from origin nodes to their connected corner components, caps, brushes(?)
+	@objc.python_method
+	def transferLinkedHints(self, operation):
+		try:
+			with metrics.command("linked_hints"):
+				layers = self.layers()
+				with metrics.phase(PHASE_CLASSIFY):
+					changes = [(layer, linked_hints_result(layer, operation)) for layer in layers]
+				commit_selections(changes, Glyphs.font)
+		except:
+			print(traceback.format_exc())
 	def selectLinkedHints_(self, sender):
-		hints = self.layer().hints
-		deselectionArray = []
-		selectionArray = []
-		for element in self.layer().selection:
-			for hint in hints:
-				if hint.originNode == element or hint.targetNode == element:
-					deselectionArray.append(element)
-					selectionArray.append(hint)
-			
-		for element in deselectionArray:
-			element.selected = False
-		for element in selectionArray:
-			element.selected = True
+		self.transferLinkedHints(None)
+	def addLinkedHints_(self, sender):
+		self.transferLinkedHints(Operation.ADD)
+	def removeLinkedHints_(self, sender):
+		self.transferLinkedHints(Operation.SUBTRACT)
+	def intersectLinkedHints_(self, sender):
+		self.transferLinkedHints(Operation.INTERSECT)
+
+	# 
+	# Timings
+	# 
+	def profileNextCommand_(self, sender):
+		metrics.profile_next()
+	def printCommandStats_(self, sender):
+		print(metrics.report())
+		print(transactions.report())
+		print(precomputer.report())
+		from layer_snapshot import snapshot_report
+		font = Glyphs.font
+		print(snapshot_report(font.selectedLayers[0] if font and font.selectedLayers else None))
+	# what every row would select in every master layer of the font, as JSON Lines or CSV
+	def exportSelectionAudit_(self, sender):
+		try:
+			font = Glyphs.font
+			if font is None:
+				return
+			path = GetSaveFile(translations["export_selection_audit"], ProposedFileName="%s audit.jsonl" % (font.familyName or "Untitled"), filetypes=["jsonl", "csv"])
+			if not path:
+				return
+			from selection_audit import write_audit
+			with metrics.command("export_selection_audit"):
+				with metrics.phase(PHASE_CLASSIFY):
+					rows = write_audit(font, path, resume=False)
+				metrics.count("hits", rows)
+			print(translations["selection_audit_written"] % (rows, path))
+		except:
+			print(traceback.format_exc())
+
+	# 
+	# Scope
+	# 
+	def setScope_(self, sender):
+		try:
+			Glyphs.defaults[SCOPE_DEFAULTS_KEY] = sender.representedObject()
+			self.updateScopeMenu()
+		except:
+			print(traceback.format_exc())
+	@objc.python_method
+	def updateScopeMenu(self):
+		scope = self.scope()
+		for item in self.scopeMenu.itemArray():
+			item.setState_(NSOnState if item.representedObject() == scope else NSOffState)
+
+startupTimings["import"] = time.perf_counter() - _importStart
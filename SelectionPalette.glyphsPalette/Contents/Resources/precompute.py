@@ -0,0 +1,152 @@
+# encoding: utf-8
+
+from __future__ import print_function
+import threading
+import time
+import traceback
+from layer_snapshot import snapshot_for
+from node_classifier import EXTREME_TOLERANCE, numpy_available, layer_italic_angle
+from node_filters import ROW_EXPRESSIONS, FILTER_TERMS, preset_expression, topology_filter_mask
+from element_index import HintLinks
+
+#
+# Idle-time precompute
+#
+# When the active layer changes, or the user stops editing it for a moment, the palette
+# reads the layer into its topology on the main thread (the only place Glyphs objects may
+# be touched) and hands it to a worker thread, which computes the mask of every node row
+# and filter and the hint links into the topology's cache. The buttons look their masks
+# up in that same cache, so a click after an idle moment only maps the mask back to nodes.
+# A topology belongs to one revision of its layer: after an edit the layer gets a new,
+# empty one and the buttons compute synchronously, as they also do for a mask the worker
+# hasn't got to yet. Only the latest layer is worth working on, so a new job replaces one
+# that is still waiting.
+#
+
+IDLE_DELAY = 0.3
+PRECOMPUTED_KEY = "precomputed"
+# every node row with every filter
+PRESET_EXPRESSIONS = tuple(preset_expression(row, typeFilter) for row in ROW_EXPRESSIONS for typeFilter in FILTER_TERMS)
+
+class PrecomputeJob(object):
+	__slots__ = ("topology", "italicAngle", "hints", "hintTypes", "hintNodes")
+
+	def __init__(self, topology, italicAngle, hints, hintTypes, hintNodes):
+		self.topology = topology
+		self.italicAngle = italicAngle
+		self.hints = hints
+		self.hintTypes = hintTypes
+		# (originIndex, targetIndex) per hint, None for nodes that aren't on the layer
+		self.hintNodes = hintNodes
+
+# on the main thread: everything the worker needs, as plain Python values
+def snapshot_for_precompute(layer):
+	snapshot = snapshot_for(layer)
+	records = snapshot.hintRecords
+	hintTypes = tuple(record.type for record in records)
+	hintNodes = tuple((record.originIndex, record.targetIndex) for record in records)
+	return PrecomputeJob(snapshot.topology, layer_italic_angle(layer), snapshot.hints, hintTypes, hintNodes)
+
+# anywhere: fills the job's topology cache
+def precompute_topology(job, tolerance=EXTREME_TOLERANCE, expressions=PRESET_EXPRESSIONS):
+	topology = job.topology
+	if topology.cache.get(PRECOMPUTED_KEY):
+		return False
+	if numpy_available() and len(topology):
+		for expression in expressions:
+			topology_filter_mask(topology, expression, tolerance, job.italicAngle)
+	links = topology.cache.get("hintLinks")
+	if links is None or links.hintIds != tuple(id(hint) for hint in job.hints):
+		topology.cache["hintLinks"] = HintLinks.from_indices(job.hints, job.hintTypes, job.hintNodes, topology.nodes)
+	topology.cache[PRECOMPUTED_KEY] = True
+	return True
+
+# the synchronous version, e.g. to warm a layer from a script
+def precompute_layer(layer, tolerance=EXTREME_TOLERANCE, expressions=PRESET_EXPRESSIONS):
+	return precompute_topology(snapshot_for_precompute(layer), tolerance, expressions)
+
+class Precomputer(object):
+	def __init__(self, tolerance=EXTREME_TOLERANCE, expressions=PRESET_EXPRESSIONS):
+		self.tolerance = tolerance
+		# the palette adds its custom rows
+		self.expressions = expressions
+		self._condition = threading.Condition()
+		self._pending = None
+		self._running = None
+		self._thread = None
+		self.stats = {
+			"submitted": 0,
+			"replaced": 0,
+			"computed": 0,
+			"skipped": 0,
+			"failed": 0,
+			"lastSeconds": 0.0,
+		}
+
+	# on the main thread; the layer is read now and computed on the worker
+	def submit(self, layer):
+		job = snapshot_for_precompute(layer)
+		if job.topology.cache.get(PRECOMPUTED_KEY) or job.topology is self._running:
+			self.stats["skipped"] += 1
+			return None
+		with self._condition:
+			if self._pending is not None:
+				self.stats["replaced"] += 1
+			self._pending = job
+			self.stats["submitted"] += 1
+			if self._thread is None:
+				self._thread = threading.Thread(target=self._work, name="SelectionPalette precompute")
+				self._thread.daemon = True
+				self._thread.start()
+			self._condition.notify()
+		return job
+
+	@property
+	def busy(self):
+		return self._pending is not None or self._running is not None
+
+	# blocks until the worker is done, for scripts and tests
+	def wait(self, timeout=None):
+		deadline = None if timeout is None else time.monotonic() + timeout
+		with self._condition:
+			while self.busy:
+				remaining = None if deadline is None else deadline - time.monotonic()
+				if remaining is not None and remaining <= 0:
+					return False
+				self._condition.wait(remaining)
+		return True
+
+	def _work(self):
+		while True:
+			with self._condition:
+				while self._pending is None:
+					self._condition.wait()
+				job, self._pending = self._pending, None
+				self._running = job.topology
+			start = time.perf_counter()
+			try:
+				if precompute_topology(job, self.tolerance, self.expressions):
+					self.stats["computed"] += 1
+				else:
+					self.stats["skipped"] += 1
+			except Exception:
+				self.stats["failed"] += 1
+				print(traceback.format_exc())
+			self.stats["lastSeconds"] = time.perf_counter() - start
+			with self._condition:
+				self._running = None
+				self._condition.notify_all()
+
+	def report(self):
+		stats = self.stats
+		return "SelectionPalette precompute: %d layers submitted, %d computed, %d replaced before they ran, %d skipped, %d failed, last %.1f ms" % (
+			stats["submitted"],
+			stats["computed"],
+			stats["replaced"],
+			stats["skipped"],
+			stats["failed"],
+			stats["lastSeconds"] * 1000,
+		)
+
+# shared by the palette
+precomputer = Precomputer()
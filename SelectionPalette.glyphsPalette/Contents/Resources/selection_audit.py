@@ -0,0 +1,230 @@
+# encoding: utf-8
+
+from __future__ import print_function
+import csv
+import io
+import json
+import os
+from collections import OrderedDict, deque, namedtuple
+from selection_core import CORNER, CAP, SEGMENT, topology_for
+from selection_reference import select_nodes_by_type
+from node_classifier import EXTREME_TOLERANCE, numpy_available, layer_italic_angle
+from node_filters import ROW_EXPRESSIONS, ROW_TYPES, FILTER_TERMS, preset_expression, topology_filter_mask
+from contour_metrics import TINY_AREA, contour_paths
+from layer_snapshot import snapshot_for
+from batch_query import layer_data, layer_from_data
+
+#
+# Selection audit
+#
+# What every palette row would select in every glyph and master of a font, as counts: the
+# node rows with each of their filters, contours by kind, components, anchors and path
+# component hints. The node counts use the palette's own row expressions, so they are the
+# number of nodes a click on that row and filter selects.
+#
+# audit_font() walks the font lazily and yields an AuditRow per layer, one glyph at a
+# time, so memory stays flat however large the font is; write_audit() streams the rows to
+# a JSON Lines or CSV file as they come, e.g. from the Macro panel:
+#
+#   from selection_audit import write_audit
+#   write_audit(Glyphs.font, os.path.expanduser("~/Desktop/audit.jsonl"))
+#
+# Run again on the same file, write_audit() resumes after the last glyph that was written
+# completely instead of starting over. Outside of Glyphs, workers evaluate the outlines in
+# a process pool like batch_query.find_nodes; element counts are always read on the
+# calling thread.
+#
+
+NODE_FIELDS = tuple(row if typeFilter == "all" else "%s_%s" % (row, typeFilter) for row in ROW_EXPRESSIONS for typeFilter in FILTER_TERMS)
+CONTOUR_FIELDS = ("paths", "open_paths", "counters", "tiny_contours", "duplicate_contours")
+ELEMENT_FIELDS = ("components", "locked_components", "anchors", "corners", "caps", "segments", "other_hints")
+AUDIT_FIELDS = ("glyphName", "masterId", "layerId", "nodes") + NODE_FIELDS + CONTOUR_FIELDS + ELEMENT_FIELDS
+
+AuditRow = namedtuple("AuditRow", AUDIT_FIELDS)
+
+FORMAT_JSONL = "jsonl"
+FORMAT_CSV = "csv"
+
+#
+# Counting
+#
+
+def node_counts(layer, tolerance=EXTREME_TOLERANCE):
+	topology = topology_for(layer)
+	counts = []
+	if numpy_available() and len(topology):
+		italicAngle = layer_italic_angle(layer)
+		for row in ROW_EXPRESSIONS:
+			for typeFilter in FILTER_TERMS:
+				counts.append(int(topology_filter_mask(topology, preset_expression(row, typeFilter), tolerance, italicAngle).sum()))
+	else:
+		for row in ROW_EXPRESSIONS:
+			type, smooth = ROW_TYPES[row]
+			for typeFilter in FILTER_TERMS:
+				# the reference loop lists line ends twice; exact, upright extremes only
+				counts.append(len({id(node) for node in select_nodes_by_type(layer, type, smooth, typeFilter)}))
+	return counts
+
+def contour_counts(layer, tinyArea=TINY_AREA):
+	topology = topology_for(layer)
+	return [
+		sum(1 for pathIndex in range(len(topology.closed)) if topology.pathOffsets[pathIndex + 1] > topology.pathOffsets[pathIndex]),
+		len(contour_paths(topology, "open")),
+		len(contour_paths(topology, "counters")),
+		len(contour_paths(topology, "tiny", tinyArea)),
+		len(contour_paths(topology, "duplicates")),
+	]
+
+# from the layer's snapshot, on the main thread
+def element_counts(layer):
+	snapshot = snapshot_for(layer)
+	hintTypes = [record.type for record in snapshot.hintRecords]
+	return [
+		len(snapshot.componentRecords),
+		sum(1 for record in snapshot.componentRecords if record.locked),
+		len(snapshot.anchorRecords),
+		hintTypes.count(CORNER),
+		hintTypes.count(CAP),
+		hintTypes.count(SEGMENT),
+		sum(1 for type in hintTypes if type not in (CORNER, CAP, SEGMENT)),
+	]
+
+def audit_layer(glyphName, layer, tolerance=EXTREME_TOLERANCE, tinyArea=TINY_AREA, elements=None):
+	if elements is None:
+		elements = element_counts(layer)
+	return AuditRow(
+		glyphName, layer.associatedMasterId, layer.layerId, len(topology_for(layer)),
+		*(node_counts(layer, tolerance) + contour_counts(layer, tinyArea) + elements)
+	)
+
+#
+# Walking a font
+#
+
+# glyphs of the font in order, starting after the glyph named `after`
+def _glyphs_after(font, glyphNames=None, after=None):
+	if after is not None and font.glyphs[after] is None:
+		raise ValueError("Can't resume after %r, the font has no such glyph" % after)
+	glyphs = font.glyphs if glyphNames is None else (font.glyphs[name] for name in glyphNames)
+	skipping = after is not None
+	for glyph in glyphs:
+		if glyph is None:
+			continue
+		if skipping:
+			skipping = glyph.name != after
+			continue
+		yield glyph
+
+def _glyph_layers(glyph, masterLayersOnly):
+	return [layer for layer in glyph.layers if not masterLayersOnly or layer.layerId == layer.associatedMasterId]
+
+def _audit_chunk(tolerance, tinyArea, chunk):
+	return [audit_layer(data.glyphName, layer_from_data(data), tolerance, tinyArea, elements) for data, elements in chunk]
+
+# one AuditRow per (master) layer, glyph by glyph; `after` is a glyph name to resume after
+def audit_font(font, glyphNames=None, masterLayersOnly=True, tolerance=EXTREME_TOLERANCE, tinyArea=TINY_AREA, workers=0, chunkSize=32, after=None):
+	glyphs = _glyphs_after(font, glyphNames, after)
+	if workers == 0:
+		for glyph in glyphs:
+			for layer in _glyph_layers(glyph, masterLayersOnly):
+				yield audit_layer(glyph.name, layer, tolerance, tinyArea)
+		return
+
+	# multiprocessing is slow to import and only needed here
+	from concurrent.futures import ProcessPoolExecutor
+	workers = workers or os.cpu_count() or 1
+	with ProcessPoolExecutor(workers) as executor:
+		# only a few chunks in flight, and results in font order
+		pending = deque()
+		chunk = []
+		for glyph in glyphs:
+			for layer in _glyph_layers(glyph, masterLayersOnly):
+				chunk.append((layer_data(glyph.name, layer), element_counts(layer)))
+			if len(chunk) >= chunkSize:
+				pending.append(executor.submit(_audit_chunk, tolerance, tinyArea, chunk))
+				chunk = []
+				if len(pending) >= workers * 2:
+					for row in pending.popleft().result():
+						yield row
+		if chunk:
+			pending.append(executor.submit(_audit_chunk, tolerance, tinyArea, chunk))
+		while pending:
+			for row in pending.popleft().result():
+				yield row
+
+#
+# Writing
+#
+
+def _format_of(path):
+	return FORMAT_CSV if path.lower().endswith(".csv") else FORMAT_JSONL
+
+def _encode_rows(rows, format):
+	if format == FORMAT_CSV:
+		text = io.StringIO()
+		csv.writer(text, lineterminator="\n").writerows(rows)
+		return text.getvalue()
+	return "".join(json.dumps(OrderedDict(zip(AUDIT_FIELDS, row))) + "\n" for row in rows)
+
+def _glyph_name_of(line, format):
+	if format == FORMAT_CSV:
+		return next(csv.reader([line]))[0]
+	return json.loads(line)["glyphName"]
+
+# the last glyph written completely, after dropping an unfinished last glyph from the file:
+# its rows may be cut off, so it is audited again. None if there is nothing to resume
+def resume_cursor(path, format=None):
+	format = format or _format_of(path)
+	if not os.path.exists(path):
+		return None
+	with open(path, "rb+") as file:
+		# offsets where each glyph's rows start; only the last two are needed
+		starts = deque(maxlen=2)
+		offset = 0
+		glyphName = None
+		for line in file:
+			complete = line.endswith(b"\n")
+			name = None
+			if complete:
+				try:
+					name = _glyph_name_of(line.decode("utf-8"), format)
+				except (ValueError, KeyError, IndexError, StopIteration):
+					complete = False
+			if not complete:
+				break
+			if format == FORMAT_CSV and offset == 0:
+				# the header
+				starts.append((None, len(line)))
+			elif name != glyphName:
+				starts.append((name, offset))
+				glyphName = name
+			offset += len(line)
+		if not starts or starts[-1][0] is None:
+			file.truncate(starts[-1][1] if starts else 0)
+			return None
+		# the last glyph goes, in case more of its layers came after the break
+		file.truncate(starts[-1][1])
+		return starts[0][0] if len(starts) == 2 else None
+
+# streams the audit of a font to `path`, .csv or JSON Lines, a glyph's rows at a time;
+# resumes where an earlier run on the same file stopped unless resume is False. Returns the
+# number of rows written
+def write_audit(font, path, format=None, resume=True, **options):
+	format = format or _format_of(path)
+	after = resume_cursor(path, format) if resume else None
+	with open(path, "a" if resume else "w", encoding="utf-8", newline="") as file:
+		if format == FORMAT_CSV and file.tell() == 0:
+			file.write(_encode_rows([AUDIT_FIELDS], format))
+		written = 0
+		glyphRows = []
+		for row in audit_font(font, after=after, **options):
+			if glyphRows and row.glyphName != glyphRows[-1].glyphName:
+				file.write(_encode_rows(glyphRows, format))
+				file.flush()
+				written += len(glyphRows)
+				glyphRows = []
+			glyphRows.append(row)
+		if glyphRows:
+			file.write(_encode_rows(glyphRows, format))
+			written += len(glyphRows)
+	return written
@@ -0,0 +1,381 @@
+# encoding: utf-8
+
+from __future__ import print_function
+import sys
+from array import array
+from enum import Enum
+from collections import OrderedDict, defaultdict
+from selection_sets import SelectionSet, runs_from_indices, run_indices, normalize_runs, grow_runs, shrink_runs, difference_runs
+
+#
+# Headless selection engine
+#
+# Nothing in here touches AppKit or the running app. Every function works on anything
+# that quacks like a Glyphs layer, so the palette (live GSLayer objects) and the stand-in
+# model in selection_model.py (synthetic layers on any machine) run the same code:
+#
+#   layer  paths, selection, hints, anchors, components, guides, beginChanges(), endChanges()
+#   path   nodes, closed
+#   node   type, smooth, index, parent, selected, x, y, prevNode, nextNode
+#   hint   type, originNode, targetNode, selected
+#
+
+try:
+	from GlyphsApp import LINE, CURVE, OFFCURVE, CORNER, CAP, SEGMENT
+except ImportError:
+	# outside of Glyphs; same values as GlyphsApp so both models compare equal
+	LINE, CURVE, OFFCURVE = "line", "curve", "offcurve"
+	CORNER, CAP, SEGMENT = 16, 17, 19
+
+PATH_COMPONENT_TYPES = (CORNER, CAP, SEGMENT)
+
+# node types as small integers, for typed arrays; anything else (e.g. quadratic curves) is
+# TYPE_OTHER, and the topology keeps the type names as well
+TYPE_LINE, TYPE_CURVE, TYPE_OFFCURVE, TYPE_OTHER = 0, 1, 2, 3
+TYPE_CODES = {LINE: TYPE_LINE, CURVE: TYPE_CURVE, OFFCURVE: TYPE_OFFCURVE}
+_typeCodes = defaultdict(lambda: TYPE_OTHER, TYPE_CODES)
+
+class Operation(Enum):
+	ADD = 0
+	SUBTRACT = 1
+	INTERSECT = 2
+
+#
+# Topology
+#
+# Everything the node commands need to know about a layer's outline, read from the layer
+# once: the nodes of all paths in one flat list, where each path starts, which paths are
+# closed, and the index of every node's siblings. prev/next stop at the ends of open paths
+# (a node is its own sibling there), cyclicPrev/cyclicNext wrap around like
+# node.prevNode/nextNode.
+#
+# Coordinates, type codes and flags are kept in typed arrays, 8 bytes per coordinate and 1
+# per type code or flag instead of a pointer plus a Python object each, which numpy reads
+# without copying. The nodes themselves (the handles a selection is made of), their type
+# names and the sibling indices stay lists, which are quicker to build and index from
+# Python. Each attribute read from a live Glyphs object is a call across the PyObjC
+# bridge; bridgeReads counts those the topology made, which every command that reuses it
+# doesn't have to make again.
+#
+
+# attribute reads per path (nodes, closed) and per node (type, smooth, x, y)
+PATH_READS = 2
+NODE_READS = 4
+
+class LayerTopology(object):
+	def __init__(self, layer, key=None):
+		self.key = key
+		self.paths = list(layer.paths)
+		nodes = []
+		pathOffsets = [0]
+		closed = []
+		types = []
+		smooth = []
+		xs = []
+		ys = []
+		for path in self.paths:
+			pathNodes = list(path.nodes)
+			nodes.extend(pathNodes)
+			pathOffsets.append(len(nodes))
+			closed.append(bool(path.closed))
+			for node in pathNodes:
+				types.append(node.type)
+				smooth.append(bool(node.smooth))
+				xs.append(node.x)
+				ys.append(node.y)
+
+		count = len(nodes)
+		pathIndex = [0] * count
+		prev = list(range(-1, count - 1))
+		next = list(range(1, count + 1))
+		cyclicPrev = list(prev)
+		cyclicNext = list(next)
+		for p, pathClosed in enumerate(closed):
+			first, end = pathOffsets[p], pathOffsets[p + 1]
+			if first == end:
+				continue
+			last = end - 1
+			pathIndex[first:end] = [p] * (end - first)
+			cyclicPrev[first] = last
+			cyclicNext[last] = first
+			prev[first] = last if pathClosed else first
+			next[last] = first if pathClosed else last
+
+		self.nodes = nodes
+		self.pathOffsets = pathOffsets
+		self.closed = bytearray(closed)
+		self.types = types
+		self.typeCodes = bytes(map(_typeCodes.__getitem__, types))
+		self.smooth = bytearray(smooth)
+		self.x = array("d", xs)
+		self.y = array("d", ys)
+		self.pathIndex = pathIndex
+		self.prev = prev
+		self.next = next
+		self.cyclicPrev = cyclicPrev
+		self.cyclicNext = cyclicNext
+		self.bridgeReads = PATH_READS * len(self.paths) + NODE_READS * count
+		self._indices = None
+		# derived data (packed arrays, masks, ...) that lives and dies with this topology
+		self.cache = {}
+
+	def __len__(self):
+		return len(self.nodes)
+
+	# flat index of a node, None for anything that isn't a node of this layer
+	def index_of(self, node):
+		if self._indices is None:
+			self._indices = {id(node): i for i, node in enumerate(self.nodes)}
+		return self._indices.get(id(node))
+
+	def selection_mask(self, selection):
+		mask = bytearray(len(self.nodes))
+		for element in selection:
+			index = self.index_of(element)
+			if index is not None:
+				mask[index] = 1
+		return mask
+
+	def path_range(self, pathIndex):
+		return self.pathOffsets[pathIndex], self.pathOffsets[pathIndex + 1]
+
+	# bytes held by the topology itself, not counting the nodes it refers to or its cache
+	def footprint(self):
+		return sum(sys.getsizeof(value) for value in (
+			self.nodes, self.paths, self.pathOffsets, self.closed, self.types, self.typeCodes, self.smooth,
+			self.x, self.y, self.pathIndex, self.prev, self.next, self.cyclicPrev, self.cyclicNext,
+		))
+
+	# hash of a path's node types and coordinates, for caching things derived from them
+	def path_fingerprint(self, pathIndex):
+		first, end = self.path_range(pathIndex)
+		return (end - first, hash((tuple(self.types[first:end]), tuple(self.x[first:end]), tuple(self.y[first:end]))))
+
+# cheap fingerprint of a layer's content: the glyph's last change date (bumped by every edit
+# in Glyphs) plus the shape of every path, which is what the topology is made of
+def layer_content_key(layer):
+	glyph = getattr(layer, "parent", None)
+	lastChange = getattr(glyph, "lastChange", None)
+	return (lastChange, tuple((id(path), len(path.nodes), bool(path.closed)) for path in layer.paths))
+
+TOPOLOGY_CACHE_SIZE = 64
+_topologies = OrderedDict()
+# topologies built and reused, and the bridge reads the reuses didn't make
+topologyStats = {"built": 0, "reused": 0, "readsSaved": 0}
+
+def topology_for(layer):
+	key = layer_content_key(layer)
+	cached = _topologies.get(id(layer))
+	if cached is not None and cached[0] is layer and cached[1].key == key:
+		_topologies.move_to_end(id(layer))
+		topologyStats["reused"] += 1
+		topologyStats["readsSaved"] += cached[1].bridgeReads
+		return cached[1]
+	# what a topology caches can refer back to it (a layer snapshot does), so a topology that
+	# is replaced or evicted drops its cache rather than wait for the cycle collector; a
+	# whole-font walk would pile them up otherwise
+	if cached is not None:
+		cached[1].cache.clear()
+	topology = LayerTopology(layer, key)
+	topologyStats["built"] += 1
+	# keep the layer alive with its entry so its id can't be reused
+	_topologies[id(layer)] = (layer, topology)
+	_topologies.move_to_end(id(layer))
+	while len(_topologies) > TOPOLOGY_CACHE_SIZE:
+		evictedLayer, evicted = _topologies.popitem(last=False)[1]
+		evicted.cache.clear()
+	return topology
+
+# drop cached topology, for one layer or all of them (e.g. from a change notification)
+def invalidate_topology(layer=None):
+	if layer is None:
+		_topologies.clear()
+	else:
+		_topologies.pop(id(layer), None)
+
+#
+# Growing, shrinking, filling
+#
+
+# selected nodes as runs per path: {pathIndex: runs of indices within the path}
+def selection_runs(topology, selection):
+	indices = {}
+	pathIndex = topology.pathIndex
+	offsets = topology.pathOffsets
+	for element in selection:
+		index = topology.index_of(element)
+		if index is not None:
+			path = pathIndex[index]
+			indices.setdefault(path, []).append(index - offsets[path])
+	return {path: runs_from_indices(pathIndices) for path, pathIndices in indices.items()}
+
+def _run_nodes(topology, pathIndex, runs):
+	first = topology.pathOffsets[pathIndex]
+	nodes = topology.nodes
+	return [nodes[first + index] for index in run_indices(runs)]
+
+# nodes on outside edges of selection, `steps` nodes deep
+def grow_selection(layer, steps=1):
+	topology = topology_for(layer)
+	nodesToSelect = []
+	for pathIndex, runs in sorted(selection_runs(topology, layer.selection).items()):
+		first, end = topology.path_range(pathIndex)
+		grown = grow_runs(runs, end - first, topology.closed[pathIndex], steps)
+		nodesToSelect.extend(_run_nodes(topology, pathIndex, difference_runs(grown, runs)))
+	return nodesToSelect
+
+# nodes on inside edges of selection, `steps` nodes deep
+def shrink_selection(layer, steps=1):
+	topology = topology_for(layer)
+	nodesToDeselect = []
+	for pathIndex, runs in sorted(selection_runs(topology, layer.selection).items()):
+		first, end = topology.path_range(pathIndex)
+		shrunk = shrink_runs(runs, end - first, topology.closed[pathIndex], steps)
+		nodesToDeselect.extend(_run_nodes(topology, pathIndex, difference_runs(runs, shrunk)))
+	return nodesToDeselect
+
+# flat indices of the last `count` selected nodes, oldest first, as long as they are all on
+# the same path as the last one
+def _trailing_nodes(layer, topology, count):
+	selection = layer.selection
+	indices = []
+	pathIndex = None
+	for element in reversed(selection[-count:] if count else selection):
+		index = topology.index_of(element)
+		if index is None:
+			break
+		if pathIndex is None:
+			pathIndex = topology.pathIndex[index]
+		elif topology.pathIndex[index] != pathIndex:
+			break
+		indices.append(index)
+	indices.reverse()
+	return indices
+
+# flat indices of the two most recently selected nodes, if they are on the same path
+def _last_two_nodes(layer, topology):
+	indices = _trailing_nodes(layer, topology, 2)
+	if len(indices) < 2:
+		return None
+	return indices[0], indices[1]
+
+# nodes between the two most recently selected nodes
+def fill_selection(layer):
+	topology = topology_for(layer)
+	lastTwo = _last_two_nodes(layer, topology)
+	if lastTwo is None:
+		return []
+	originIndex, lastIndex = lastTwo
+	pathIndex = topology.pathIndex[lastIndex]
+	first, end = topology.path_range(pathIndex)
+	length = end - first
+
+	# sort nodes by index
+	index1, index2 = sorted((originIndex, lastIndex))
+	index1 -= first
+	index2 -= first
+
+	# check if shortest path is direct from node 1 to node 2
+	is_contiguous_shortest = (index2 - index1 <= index1 + length - index2)
+	is_contiguous = (not topology.closed[pathIndex]) or is_contiguous_shortest
+
+	if (is_contiguous):
+		# shortest (or only) path is direct from node 1 to node 2
+		run = (index1, index2)
+	else:
+		# shortest path crosses path bounds
+		run = (index2, index1 + length)
+	return _run_nodes(topology, pathIndex, normalize_runs([run], length, True))
+
+# next node in the rhythm of the last two selected nodes
+def continue_selection(layer):
+	topology = topology_for(layer)
+	# TODO make sure https://github.com/danielgamage/SelectionPalette/issues/8 doesn't regress
+	# Need two nodes on the same path to infer a pattern
+	lastTwo = _last_two_nodes(layer, topology)
+	if lastTwo is None:
+		return None
+	originIndex, lastIndex = lastTwo
+	first, end = topology.path_range(topology.pathIndex[lastIndex])
+	length = end - first
+
+	# Get difference of two nodes, crossing bounds of path if need be
+	rhythm = (lastIndex - originIndex) % length
+
+	# Move to node width rhythm, always around the path like node.nextNode
+	return topology.nodes[first + (lastIndex - first + rhythm) % length]
+
+CONTINUE_PATTERN_LENGTH = 8
+
+# every further node in the rhythm of the last `patternLength` selected nodes, up to the
+# end of an open path or once around a closed one. With more than two nodes the strides
+# between them repeat in turn, so 0, 1, 3 continues with 4, 6, 7, 9, ...
+def continue_selection_to_end(layer, patternLength=2):
+	topology = topology_for(layer)
+	pattern = _trailing_nodes(layer, topology, patternLength)
+	if len(pattern) < 2:
+		return []
+	first, end = topology.path_range(topology.pathIndex[pattern[-1]])
+	length = end - first
+
+	# positions unwrapped into increasing order, starting at the oldest node of the pattern
+	positions = [pattern[0] - first]
+	for index in pattern[1:]:
+		positions.append(positions[-1] + (index - first - positions[-1]) % length)
+	period = positions[-1] - positions[0]
+	if period == 0 or period >= length:
+		return []
+	if topology.closed[topology.pathIndex[pattern[-1]]]:
+		# stop before getting back to where the pattern started
+		limit = positions[0] + length
+	else:
+		limit = length
+
+	# each stride of the pattern repeats every `period` nodes
+	last = positions[-1]
+	unwrapped = []
+	for offset in positions[1:]:
+		unwrapped.extend(range(last + offset - positions[0], limit, period))
+	unwrapped.sort()
+	nodes = topology.nodes
+	return [nodes[first + position % length] for position in unwrapped]
+
+#
+# Applying selections
+#
+
+def select_elements(layer, elements, booleanOperation):
+	if (booleanOperation):
+		# selecting
+		perform_selection(layer, elements, Operation.ADD)
+	else:
+		# deselecting
+		perform_selection(layer, elements, Operation.SUBTRACT)
+
+def perform_selection(layer, selectionArray, operation):
+	result = selection_result(layer, selectionArray, operation)
+	if result is not None:
+		replace_selection(layer, result)
+
+# the layer's selection after the operation, None if it wouldn't change
+def selection_result(layer, selectionArray, operation):
+	current = SelectionSet(layer.selection)
+	if operation == Operation.ADD:
+		result = current.union(selectionArray)
+	elif operation == Operation.SUBTRACT:
+		result = current.difference(selectionArray)
+	elif operation == Operation.INTERSECT:
+		result = current.intersection(selectionArray)
+	else:
+		return None
+
+	# results only ever grow or shrink the current selection, so equal size means no change
+	if len(result) == len(current):
+		return None
+	return result
+
+# one assignment instead of an add/remove per element
+def replace_selection(layer, elements):
+	layer.beginChanges()
+	layer.selection = list(elements)
+	layer.endChanges()
@@ -0,0 +1,204 @@
+# encoding: utf-8
+
+from __future__ import print_function
+from array import array
+from collections import OrderedDict, deque
+from selection_core import topology_for
+from selection_sets import runs_from_indices
+
+#
+# Selection history
+#
+# Undo and redo for selection commands. Before a command replaces a layer's selection,
+# the old one is pushed onto the layer's undo stack as a snapshot: runs of flat node
+# indices plus the indices of selected anchors, components, hints and guides, tagged with
+# the layer's revision (its topology key). Snapshots hold no references to the elements,
+# so they are small and can't keep deleted ones alive; one taken on an earlier revision of
+# the layer no longer matches its outline and is dropped instead of restored.
+# The stacks are bounded by depth per layer and by total memory across layers, evicting
+# the oldest snapshots of the least recently used layers first.
+#
+
+HISTORY_DEPTH = 50
+HISTORY_MEMORY_LIMIT = 4 * 1024 * 1024
+HISTORY_LAYERS = 64
+
+# selectable elements other than nodes, by where they live
+OTHER_ELEMENTS = (
+	("anchors", lambda layer: layer.anchors),
+	("components", lambda layer: layer.components),
+	("hints", lambda layer: layer.hints),
+	("guides", lambda layer: layer.guides),
+	("masterGuides", lambda layer: layer.master.guides),
+)
+
+class SelectionSnapshot(object):
+	__slots__ = ("revision", "runs", "others")
+
+	def __init__(self, revision, runs, others):
+		self.revision = revision
+		# flat node index runs as start, stop, start, stop, ...
+		self.runs = runs
+		# (kind, indices) for the non-node elements
+		self.others = others
+
+	def __len__(self):
+		runs = self.runs
+		return sum(runs[i + 1] - runs[i] for i in range(0, len(runs), 2)) + sum(len(indices) for kind, indices in self.others)
+
+	@property
+	def nbytes(self):
+		return self.runs.itemsize * len(self.runs) + sum(indices.itemsize * len(indices) for kind, indices in self.others)
+
+def snapshot_selection(layer):
+	topology = topology_for(layer)
+	nodeIndices = []
+	rest = []
+	for element in layer.selection:
+		index = topology.index_of(element)
+		if index is None:
+			rest.append(element)
+		else:
+			nodeIndices.append(index)
+	runs = array("l")
+	for start, stop in runs_from_indices(nodeIndices):
+		runs.append(start)
+		runs.append(stop)
+
+	others = []
+	if rest:
+		restIds = {id(element) for element in rest}
+		for kind, elements in OTHER_ELEMENTS:
+			try:
+				elements = elements(layer)
+			except AttributeError:
+				continue
+			indices = array("l", (index for index, element in enumerate(elements or ()) if id(element) in restIds))
+			if indices:
+				others.append((kind, indices))
+	return SelectionSnapshot(topology.key, runs, tuple(others))
+
+# the elements a snapshot stands for, None if it was taken on another revision of the layer
+def restore_snapshot(layer, snapshot):
+	if snapshot.revision != topology_for(layer).key:
+		return None
+	return snapshot_elements(layer, snapshot)
+
+# the elements at the snapshot's indices in the layer, whatever its revision
+def snapshot_elements(layer, snapshot):
+	nodes = topology_for(layer).nodes
+	runs = snapshot.runs
+	elements = []
+	for i in range(0, len(runs), 2):
+		elements.extend(nodes[runs[i]:runs[i + 1]])
+	getters = dict(OTHER_ELEMENTS)
+	for kind, indices in snapshot.others:
+		layerElements = list(getters[kind](layer))
+		elements.extend(layerElements[index] for index in indices if index < len(layerElements))
+	return elements
+
+class LayerHistory(object):
+	def __init__(self, layer):
+		# keeps the layer alive with its history so its id can't be reused
+		self.layer = layer
+		self.undo = deque()
+		self.redo = []
+
+	@property
+	def nbytes(self):
+		return sum(snapshot.nbytes for snapshot in self.undo) + sum(snapshot.nbytes for snapshot in self.redo)
+
+class SelectionHistory(object):
+	def __init__(self, depth=HISTORY_DEPTH, memoryLimit=HISTORY_MEMORY_LIMIT, maxLayers=HISTORY_LAYERS):
+		self.depth = depth
+		self.memoryLimit = memoryLimit
+		self.maxLayers = maxLayers
+		self._layers = OrderedDict()
+		self.nbytes = 0
+
+	def _history(self, layer, create=False):
+		history = self._layers.get(id(layer))
+		if history is not None and history.layer is not layer:
+			self._drop(id(layer))
+			history = None
+		if history is None and create:
+			history = self._layers[id(layer)] = LayerHistory(layer)
+		if history is not None:
+			self._layers.move_to_end(id(layer))
+		return history
+
+	def _drop(self, key):
+		history = self._layers.pop(key)
+		self.nbytes -= history.nbytes
+
+	def _evict(self):
+		while len(self._layers) > self.maxLayers:
+			self._drop(next(iter(self._layers)))
+		for history in list(self._layers.values()):
+			while len(history.undo) > self.depth:
+				self.nbytes -= history.undo.popleft().nbytes
+		# least recently used layers first, their oldest snapshots first
+		for key in list(self._layers):
+			if self.nbytes <= self.memoryLimit:
+				break
+			history = self._layers[key]
+			while history.undo and self.nbytes > self.memoryLimit:
+				self.nbytes -= history.undo.popleft().nbytes
+			if not history.undo:
+				self._drop(key)
+
+	# call before a command replaces the layer's selection
+	def record(self, layer):
+		history = self._history(layer, create=True)
+		snapshot = snapshot_selection(layer)
+		history.undo.append(snapshot)
+		self.nbytes += snapshot.nbytes
+		for redone in history.redo:
+			self.nbytes -= redone.nbytes
+		history.redo = []
+		self._evict()
+
+	def _step(self, layer, source, target):
+		history = self._history(layer)
+		if history is None:
+			return None
+		stack = getattr(history, source)
+		if not stack:
+			return None
+		snapshot = stack.pop()
+		self.nbytes -= snapshot.nbytes
+		elements = restore_snapshot(layer, snapshot)
+		if elements is None:
+			# the layer was edited since; everything older is stale too
+			self._drop(id(layer))
+			return None
+		current = snapshot_selection(layer)
+		getattr(history, target).append(current)
+		self.nbytes += current.nbytes
+		self._evict()
+		return elements
+
+	# the selection before the last command, None if there is nothing to undo
+	def undo(self, layer):
+		return self._step(layer, "undo", "redo")
+
+	def redo(self, layer):
+		return self._step(layer, "redo", "undo")
+
+	def can_undo(self, layer):
+		history = self._history(layer)
+		return bool(history and history.undo)
+
+	def can_redo(self, layer):
+		history = self._history(layer)
+		return bool(history and history.redo)
+
+	def clear(self, layer=None):
+		if layer is None:
+			self._layers.clear()
+			self.nbytes = 0
+		elif id(layer) in self._layers:
+			self._drop(id(layer))
+
+# shared by every command of the palette
+history = SelectionHistory()
@@ -0,0 +1,388 @@
+# encoding: utf-8
+
+from __future__ import print_function
+import random
+from math import cos, sin, pi
+from selection_core import LINE, CURVE, OFFCURVE, CORNER, CAP, SEGMENT
+
+#
+# Stand-in model
+#
+# Bare-bones doubles of GSLayer, GSPath, GSNode & co. Only the parts selection_core reads
+# are implemented, under the same names, so the engine can be run and profiled without
+# Glyphs. Selection behaves like the app's: an ordered list on the layer that every
+# element's `selected` flag mirrors. Like GSGlyph.lastChange, a glyph's lastChange moves
+# on whenever a node, path or hint of one of its layers is changed, so cached topologies
+# of the layer are rebuilt.
+#
+
+class Point(object):
+	__slots__ = ("x", "y")
+	def __init__(self, x, y):
+		self.x = x
+		self.y = y
+	def __repr__(self):
+		return "<Point %s %s>" % (self.x, self.y)
+
+class Selection(list):
+	# removing an unselected element is a no-op, like -[NSMutableArray removeObject:]
+	def append(self, element):
+		if not element._selected:
+			element._selected = True
+			list.append(self, element)
+	def extend(self, elements):
+		for element in elements:
+			self.append(element)
+	def remove(self, element):
+		if element._selected:
+			element._selected = False
+			list.remove(self, element)
+	def clear(self):
+		for element in self:
+			element._selected = False
+		del self[:]
+
+# like GSLayer.userData, missing keys read as None
+class UserData(dict):
+	def __missing__(self, key):
+		return None
+
+# bumps lastChange of the glyph that `owner` (a node, path, hint or layer) belongs to
+def _touch(owner):
+	while owner is not None and not isinstance(owner, Glyph):
+		owner = owner.parent
+	if owner is not None:
+		owner.lastChange = (owner.lastChange or 0) + 1
+
+class Element(object):
+	_selected = False
+	parent = None
+	# attributes that change the glyph when set
+	_outlineFields = frozenset()
+
+	def __setattr__(self, name, value):
+		object.__setattr__(self, name, value)
+		if name in self._outlineFields:
+			_touch(self.parent)
+
+	def _layer(self):
+		return self.parent
+
+	@property
+	def selected(self):
+		return self._selected
+	@selected.setter
+	def selected(self, value):
+		if value:
+			self._layer().selection.append(self)
+		else:
+			self._layer().selection.remove(self)
+
+class Node(Element):
+	_outlineFields = frozenset(("type", "x", "y", "smooth"))
+
+	def __init__(self, type, x=0, y=0, smooth=False):
+		# a new node isn't in a glyph yet, nothing to bump
+		self.__dict__.update(type=type, x=x, y=y, smooth=smooth, index=0)
+
+	def _layer(self):
+		return self.parent.parent
+
+	@property
+	def position(self):
+		return Point(self.x, self.y)
+
+	# like GSNode, these wrap around the path even when it is open
+	@property
+	def prevNode(self):
+		nodes = self.parent.nodes
+		return nodes[self.index - 1]
+	@property
+	def nextNode(self):
+		nodes = self.parent.nodes
+		return nodes[(self.index + 1) % len(nodes)]
+
+	def __repr__(self):
+		return "<Node %s %s %s %s>" % (self.index, self.type, self.x, self.y)
+
+class Path(object):
+	def __init__(self, nodes=(), closed=True):
+		self.parent = None
+		self.closed = closed
+		self.nodes = list(nodes)
+
+	def __setattr__(self, name, value):
+		object.__setattr__(self, name, value)
+		if name == "nodes":
+			for index, node in enumerate(value):
+				node.parent = self
+				node.index = index
+		if name in ("nodes", "closed"):
+			_touch(self.parent)
+
+class Hint(Element):
+	_outlineFields = frozenset(("type", "originNode", "targetNode"))
+
+	def __init__(self, type, originNode=None, targetNode=None):
+		self.type = type
+		self.originNode = originNode
+		self.targetNode = targetNode
+
+class Anchor(Element):
+	def __init__(self, name, x=0, y=0):
+		self.name = name
+		self.x = x
+		self.y = y
+
+	@property
+	def position(self):
+		return Point(self.x, self.y)
+
+class Component(Element):
+	def __init__(self, componentName, x=0, y=0, locked=False):
+		self.componentName = componentName
+		self.x = x
+		self.y = y
+		self.locked = locked
+
+	@property
+	def position(self):
+		return Point(self.x, self.y)
+
+class Guide(Element):
+	def __init__(self, x=0, y=0, angle=0, locked=False):
+		self.x = x
+		self.y = y
+		self.angle = angle
+		self.locked = locked
+
+	@property
+	def position(self):
+		return Point(self.x, self.y)
+
+class Master(object):
+	def __init__(self, id="m01", name="Regular", guides=(), italicAngle=0):
+		self.id = id
+		self.name = name
+		self.italicAngle = italicAngle
+		self.guides = list(guides)
+		for guide in self.guides:
+			guide.parent = self
+
+class Layer(object):
+	def __init__(self, paths=(), hints=(), anchors=(), components=(), guides=(), master=None, layerId=None):
+		self.parent = None
+		self.master = master or Master()
+		self.associatedMasterId = self.master.id
+		self.layerId = layerId or self.master.id
+		self.paths = list(paths)
+		self.hints = list(hints)
+		self.anchors = list(anchors)
+		self.components = list(components)
+		self.guides = list(guides)
+		self.userData = UserData()
+		for element in self.paths + self.hints + self.anchors + self.components + self.guides:
+			element.parent = self
+		self._selection = Selection()
+		# beginChanges/endChanges bookkeeping, to see what a command costs in notifications
+		self.changeDepth = 0
+		self.changeCount = 0
+
+	def __setattr__(self, name, value):
+		object.__setattr__(self, name, value)
+		if name in ("paths", "hints"):
+			_touch(self)
+
+	@property
+	def selection(self):
+		return self._selection
+	@selection.setter
+	def selection(self, elements):
+		self._selection.clear()
+		self._selection.extend(elements)
+
+	def beginChanges(self):
+		self.changeDepth += 1
+	def endChanges(self):
+		self.changeDepth -= 1
+		if self.changeDepth == 0:
+			self.changeCount += 1
+
+	def nodes(self):
+		return [node for path in self.paths for node in path.nodes]
+
+# like GSGlyph.layers, also indexable by layer id
+class Layers(list):
+	def __getitem__(self, key):
+		if isinstance(key, str):
+			return next((layer for layer in self if layer.layerId == key), None)
+		return list.__getitem__(self, key)
+
+class Glyph(object):
+	def __init__(self, name, layers=()):
+		self.parent = None
+		self.name = name
+		self.lastChange = None
+		self.layers = Layers(layers)
+		for layer in self.layers:
+			layer.parent = self
+
+# like GSFont.glyphs, also indexable by glyph name
+class FontGlyphs(list):
+	def __getitem__(self, key):
+		if isinstance(key, str):
+			return next((glyph for glyph in self if glyph.name == key), None)
+		return list.__getitem__(self, key)
+
+class Font(object):
+	def __init__(self, glyphs=(), masters=()):
+		self.masters = list(masters) or [Master()]
+		self.glyphs = FontGlyphs(glyphs)
+		for glyph in self.glyphs:
+			glyph.parent = self
+		self.selectedLayers = []
+		self.currentTab = None
+		# tab texts opened with newTab()
+		self.tabs = []
+		# disableUpdateInterface/enableUpdateInterface bookkeeping
+		self.updateInterfaceDisabled = 0
+		self.interfaceUpdates = 0
+
+	@property
+	def selectedFontMaster(self):
+		return self.masters[0]
+
+	def newTab(self, tabText=""):
+		self.tabs.append(tabText)
+
+	def disableUpdateInterface(self):
+		self.updateInterfaceDisabled += 1
+	def enableUpdateInterface(self):
+		self.updateInterfaceDisabled -= 1
+		if self.updateInterfaceDisabled == 0:
+			self.interfaceUpdates += 1
+
+#
+# Synthetic outlines
+#
+
+# a roundish contour of exactly `count` nodes, mixing curve segments (two handles and an
+# on-curve) and line segments; coordinates are rounded like real font data, so the on-curve
+# nodes at 0/90/180/270 degrees come out as exact extremes
+def make_path(rng, count, closed=True, center=(0, 0), radius=300):
+	segments = []
+	remaining = count
+	while remaining > 0:
+		if remaining >= 3 and rng.random() < 0.7:
+			segments.append(CURVE)
+			remaining -= 3
+		else:
+			segments.append(LINE)
+			remaining -= 1
+
+	onCurves = len(segments)
+	cx, cy = center
+	points = []
+	for k in range(onCurves):
+		angle = 2 * pi * k / onCurves
+		points.append((angle, cx + radius * cos(angle), cy + radius * sin(angle)))
+
+	nodes = []
+	for k, segmentType in enumerate(segments):
+		angle, x, y = points[k]
+		if segmentType == CURVE:
+			prevAngle, px, py = points[k - 1]
+			handle = radius * 2 * pi / onCurves / 3
+			nodes.append(Node(OFFCURVE, round(px - sin(prevAngle) * handle), round(py + cos(prevAngle) * handle)))
+			nodes.append(Node(OFFCURVE, round(x + sin(angle) * handle), round(y - cos(angle) * handle)))
+			nodes.append(Node(CURVE, round(x), round(y), smooth=rng.random() < 0.7))
+		else:
+			nodes.append(Node(LINE, round(x), round(y), smooth=rng.random() < 0.1))
+
+	if not closed:
+		# open paths start on an on-curve node
+		while nodes[0].type == OFFCURVE:
+			nodes.append(nodes.pop(0))
+	return Path(nodes, closed=closed)
+
+def make_layer(nodeCount=1000, nodesPerPath=48, openRatio=0.1, seed=0, master=None):
+	rng = random.Random(seed)
+	paths = []
+	remaining = nodeCount
+	while remaining > 0:
+		count = min(nodesPerPath, remaining)
+		center = (len(paths) % 100 * 700, len(paths) // 100 * 700)
+		paths.append(make_path(rng, count, closed=rng.random() >= openRatio, center=center))
+		remaining -= count
+	return Layer(paths=paths, master=master)
+
+ANCHOR_NAMES = ("top", "bottom", "_top", "_bottom", "entry", "exit", "#exit", "ogonek", "_ogonek", "caret_1")
+# hint types that aren't path components, like TTStem and Glyphs' STEM
+OTHER_HINT_TYPES = (0, 1)
+
+# adds `hints` hints on random nodes (mostly corners, caps and segments), and anchors,
+# components, local guides and master guides spread over the outline's bounds
+def populate_layer(layer, hints=0, anchors=0, components=0, guides=0, globalGuides=0, seed=0):
+	rng = random.Random(seed)
+	nodes = layer.nodes()
+	width = max(len(layer.paths), 1) ** 0.5 * 700
+	point = lambda: (rng.randrange(-300, int(width)), rng.randrange(-300, int(width)))
+	if nodes:
+		hintTypes = (CORNER, CAP, SEGMENT) + OTHER_HINT_TYPES
+		for _ in range(hints):
+			originNode = rng.choice(nodes)
+			targetNode = rng.choice(nodes) if rng.random() < 0.3 else None
+			layer.hints.append(Hint(rng.choice(hintTypes), originNode, targetNode))
+	for _ in range(anchors):
+		layer.anchors.append(Anchor(rng.choice(ANCHOR_NAMES), *point()))
+	for _ in range(components):
+		layer.components.append(Component("component%d" % rng.randrange(100), *point(), locked=rng.random() < 0.2))
+	for _ in range(guides):
+		layer.guides.append(Guide(*point(), angle=rng.choice((0, 90, 45)), locked=rng.random() < 0.2))
+	for element in layer.hints + layer.anchors + layer.components + layer.guides:
+		element.parent = layer
+	for _ in range(globalGuides):
+		guide = Guide(*point(), angle=rng.choice((0, 90)), locked=rng.random() < 0.2)
+		guide.parent = layer.master
+		layer.master.guides.append(guide)
+	return layer
+
+# turns some of the paths into what the contours row looks for: every `every` paths, one
+# is mirrored (a counter), one shrunk to a hundredth (tiny) and one made a copy of the path
+# before it (a duplicate, where the two have the same node count)
+def vary_contours(layer, every=10):
+	for pathIndex, path in enumerate(layer.paths):
+		nodes = path.nodes
+		if not nodes:
+			continue
+		kind = pathIndex % every
+		centerX = (min(node.x for node in nodes) + max(node.x for node in nodes)) / 2.0
+		centerY = (min(node.y for node in nodes) + max(node.y for node in nodes)) / 2.0
+		if kind == 1:
+			for node in nodes:
+				node.x = 2 * centerX - node.x
+		elif kind == 2:
+			for node in nodes:
+				node.x = centerX + (node.x - centerX) / 100.0
+				node.y = centerY + (node.y - centerY) / 100.0
+		elif kind == 3 and pathIndex and len(layer.paths[pathIndex - 1].nodes) == len(nodes):
+			previous = layer.paths[pathIndex - 1]
+			path.closed = previous.closed
+			for node, original in zip(nodes, previous.nodes):
+				node.type, node.x, node.y, node.smooth = original.type, original.x, original.y, original.smooth
+	return layer
+
+# glyphs with one layer per master; the masters share the same outlines, shifted, so they
+# stay compatible
+def make_font(glyphCount=100, masterCount=2, nodeCount=200, nodesPerPath=48, openRatio=0.1, seed=0):
+	masters = [Master(id="m%02d" % (index + 1), name="Master %d" % (index + 1)) for index in range(masterCount)]
+	glyphs = []
+	for glyphIndex in range(glyphCount):
+		layers = []
+		for masterIndex, master in enumerate(masters):
+			layer = make_layer(nodeCount, nodesPerPath, openRatio, seed=seed + glyphIndex, master=master)
+			for node in layer.nodes():
+				node.x += masterIndex * 10
+			layers.append(layer)
+		glyphs.append(Glyph("glyph%05d" % glyphIndex, layers))
+	return Font(glyphs, masters)
@@ -0,0 +1,316 @@
+# encoding: utf-8
+
+from __future__ import print_function
+from math import atan2, pi
+from selection_core import LINE, CURVE, OFFCURVE, CORNER, CAP, SEGMENT, PATH_COMPONENT_TYPES
+
+#
+# Reference implementations
+#
+# The original node-by-node loops of the palette, kept verbatim. They walk the live
+# objects and ask every node for its siblings and selection state, so they are slow, but
+# they define what each command selects: the cached and vectorized code paths in
+# selection_core and node_classifier have to agree with them exactly.
+#
+
+#
+# Siblings
+#
+
+# like node.prevNode/nextNode, but stops at the ends of open paths (returns the node itself)
+def get_sibling(node, next):
+	path = node.parent
+	length = len(path.nodes)
+	siblingIndex = 0
+	crossesBounds = False
+
+	if next == True:
+		siblingIndex = (node.index + 1) % length
+		if siblingIndex == 0:
+			crossesBounds = True
+	else:
+		siblingIndex = (node.index - 1 + length) % length
+		if siblingIndex == length - 1:
+			crossesBounds = True
+
+	if not path.closed and crossesBounds:
+		return node
+	else:
+		return path.nodes[siblingIndex]
+
+def next_node(node):
+	return get_sibling(node, True)
+
+def prev_node(node):
+	return get_sibling(node, False)
+
+#
+# Extremes
+#
+
+getAngleBetweenPoints = lambda p1, p2: atan2(p2.y - p1.y, p2.x - p1.x) * 180 / pi
+isMultipleOf90 = lambda angle: (angle + 360) % 90 == 0
+
+def is_node_extreme(node):
+	node1 = None
+	node2 = None
+	node3 = None
+
+	if (node.type in [CURVE, LINE]) and (node.prevNode.type == OFFCURVE or node.nextNode.type == OFFCURVE):
+		node1 = node.prevNode
+		node2 = node
+		node3 = node.nextNode
+	elif node.type == OFFCURVE:
+		if node.prevNode.type in [CURVE, LINE]:
+			node1 = node.prevNode.prevNode
+			node2 = node.prevNode
+			node3 = node
+		elif node.nextNode.type in [CURVE, LINE]:
+			node1 = node
+			node2 = node.nextNode
+			node3 = node.nextNode.nextNode
+
+	if (node1 and node2 and node3):
+		angle1 = getAngleBetweenPoints(node1, node2)
+		angle2 = getAngleBetweenPoints(node2, node3)
+		# TODO: check italic angle for masters with an italic angle
+
+		is_extreme = angle1 == angle2 and isMultipleOf90(angle1)
+		return is_extreme
+	else:
+		return False
+
+#
+# Nodes by type
+#
+
+def select_nodes_by_type(layer, type, smooth, typeFilter="all"):
+	selectionArray = []
+
+	for path in layer.paths:
+		for node in path.nodes:
+			conditions = []
+
+			if (typeFilter == "extremes"):
+				conditions.append(is_node_extreme(node))
+			if (typeFilter == "non_extremes"):
+				conditions.append(not is_node_extreme(node))
+
+			# properties
+			end_of_open_path = not path.closed and (node.index == 0 or node.index == len(path.nodes) - 1)
+			sharp_line_that_neighbors_offcurve = node.type == LINE and node.smooth is not True and (prev_node(node).type == OFFCURVE or next_node(node).type == OFFCURVE)
+			smooth_end_of_open_path = end_of_open_path and ((node.smooth and type == CURVE) or node.type == LINE)
+			neighboring_offcurve = prev_node(node).type == OFFCURVE or next_node(node).type == OFFCURVE
+			smooth_line = node.type == LINE and node.smooth is True
+
+			if type:
+				# for smooth curves, ignore end of open paths
+				if type == CURVE and (smooth is True):
+					if end_of_open_path:
+						conditions.append(False)
+				# for lines ignore those that neighbor offcurves AND are the end of a path
+				if type == LINE:
+					if end_of_open_path and neighboring_offcurve:
+						conditions.append(False)
+				# for sharp curves, ignore end of open paths that don't neighbor offcurves
+				if type == CURVE and (smooth is False) and end_of_open_path and not neighboring_offcurve:
+					conditions.append(False)
+
+				# for sharp curves, include sharp lines that neighbors offcurves
+				if type == CURVE and (smooth is False) and sharp_line_that_neighbors_offcurve:
+					conditions.append(True)
+				# for sharp curves, include smooth ends of open paths
+				elif type == CURVE and (smooth is False) and smooth_end_of_open_path:
+					conditions.append(True)
+				# for smooth curves, include smooth lines
+				elif type == CURVE and (smooth is True) and smooth_line:
+					conditions.append(True)
+				else:
+					conditions.append(node.type == type)
+					if smooth is not None:
+						conditions.append(node.smooth == smooth)
+
+			# if all conditions pass...
+			if all(conditions):
+				selectionArray.append(node)
+				# if looking for LINEs, select neighboring (non-OFFCURVE) node as well
+				if type == LINE:
+					if node.type == LINE:
+						if prev_node(node) and prev_node(node).type != OFFCURVE:
+							selectionArray.append(prev_node(node))
+					if next_node(node).type != OFFCURVE:
+						selectionArray.append(next_node(node))
+
+	return selectionArray
+
+#
+# Growing, shrinking, filling
+#
+
+# nodes on outside edges of selection
+def grow_selection(layer):
+	nodesToSelect = []
+	for path in layer.paths:
+		for node in path.nodes:
+			if not node.selected:
+				if next_node(node).selected or prev_node(node).selected:
+					nodesToSelect.append(node)
+	return nodesToSelect
+
+# nodes on inside edges of selection
+def shrink_selection(layer):
+	nodesToDeselect = []
+	for path in layer.paths:
+		for node in path.nodes:
+			if node.selected:
+				if not next_node(node).selected or not prev_node(node).selected:
+					nodesToDeselect.append(node)
+	return nodesToDeselect
+
+# nodes between the two most recently selected nodes
+def fill_selection(layer):
+	nodesToSelect = []
+
+	selection = layer.selection
+	if len(selection) < 2: return nodesToSelect
+
+	lastNode = selection[-1]
+	originNode = selection[-2]
+
+	# only allow filling if nodes are on same path
+	if (lastNode.parent == originNode.parent):
+		path = lastNode.parent
+
+		# sort nodes by index
+		if (lastNode.index > originNode.index):
+			node1 = originNode
+			node2 = lastNode
+		else:
+			node1 = lastNode
+			node2 = originNode
+
+		# check if shortest path is direct from node 1 to node 2
+		is_contiguous_shortest = (node2.index - node1.index <= node1.index + len(path.nodes) - node2.index)
+		is_contiguous = (not path.closed) or is_contiguous_shortest
+
+		if (is_contiguous):
+			# shortest (or only) path is direct from node 1 to node 2
+			nodesToSelect.extend(path.nodes[node1.index:node2.index])
+		else:
+			# shortest path crosses path bounds
+			nodesToSelect.extend(path.nodes[0:node1.index])
+			nodesToSelect.extend(path.nodes[node2.index:])
+
+	return nodesToSelect
+
+# next node in the rhythm of the last two selected nodes
+def continue_selection(layer):
+	selection = layer.selection
+	#  Need at least two nodes to infer a pattern
+	if len(selection) < 2:
+		return None
+	lastNode = selection[-1]
+	originNode = selection[-2]
+
+	# TODO make sure https://github.com/danielgamage/SelectionPalette/issues/8 doesn't regress
+	# Ensure that the last two nodes are on the same path
+	if (lastNode.parent != originNode.parent):
+		return None
+
+	# Get difference of two nodes
+	if lastNode.index > originNode.index:
+		# normal diff
+		rhythm = lastNode.index - originNode.index
+	else:
+		# crossing bounds of path
+		rhythm = abs(originNode.index - len(originNode.parent.nodes)) + lastNode.index
+
+	# Move to node width rhythm
+	nodeToSelect = lastNode
+	i = 0
+	while i < rhythm:
+		nodeToSelect = nodeToSelect.nextNode
+		i += 1
+	return nodeToSelect
+
+#
+# Links
+#
+
+# selected nodes and the corner components, caps, brushes(?) attached to them
+def linked_hints(layer):
+	hints = layer.hints
+	deselectionArray = []
+	selectionArray = []
+	for element in layer.selection:
+		for hint in hints:
+			if hint.originNode == element or hint.targetNode == element:
+				deselectionArray.append(element)
+				selectionArray.append(hint)
+	return deselectionArray, selectionArray
+
+#
+# Other elements
+#
+
+def select_anchors(layer, typeFilter):
+	selectionArray = []
+	for anchor in layer.anchors:
+		if typeFilter == "all":
+			selectionArray.append(anchor)
+		elif typeFilter == "anchors" and anchor.name[0] != "_":
+			selectionArray.append(anchor)
+		elif typeFilter == "underscored_anchors" and anchor.name[0] == "_":
+			selectionArray.append(anchor)
+		elif typeFilter == "entry" and "entry" in anchor.name.lower():
+			selectionArray.append(anchor)
+		elif typeFilter == "exit" and "exit" in anchor.name.lower():
+			selectionArray.append(anchor)
+	return selectionArray
+
+def select_components(layer, typeFilter):
+	selectionArray = []
+	for component in layer.components:
+		if typeFilter == "all":
+			selectionArray.append(component)
+		elif typeFilter == "locked" and component.locked:
+			selectionArray.append(component)
+		elif typeFilter == "unlocked" and not component.locked:
+			selectionArray.append(component)
+	return selectionArray
+
+# global guides live on the master, local guides on the layer
+def select_guides(layer, globalGuides, typeFilter):
+	selectionArray = []
+
+	allGuides = []
+	localGuides = layer.guides
+	allGuides.extend(globalGuides)
+	allGuides.extend(localGuides)
+
+	for guide in allGuides:
+		if typeFilter == "all":
+			selectionArray.append(guide)
+		elif typeFilter == "locked" and guide.locked:
+			selectionArray.append(guide)
+		elif typeFilter == "unlocked" and not guide.locked:
+			selectionArray.append(guide)
+		elif typeFilter == "global" and guide in globalGuides:
+			selectionArray.append(guide)
+		elif typeFilter == "local" and guide in localGuides:
+			selectionArray.append(guide)
+	return selectionArray
+
+def select_path_components(layer, typeFilter):
+	selectionArray = []
+	for hint in layer.hints:
+		# if hint.type is in [CORNER, CAP, SEGMENT]
+		if typeFilter == "all"        and hint.type in PATH_COMPONENT_TYPES:
+			selectionArray.append(hint)
+		elif typeFilter == "corners"  and hint.type == CORNER:
+			selectionArray.append(hint)
+		elif typeFilter == "caps"     and hint.type == CAP:
+			selectionArray.append(hint)
+		elif typeFilter == "segments" and hint.type == SEGMENT:
+			selectionArray.append(hint)
+	return selectionArray
@@ -0,0 +1,159 @@
+# encoding: utf-8
+
+from __future__ import print_function
+
+#
+# Selection sets
+#
+# Ordered sets of layer elements for the Add/Subtract/Intersect operations. Membership is
+# keyed on id(): PyObjC hands out one proxy per live ObjC object, so the id is stable for as
+# long as the set holds on to the element, and we never go through GSNode's -isEqual:.
+# Every operation is linear in the sizes of its inputs and keeps selection order.
+#
+
+class SelectionSet(object):
+	__slots__ = ("_items",)
+
+	def __init__(self, elements=()):
+		if isinstance(elements, SelectionSet):
+			self._items = dict(elements._items)
+		else:
+			self._items = {id(element): element for element in elements}
+
+	@classmethod
+	def _fromItems(cls, items):
+		selectionSet = cls()
+		selectionSet._items = items
+		return selectionSet
+
+	def __len__(self):
+		return len(self._items)
+
+	def __iter__(self):
+		return iter(self._items.values())
+
+	def __contains__(self, element):
+		return id(element) in self._items
+
+	def __repr__(self):
+		return "<SelectionSet %d elements>" % len(self._items)
+
+	def list(self):
+		return list(self._items.values())
+
+	# elements of both, new ones appended in the order given
+	def union(self, elements):
+		items = dict(self._items)
+		for element in elements:
+			items.setdefault(id(element), element)
+		return self._fromItems(items)
+
+	def difference(self, elements):
+		other = _keys(elements)
+		return self._fromItems({key: element for key, element in self._items.items() if key not in other})
+
+	def intersection(self, elements):
+		other = _keys(elements)
+		return self._fromItems({key: element for key, element in self._items.items() if key in other})
+
+def _keys(elements):
+	if isinstance(elements, SelectionSet):
+		return elements._items
+	return {id(element) for element in elements}
+
+#
+# Runs
+#
+# Node selections on a path as sorted, non-overlapping, half-open runs of node indices:
+# [(start, stop), ...]. Growing, shrinking and filling work on the run ends only, so they
+# cost O(runs) however many nodes the runs cover or how many steps are taken at once.
+# On closed paths runs wrap around: a run that ends at the last node and one that starts
+# at the first are the same run, and (8, 12) on a 10-node path means nodes 8, 9, 0, 1.
+#
+
+def runs_from_indices(indices):
+	runs = []
+	for index in sorted(indices):
+		if runs and index <= runs[-1][1]:
+			if index == runs[-1][1]:
+				runs[-1] = (runs[-1][0], index + 1)
+		else:
+			runs.append((index, index + 1))
+	return runs
+
+def run_indices(runs):
+	for start, stop in runs:
+		for index in range(start, stop):
+			yield index
+
+def run_length(runs):
+	return sum(stop - start for start, stop in runs)
+
+# back into sorted, merged runs within [0, length): clipped on open paths, wrapped on closed ones
+def normalize_runs(runs, length, closed):
+	pieces = []
+	for start, stop in runs:
+		if closed:
+			if stop - start >= length:
+				return [(0, length)] if length else []
+			start, stop = start % length, start % length + (stop - start)
+			if stop > length:
+				pieces.append((0, stop - length))
+				stop = length
+		else:
+			start, stop = max(start, 0), min(stop, length)
+		if start < stop:
+			pieces.append((start, stop))
+
+	pieces.sort()
+	merged = []
+	for start, stop in pieces:
+		if merged and start <= merged[-1][1]:
+			merged[-1] = (merged[-1][0], max(stop, merged[-1][1]))
+		else:
+			merged.append((start, stop))
+	return merged
+
+# joins the run at the end of a closed path with the one at its start
+def _unwrap_runs(runs, length, closed):
+	if closed and len(runs) > 1 and runs[0][0] == 0 and runs[-1][1] == length:
+		return runs[1:-1] + [(runs[-1][0], runs[0][1] + length)]
+	return runs
+
+def grow_runs(runs, length, closed, steps=1):
+	grown = [(start - steps, stop + steps) for start, stop in _unwrap_runs(runs, length, closed)]
+	return normalize_runs(grown, length, closed)
+
+# the ends of open paths have no outside neighbor, so runs never shrink away from them
+def shrink_runs(runs, length, closed, steps=1):
+	shrunk = []
+	for start, stop in _unwrap_runs(runs, length, closed):
+		if stop - start >= length:
+			shrunk.append((start, stop))
+			continue
+		if closed or start > 0:
+			start += steps
+		if closed or stop < length:
+			stop -= steps
+		if start < stop:
+			shrunk.append((start, stop))
+	return normalize_runs(shrunk, length, closed)
+
+# runs of `runs` that aren't in `other`, both sorted and within [0, length)
+def difference_runs(runs, other):
+	result = []
+	otherIndex = 0
+	for start, stop in runs:
+		while otherIndex < len(other) and other[otherIndex][1] <= start:
+			otherIndex += 1
+		cursor = start
+		index = otherIndex
+		while index < len(other) and other[index][0] < stop:
+			otherStart, otherStop = other[index]
+			if otherStart > cursor:
+				result.append((cursor, otherStart))
+			cursor = max(cursor, otherStop)
+			index += 1
+		if cursor < stop:
+			result.append((cursor, stop))
+	return result
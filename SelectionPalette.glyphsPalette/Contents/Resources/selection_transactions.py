@@ -0,0 +1,127 @@
+# encoding: utf-8
+
+from __future__ import print_function
+import time
+from collections import OrderedDict
+from selection_history import history
+
+#
+# Selection transactions
+#
+# Every command hands its new selections to commit(), which applies them inside one
+# transaction: interface updates held back for the whole font and one beginChanges/
+# endChanges per layer, however many elements changed. Both are closed again before
+# commit() returns, so nothing is left disabled if the app never gets back to us.
+#
+# With a flush scheduler (the palette uses a delayed perform on the main run loop) a burst
+# stays open for `window` seconds after each commit, so repeated key presses become a
+# single entry in the selection history per layer; each of them is still a layer update
+# and a redraw of its own. A burst also ends with the next commit after the window or to
+# another font, in case the scheduled flush never comes, and around undo and redo. Without
+# a scheduler, every commit is a burst of its own.
+#
+
+BURST_WINDOW = 0.15
+
+class SelectionTransactions(object):
+	def __init__(self, window=BURST_WINDOW, clock=time.monotonic):
+		self.window = window
+		self.clock = clock
+		# scheduleFlush(delay) should call flush() after `delay` seconds, replacing any
+		# flush it scheduled before
+		self.scheduleFlush = None
+		self._font = None
+		self._layers = None
+		self._lastCommit = None
+		# per commit: one layer update per layer and one redraw per font, however many
+		# elements changed. Bursts only merge undo steps, so they save history entries,
+		# not updates
+		self.stats = {
+			"commands": 0,
+			"bursts": 0,
+			"layerUpdates": 0,
+			"redraws": 0,
+			"elementChanges": 0,
+		}
+
+	# whether a burst is open
+	@property
+	def isOpen(self):
+		return self._layers is not None
+
+	# new selections of several layers; record=False for undo and redo, which move
+	# through the history themselves and so are bursts of their own: a command right after
+	# one has to record the selection undo or redo left behind
+	def commit(self, changes, font=None, record=True):
+		changes = [(layer, selection) for layer, selection in changes if selection is not None]
+		if not changes:
+			return
+		self.stats["commands"] += 1
+		if self.isOpen and (not record or font is not self._font or self.clock() - self._lastCommit > self.window):
+			self.flush()
+		if not self.isOpen:
+			self._font = font
+			self._layers = OrderedDict()
+
+		layers = self._layers
+		changing = []
+		if font is not None:
+			font.disableUpdateInterface()
+		try:
+			for layer, selection in changes:
+				if id(layer) not in layers:
+					# the selection from before the burst is the one undo goes back to
+					if record:
+						history.record(layer)
+					layers[id(layer)] = layer
+				layer.beginChanges()
+				changing.append(layer)
+				selection = list(selection)
+				self.stats["elementChanges"] += _changed_count(layer.selection, selection)
+				layer.selection = selection
+		finally:
+			try:
+				for layer in changing:
+					layer.endChanges()
+					self.stats["layerUpdates"] += 1
+			finally:
+				if font is not None:
+					font.enableUpdateInterface()
+					self.stats["redraws"] += 1
+			self._lastCommit = self.clock()
+			if not record or self.scheduleFlush is None or self.window <= 0:
+				self.flush()
+			else:
+				self.scheduleFlush(self.window)
+
+	# ends the burst; the next commit starts a new undo step
+	def flush(self):
+		if not self.isOpen:
+			return
+		self._layers = self._font = None
+		self.stats["bursts"] += 1
+
+	# element by element, each change would have been a notification of its own
+	@property
+	def notificationsSaved(self):
+		return max(self.stats["elementChanges"] - self.stats["layerUpdates"], 0)
+
+	def report(self):
+		stats = self.stats
+		return "SelectionPalette transactions: %d commands in %d bursts, %d element changes as %d layer updates and %d redraws, %d notifications saved" % (
+			stats["commands"],
+			stats["bursts"],
+			stats["elementChanges"],
+			stats["layerUpdates"],
+			stats["redraws"],
+			self.notificationsSaved,
+		)
+
+# how many elements are selected in only one of the two
+def _changed_count(old, new):
+	oldIds = {id(element) for element in old}
+	newIds = {id(element) for element in new}
+	return len(oldIds ^ newIds)
+
+# shared by every command of the palette
+transactions = SelectionTransactions()
@@ -0,0 +1,204 @@
+# encoding: utf-8
+
+from __future__ import print_function
+import heapq
+from math import floor, sqrt, hypot
+from layer_snapshot import snapshot_for
+
+#
+# Spatial index
+#
+# A uniform grid over the positions of a layer's nodes, anchors and components, built from
+# its cached topology once per layer revision. The cell size is picked so a cell holds a
+# couple of points on average, so a radius, box or nearest query only looks at the cells
+# around it instead of every point of the layer.
+#
+
+NODES, ANCHORS, COMPONENTS = 1, 2, 4
+ALL_KINDS = NODES | ANCHORS | COMPONENTS
+
+# average number of points per cell
+POINTS_PER_CELL = 2
+
+class SpatialGrid(object):
+	def __init__(self, xs, ys):
+		self.xs = xs
+		self.ys = ys
+		self.cells = {}
+		count = len(xs)
+		if not count:
+			self.cellSize = 1.0
+			self.extent = (0, 0, 0, 0)
+			return
+		xMin, xMax = min(xs), max(xs)
+		yMin, yMax = min(ys), max(ys)
+		area = max(xMax - xMin, 1) * max(yMax - yMin, 1)
+		self.cellSize = max(sqrt(area * POINTS_PER_CELL / count), 1.0)
+		cells = self.cells
+		size = self.cellSize
+		for index in range(count):
+			key = (int(floor(xs[index] / size)), int(floor(ys[index] / size)))
+			cell = cells.get(key)
+			if cell is None:
+				cells[key] = [index]
+			else:
+				cell.append(index)
+		self.extent = (int(floor(xMin / size)), int(floor(yMin / size)), int(floor(xMax / size)), int(floor(yMax / size)))
+
+	def __len__(self):
+		return len(self.xs)
+
+	def cell_of(self, x, y):
+		return int(floor(x / self.cellSize)), int(floor(y / self.cellSize))
+
+	# indices of the points inside the box, edges included
+	def in_box(self, xMin, yMin, xMax, yMax):
+		xs = self.xs
+		ys = self.ys
+		cells = self.cells
+		left, bottom = self.cell_of(xMin, yMin)
+		right, top = self.cell_of(xMax, yMax)
+		gridLeft, gridBottom, gridRight, gridTop = self.extent
+		result = []
+		for cx in range(max(left, gridLeft), min(right, gridRight) + 1):
+			for cy in range(max(bottom, gridBottom), min(top, gridTop) + 1):
+				for index in cells.get((cx, cy), ()):
+					if xMin <= xs[index] <= xMax and yMin <= ys[index] <= yMax:
+						result.append(index)
+		return result
+
+	def within(self, x, y, radius):
+		xs = self.xs
+		ys = self.ys
+		return [index for index in self.in_box(x - radius, y - radius, x + radius, y + radius) if hypot(xs[index] - x, ys[index] - y) <= radius]
+
+	# indices of the `count` points closest to (x, y), closest first, among those accept() takes;
+	# searches rings of cells outwards until no closer point can turn up
+	def nearest(self, x, y, count, accept=None):
+		if count <= 0 or not self.cells:
+			return []
+		xs = self.xs
+		ys = self.ys
+		cells = self.cells
+		size = self.cellSize
+		cx, cy = self.cell_of(x, y)
+		gridLeft, gridBottom, gridRight, gridTop = self.extent
+		maxRing = max(cx - gridLeft, gridRight - cx, cy - gridBottom, gridTop - cy, 0)
+		# max-heap of the best so far, as (-distance, -index)
+		best = []
+		for ring in range(maxRing + 1):
+			for key in _ring_cells(cx, cy, ring):
+				for index in cells.get(key, ()):
+					if accept is not None and not accept(index):
+						continue
+					entry = (-hypot(xs[index] - x, ys[index] - y), -index)
+					if len(best) < count:
+						heapq.heappush(best, entry)
+					elif entry > best[0]:
+						heapq.heapreplace(best, entry)
+			# every point beyond this ring is at least ring * size away
+			if len(best) == count and -best[0][0] <= ring * size:
+				break
+		return [-index for distance, index in sorted(best, reverse=True)]
+
+def _ring_cells(cx, cy, ring):
+	if ring == 0:
+		yield (cx, cy)
+		return
+	for dx in range(-ring, ring + 1):
+		yield (cx + dx, cy - ring)
+		yield (cx + dx, cy + ring)
+	for dy in range(-ring + 1, ring):
+		yield (cx - ring, cy + dy)
+		yield (cx + ring, cy + dy)
+
+# the grid and what its points are; nodes come first, in topology order
+class SpatialIndex(object):
+	def __init__(self, snapshot):
+		topology = snapshot.topology
+		anchors = snapshot.anchors
+		components = snapshot.components
+		self.snapshot = snapshot
+		self.topology = topology
+		self.elements = list(topology.nodes) + list(anchors) + list(components)
+		self.kinds = bytearray([NODES]) * len(topology.nodes) + bytearray([ANCHORS]) * len(anchors) + bytearray([COMPONENTS]) * len(components)
+		xs = list(topology.x)
+		ys = list(topology.y)
+		for record in snapshot.anchorRecords + snapshot.componentRecords:
+			xs.append(record.x)
+			ys.append(record.y)
+		self.grid = SpatialGrid(xs, ys)
+		self._indices = None
+
+	def index_of(self, element):
+		if self._indices is None:
+			self._indices = {id(element): index for index, element in enumerate(self.elements)}
+		return self._indices.get(id(element))
+
+	def position_of(self, element):
+		index = self.index_of(element)
+		if index is not None:
+			return self.grid.xs[index], self.grid.ys[index]
+		position = getattr(element, "position", None)
+		if position is None:
+			return None
+		return position.x, position.y
+
+	def elements_at(self, indices, kinds):
+		elements = self.elements
+		elementKinds = self.kinds
+		return [elements[index] for index in indices if elementKinds[index] & kinds]
+
+def spatial_index_for(layer):
+	snapshot = snapshot_for(layer)
+	topology = snapshot.topology
+	index = topology.cache.get("spatial")
+	if index is None or index.snapshot is not snapshot:
+		index = topology.cache["spatial"] = SpatialIndex(snapshot)
+	return index
+
+def _selected_positions(index, layer):
+	positions = []
+	for element in layer.selection:
+		position = index.position_of(element)
+		if position is not None:
+			positions.append(position)
+	return positions
+
+#
+# Queries
+#
+
+# everything within `radius` of a selected element
+def select_within_radius(layer, radius, kinds=NODES):
+	index = spatial_index_for(layer)
+	found = set()
+	for x, y in _selected_positions(index, layer):
+		found.update(index.grid.within(x, y, radius))
+	return index.elements_at(sorted(found), kinds)
+
+# the `count` unselected elements closest to the last selected one, closest first
+def select_nearest(layer, count, kinds=NODES):
+	index = spatial_index_for(layer)
+	selection = layer.selection
+	origin = None
+	for element in reversed(list(selection)):
+		origin = index.position_of(element)
+		if origin is not None:
+			break
+	if origin is None:
+		return []
+	selected = {index.index_of(element) for element in selection}
+	elementKinds = index.kinds
+	accept = lambda i: elementKinds[i] & kinds and i not in selected
+	return index.elements_at(index.grid.nearest(origin[0], origin[1], count, accept), kinds)
+
+# everything inside the bounding box of the selection, on any path
+def select_in_selection_bounds(layer, kinds=NODES):
+	index = spatial_index_for(layer)
+	positions = _selected_positions(index, layer)
+	if not positions:
+		return []
+	xs = [x for x, y in positions]
+	ys = [y for x, y in positions]
+	return index.elements_at(sorted(index.grid.in_box(min(xs), min(ys), max(xs), max(ys))), kinds)
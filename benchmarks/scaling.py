@@ -0,0 +1,530 @@
+# encoding: utf-8
+
+from __future__ import print_function
+import argparse
+import fnmatch
+import json
+import math
+import os
+import sys
+import time
+from collections import OrderedDict, namedtuple
+
+#
+# Scaling benchmarks
+#
+# Runs every menu command and every palette row, filter and operation on synthetic stand-in
+# layers of growing size (1k to 1M nodes by default, with hints, anchors, components and
+# guides in proportion) and fits how each command's time grows with the node count: an
+# exponent of 1 is linear, 2 quadratic. Fails when a command grows faster than
+# --max-exponent, or faster than in a --baseline saved with --save-baseline.
+#
+# --differential instead checks, on the smaller sizes, that every command that has a
+# reference selects exactly what the reference logic selects (selection_reference.py, the
+# original loops, or a brute-force search for the geometric commands), starting from the
+# same selection on two identical layers; on layers of very short and open paths too.
+#
+#   python3 benchmarks/scaling.py --sizes 1000,10000,100000 --csv scaling.csv
+#   python3 benchmarks/scaling.py --differential
+#
+
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "SelectionPalette.glyphsPalette", "Contents", "Resources")
+sys.path.insert(0, RESOURCES)
+
+import selection_reference as reference
+from selection_core import Operation, LINE, CURVE, OFFCURVE, PATH_COMPONENT_TYPES, topology_for, invalidate_topology, grow_selection, shrink_selection, fill_selection, continue_selection, continue_selection_to_end, CONTINUE_PATTERN_LENGTH
+from selection_model import make_layer, populate_layer, vary_contours
+from selection_history import OTHER_ELEMENTS, history
+from node_classifier import EXTREME_TOLERANCE, clear_path_extremes
+from node_filters import ROW_EXPRESSIONS, ROW_TYPES, FILTER_TERMS, preset_expression, filter_nodes
+from element_index import linked_hints_result, select_anchors, select_components, select_guides, select_path_components
+from spatial_index import select_within_radius, select_nearest, select_in_selection_bounds
+from node_similarity import select_similar
+from contour_metrics import AREA_DIGITS, CONTOUR_FILTERS, TINY_AREA, MAX_NODES, select_contours
+from named_selections import save_named_selection, named_selection_elements
+from layer_sets import run_on_layers, commit_selections
+
+SIZES = (1000, 10000, 100000, 1000000)
+OPERATIONS = (Operation.ADD, Operation.SUBTRACT, Operation.INTERSECT)
+# the palette's other rows, their reference loops and their filters, as in plugin.py
+ELEMENT_ROWS = (
+	("components", select_components, reference.select_components, ("unlocked", "locked", "all")),
+	("path_components", select_path_components, reference.select_path_components, ("all", "corners", "caps", "segments")),
+	("anchors", select_anchors, reference.select_anchors, ("all", "anchors", "underscored_anchors", "entry", "exit")),
+	("guides", lambda layer, typeFilter: select_guides(layer, layer.master.guides, typeFilter), lambda layer, typeFilter: reference.select_guides(layer, layer.master.guides, typeFilter), ("unlocked", "locked", "global", "local", "all")),
+	("contours", select_contours, lambda layer, typeFilter: _brute_contours(layer, typeFilter), CONTOUR_FILTERS),
+)
+STEPS = 3
+RADIUS = 50
+NEAREST = 4
+FILTER_EXPRESSION = "smooth & extreme & !selected"
+# nodes per path and share of open paths the differential also checks, up to
+# SHORT_PATHS_MAX_NODES: single nodes, lone segments and paths shorter than a pattern
+SHORT_PATHS = ((1, 0.5), (2, 0.5), (3, 0.5), (5, 1.0))
+SHORT_PATHS_MAX_NODES = 1000
+NAMED_SELECTION = "benchmark"
+
+#
+# Layers
+#
+
+def benchmark_layer(nodeCount, args):
+	layer = vary_contours(make_layer(nodeCount, args.nodes_per_path, args.open_ratio, seed=args.seed))
+	count = lambda ratio: int(round(nodeCount * ratio))
+	return populate_layer(
+		layer,
+		hints=count(args.hints),
+		anchors=count(args.anchors),
+		components=count(args.components),
+		guides=count(args.guides),
+		globalGuides=count(args.global_guides),
+		seed=args.seed,
+	)
+
+# runs of five nodes every fifty, the first anchor and component, and last two nodes three
+# apart (or as far as a short path allows) on the first path for the commands that follow a
+# pattern; the same on identical layers
+def base_selection(layer):
+	nodes = topology_for(layer).nodes
+	selection = []
+	for start in range(0, len(nodes), 50):
+		selection.extend(nodes[start + 1:start + 6])
+	selection.extend(layer.anchors[:1])
+	selection.extend(layer.components[:1])
+	path = layer.paths[0].nodes
+	if len(path) < 2:
+		return selection
+	middle = len(path) // 2
+	lastTwo = [path[(middle - min(3, len(path) - 1)) % len(path)], path[middle]]
+	# a node already in a run would stay where it was, not come last
+	selection = [element for element in selection if all(element is not node for node in lastTwo)]
+	return selection + lastTwo
+
+def reset(layer, base, cache):
+	history.clear()
+	layer.selection = base
+	if cache == "cold":
+		invalidate_topology(layer)
+		clear_path_extremes()
+	elif cache == "topology":
+		topology_for(layer).cache.clear()
+		clear_path_extremes()
+
+# what is selected, as (kind, index) pairs that mean the same on identical layers
+def selection_keys(layer):
+	topology = topology_for(layer)
+	keys = set()
+	others = {}
+	for kind, elements in OTHER_ELEMENTS:
+		for index, element in enumerate(elements(layer)):
+			others[id(element)] = (kind, index)
+	for element in layer.selection:
+		index = topology.index_of(element)
+		keys.add(("nodes", index) if index is not None else others.get(id(element), ("unknown", id(element))))
+	return keys
+
+#
+# Commands
+#
+
+# run(layer) does what the command does in the palette, selection change included;
+# reference(layer), if there is one, does the same the slow and obvious way; prepare(layer)
+# gets the layer ready for run() (e.g. a command to undo) and isn't timed
+Command = namedtuple("Command", ("name", "run", "reference", "prepare"))
+
+def _naive_apply(layer, elements, operation):
+	selection = layer.selection
+	if operation == Operation.ADD:
+		for element in elements:
+			selection.append(element)
+	elif operation == Operation.SUBTRACT:
+		for element in elements:
+			selection.remove(element)
+	elif operation == Operation.INTERSECT:
+		keep = {id(element) for element in elements}
+		layer.selection = [element for element in selection if id(element) in keep]
+
+def selector_command(name, selector, operation, referenceSelector=None, prepare=None):
+	run = lambda layer: run_on_layers([layer], selector, operation)
+	referenceRun = None
+	if referenceSelector is not None:
+		referenceRun = lambda layer: _naive_apply(layer, referenceSelector(layer), operation)
+	return Command(name, run, referenceRun, prepare)
+
+def _repeated(referenceSelector, operation, times):
+	def run(layer):
+		for _ in range(times):
+			_naive_apply(layer, referenceSelector(layer), operation)
+	return run
+
+# positions of the selected nodes, anchors and components
+def _selected_points(layer):
+	topology = topology_for(layer)
+	others = {id(element) for element in layer.anchors}
+	others.update(id(element) for element in layer.components)
+	return [(element.x, element.y) for element in layer.selection if topology.index_of(element) is not None or id(element) in others]
+
+def _brute_within_radius(layer, radius):
+	points = _selected_points(layer)
+	return [node for node in topology_for(layer).nodes if any((node.x - x) ** 2 + (node.y - y) ** 2 <= radius * radius for x, y in points)]
+
+def _brute_in_bounds(layer):
+	points = _selected_points(layer)
+	if not points:
+		return []
+	xs = [x for x, y in points]
+	ys = [y for x, y in points]
+	return [node for node in topology_for(layer).nodes if min(xs) <= node.x <= max(xs) and min(ys) <= node.y <= max(ys)]
+
+# twice the signed area of a path, integrating x dy - y dx along every segment; three-point
+# Gauss-Legendre is exact for the quintic a cubic segment gives
+_GAUSS = ((0.5 - 0.15 ** 0.5, 5 / 18.0), (0.5, 8 / 18.0), (0.5 + 0.15 ** 0.5, 5 / 18.0))
+
+def _brute_twice_area(nodes):
+	twice = 0
+	count = len(nodes)
+	for i, node in enumerate(nodes):
+		if count >= 3 and node.type == CURVE and nodes[i - 2].type == OFFCURVE and nodes[i - 1].type == OFFCURVE:
+			p0, p1, p2 = nodes[i - 3], nodes[i - 2], nodes[i - 1]
+			for t, weight in _GAUSS:
+				s = 1 - t
+				x = s ** 3 * p0.x + 3 * s * s * t * p1.x + 3 * s * t * t * p2.x + t ** 3 * node.x
+				y = s ** 3 * p0.y + 3 * s * s * t * p1.y + 3 * s * t * t * p2.y + t ** 3 * node.y
+				dx = 3 * (s * s * (p1.x - p0.x) + 2 * s * t * (p2.x - p1.x) + t * t * (node.x - p2.x))
+				dy = 3 * (s * s * (p1.y - p0.y) + 2 * s * t * (p2.y - p1.y) + t * t * (node.y - p2.y))
+				twice += weight * (x * dy - y * dx)
+		elif node.type != OFFCURVE:
+			previous = nodes[i - 1]
+			twice += previous.x * node.y - node.x * previous.y
+	return twice
+
+# the same nodes in the same order, from any start node if closed and in either direction;
+# line and curve nodes swap when a path is reversed
+def _brute_same_outline(nodes, otherNodes, closed):
+	if len(nodes) != len(otherNodes):
+		return False
+	kind = lambda node: "oncurve" if node.type in (LINE, CURVE) else node.type
+	points = [(node.x, node.y, kind(node)) for node in nodes]
+	other = [(node.x, node.y, kind(node)) for node in otherNodes]
+	for sequence in (other, other[::-1]):
+		for start in range(len(sequence) if closed else 1):
+			if sequence[start:] + sequence[:start] == points:
+				return True
+	return False
+
+# every node of the paths the filter picks, from the live paths; a duplicate has the same
+# outline as an earlier path
+def _brute_contours(layer, contourFilter, tinyArea=TINY_AREA, maxNodes=MAX_NODES):
+	selected = []
+	outlines = []
+	for path in layer.paths:
+		nodes = list(path.nodes)
+		if not nodes:
+			continue
+		area = round(_brute_twice_area(nodes) / 2.0, AREA_DIGITS)
+		if contourFilter == "all":
+			matches = True
+		elif contourFilter == "outer":
+			matches = path.closed and area > 0
+		elif contourFilter == "counters":
+			matches = path.closed and area < 0
+		elif contourFilter == "open":
+			matches = not path.closed
+		elif contourFilter == "tiny":
+			matches = path.closed and abs(area) < tinyArea
+		elif contourFilter == "complex":
+			matches = len(nodes) > maxNodes
+		else:
+			matches = any(closed == path.closed and _brute_same_outline(nodes, otherNodes, closed) for otherNodes, closed in outlines)
+		outlines.append((nodes, path.closed))
+		if matches:
+			selected.extend(nodes)
+	return selected
+
+def _linked_hints_command(operation):
+	name = "linked_hints" + ("" if operation is None else "/" + operation.name.lower())
+	def run(layer):
+		commit_selections([(layer, linked_hints_result(layer, operation))])
+	def referenceRun(layer):
+		# only corners, caps and segments are linked since the command was indexed
+		pairs = [(node, hint) for node, hint in zip(*reference.linked_hints(layer)) if hint.type in PATH_COMPONENT_TYPES]
+		deselect = [node for node, hint in pairs]
+		select = [hint for node, hint in pairs]
+		if operation is None:
+			_naive_apply(layer, deselect, Operation.SUBTRACT)
+			_naive_apply(layer, select, Operation.ADD)
+		elif operation == Operation.INTERSECT:
+			layer.selection = []
+			_naive_apply(layer, select, Operation.ADD)
+		else:
+			_naive_apply(layer, select, operation)
+	return Command(name, run, referenceRun, None)
+
+# the originals take whatever was selected last, anchors and components too, and read node
+# indexes off them; like the commands, select nothing unless the last two are nodes
+def _after_two_nodes(referenceSelector):
+	def selector(layer):
+		topology = topology_for(layer)
+		if len(layer.selection) < 2 or any(topology.index_of(element) is None for element in layer.selection[-2:]):
+			return []
+		return referenceSelector(layer)
+	return selector
+
+def _undo(layer):
+	commit_selections([(layer, history.undo(layer))], record=False)
+
+def _redo(layer):
+	commit_selections([(layer, history.redo(layer))], record=False)
+
+def _grow(layer):
+	run_on_layers([layer], grow_selection, Operation.ADD)
+
+def _grow_and_undo(layer):
+	_grow(layer)
+	_undo(layer)
+
+def _save(layer):
+	save_named_selection(layer, NAMED_SELECTION)
+
+def _save_and_clear(layer):
+	_save(layer)
+	layer.selection = []
+
+def _restore(layer):
+	commit_selections([(layer, named_selection_elements(layer, NAMED_SELECTION))])
+
+def menu_commands():
+	ADD, SUBTRACT = Operation.ADD, Operation.SUBTRACT
+	return [
+		selector_command("continue_selection", lambda layer: [node for node in [continue_selection(layer)] if node], ADD, _after_two_nodes(lambda layer: [node for node in [reference.continue_selection(layer)] if node])),
+		selector_command("continue_selection_to_end", continue_selection_to_end, ADD),
+		selector_command("continue_pattern_to_end", lambda layer: continue_selection_to_end(layer, CONTINUE_PATTERN_LENGTH), ADD),
+		selector_command("grow_selection", grow_selection, ADD, reference.grow_selection),
+		selector_command("shrink_selection", shrink_selection, SUBTRACT, reference.shrink_selection),
+		Command("grow_selection_by", lambda layer: run_on_layers([layer], lambda layer: grow_selection(layer, STEPS), ADD), _repeated(reference.grow_selection, ADD, STEPS), None),
+		Command("shrink_selection_by", lambda layer: run_on_layers([layer], lambda layer: shrink_selection(layer, STEPS), SUBTRACT), _repeated(reference.shrink_selection, SUBTRACT, STEPS), None),
+		selector_command("fill_selection", fill_selection, ADD, _after_two_nodes(reference.fill_selection)),
+		selector_command("select_within_radius", lambda layer: select_within_radius(layer, RADIUS), ADD, lambda layer: _brute_within_radius(layer, RADIUS)),
+		selector_command("select_nearest", lambda layer: select_nearest(layer, NEAREST), ADD),
+		selector_command("select_in_selection_bounds", select_in_selection_bounds, ADD, _brute_in_bounds),
+		selector_command("select_similar", select_similar, ADD),
+		selector_command("select_matching", lambda layer: filter_nodes(layer, FILTER_EXPRESSION), ADD),
+		_linked_hints_command(None),
+		_linked_hints_command(Operation.ADD),
+		_linked_hints_command(Operation.SUBTRACT),
+		_linked_hints_command(Operation.INTERSECT),
+		# undo goes back to the selection before the prepared command, redo forward to after it
+		Command("undo_selection", _undo, lambda layer: None, _grow),
+		Command("redo_selection", _redo, _repeated(reference.grow_selection, ADD, 1), _grow_and_undo),
+		Command("save_named_selection", _save, None, None),
+		Command("restore_named_selection", _restore, lambda layer: None, _save_and_clear),
+	]
+
+# tolerance=0 gives the reference's exact, upright extremes
+def row_commands(tolerance=EXTREME_TOLERANCE):
+	commands = []
+	for row in ROW_EXPRESSIONS:
+		type, smooth = ROW_TYPES[row]
+		for typeFilter in FILTER_TERMS:
+			expression = preset_expression(row, typeFilter)
+			for operation in OPERATIONS:
+				commands.append(selector_command(
+					"%s/%s/%s" % (row, typeFilter, operation.name.lower()),
+					lambda layer, expression=expression: filter_nodes(layer, expression, tolerance, 0),
+					operation,
+					lambda layer, type=type, smooth=smooth, typeFilter=typeFilter: reference.select_nodes_by_type(layer, type, smooth, typeFilter),
+				))
+	for row, selector, referenceSelector, typeFilters in ELEMENT_ROWS:
+		for typeFilter in typeFilters:
+			for operation in OPERATIONS:
+				commands.append(selector_command(
+					"%s/%s/%s" % (row, typeFilter, operation.name.lower()),
+					lambda layer, selector=selector, typeFilter=typeFilter: selector(layer, typeFilter),
+					operation,
+					lambda layer, referenceSelector=referenceSelector, typeFilter=typeFilter: referenceSelector(layer, typeFilter),
+				))
+	return commands
+
+def all_commands(patterns=None, tolerance=EXTREME_TOLERANCE):
+	commands = menu_commands() + row_commands(tolerance)
+	if patterns:
+		commands = [command for command in commands if any(fnmatch.fnmatch(command.name, pattern) for pattern in patterns)]
+	return commands
+
+#
+# Timing
+#
+
+def time_command(layer, base, command, repeat, cache):
+	times = []
+	for _ in range(repeat):
+		reset(layer, base, cache)
+		if command.prepare is not None:
+			command.prepare(layer)
+		start = time.perf_counter()
+		command.run(layer)
+		times.append(time.perf_counter() - start)
+	times.sort()
+	return times[len(times) // 2]
+
+# slope of log(time) over log(nodes), over the sizes that took at least minSeconds
+def growth_exponent(points, minSeconds):
+	points = [(math.log(nodes), math.log(seconds)) for nodes, seconds in points if seconds >= minSeconds]
+	if len(points) < 2:
+		return None
+	meanX = sum(x for x, y in points) / len(points)
+	meanY = sum(y for x, y in points) / len(points)
+	variance = sum((x - meanX) ** 2 for x, y in points)
+	if not variance:
+		return None
+	return sum((x - meanX) * (y - meanY) for x, y in points) / variance
+
+def run_timings(args, commands):
+	# command: [(nodes, seconds), ...]
+	curves = OrderedDict((command.name, []) for command in commands)
+	for size in args.sizes:
+		layer = benchmark_layer(size, args)
+		base = base_selection(layer)
+		print("%d nodes, %d paths, %d hints, %d anchors, %d components, %d guides, %d master guides" % (
+			size, len(layer.paths), len(layer.hints), len(layer.anchors), len(layer.components), len(layer.guides), len(layer.master.guides),
+		), file=sys.stderr)
+		repeat = args.repeat if size < 1000000 else max(1, args.repeat // 3)
+		for command in commands:
+			curves[command.name].append((size, time_command(layer, base, command, repeat, args.cache)))
+		del layer, base
+		invalidate_topology()
+	return curves
+
+def write_csv(path, curves):
+	with open(path, "w") as output:
+		output.write("command,nodes,ms\n")
+		for name, points in curves.items():
+			for nodes, seconds in points:
+				output.write("%s,%d,%.4f\n" % (name, nodes, seconds * 1000))
+
+def write_plot(path, curves):
+	try:
+		import matplotlib
+		matplotlib.use("Agg")
+		import matplotlib.pyplot as plt
+	except ImportError:
+		print("matplotlib isn't installed, no plot written", file=sys.stderr)
+		return
+	figure, axes = plt.subplots(figsize=(10, 7))
+	for name, points in curves.items():
+		axes.plot([nodes for nodes, seconds in points], [seconds * 1000 for nodes, seconds in points], marker=".", linewidth=0.8, label=name)
+	axes.set_xscale("log")
+	axes.set_yscale("log")
+	axes.set_xlabel("nodes")
+	axes.set_ylabel("ms")
+	axes.legend(fontsize="xx-small", ncol=3)
+	figure.savefig(path, dpi=150)
+
+def report_timings(args, curves):
+	baseline = {}
+	if args.baseline:
+		with open(args.baseline) as input:
+			baseline = json.load(input)["exponents"]
+	exponents = OrderedDict()
+	failed = []
+	print("%-40s %s %9s" % ("command", " ".join("%9s" % ("%dk" % (size // 1000)) for size in args.sizes), "exponent"))
+	for name, points in curves.items():
+		exponent = exponents[name] = growth_exponent(points, args.min_ms / 1000.0)
+		problem = ""
+		if exponent is not None:
+			if exponent > args.max_exponent:
+				problem = "over %.2f" % args.max_exponent
+			elif baseline.get(name) is not None and exponent > baseline[name] + args.tolerance:
+				problem = "was %.2f" % baseline[name]
+		if problem:
+			failed.append(name)
+		print("%-40s %s %9s %s" % (
+			name,
+			" ".join("%9.2f" % (seconds * 1000) for nodes, seconds in points),
+			"-" if exponent is None else "%.2f" % exponent,
+			problem,
+		))
+	if args.csv:
+		write_csv(args.csv, curves)
+	if args.plot:
+		write_plot(args.plot, curves)
+	if args.save_baseline:
+		with open(args.save_baseline, "w") as output:
+			json.dump({"sizes": args.sizes, "exponents": exponents}, output, indent=1)
+	if failed:
+		print("growth regressed: %s" % ", ".join(failed))
+		return 1
+	return 0
+
+#
+# Differential
+#
+
+def run_differential(args, commands):
+	mismatches = 0
+	checked = 0
+	shapes = [(args.nodes_per_path, args.open_ratio, args.differential_max_nodes)]
+	shapes.extend((nodesPerPath, openRatio, min(SHORT_PATHS_MAX_NODES, args.differential_max_nodes)) for nodesPerPath, openRatio in SHORT_PATHS)
+	for nodesPerPath, openRatio, maxNodes in shapes:
+		shapeArgs = argparse.Namespace(**dict(vars(args), nodes_per_path=nodesPerPath, open_ratio=openRatio))
+		for size in args.sizes:
+			if size > maxNodes:
+				continue
+			layer = benchmark_layer(size, shapeArgs)
+			referenceLayer = benchmark_layer(size, shapeArgs)
+			base = base_selection(layer)
+			referenceBase = base_selection(referenceLayer)
+			for command in commands:
+				if command.reference is None:
+					continue
+				reset(layer, base, "cold")
+				reset(referenceLayer, referenceBase, "cold")
+				if command.prepare is not None:
+					command.prepare(layer)
+				command.run(layer)
+				command.reference(referenceLayer)
+				selected = selection_keys(layer)
+				expected = selection_keys(referenceLayer)
+				checked += 1
+				if selected != expected:
+					mismatches += 1
+					print("%d nodes, %d per path, %d%% open, %s: %d extra, %d missing, e.g. %s" % (
+						size, nodesPerPath, openRatio * 100, command.name, len(selected - expected), len(expected - selected), sorted(selected ^ expected)[:3],
+					))
+			invalidate_topology()
+	print("%d checks, %d mismatches; %d commands have no reference" % (checked, mismatches, sum(command.reference is None for command in commands)))
+	return 1 if mismatches else 0
+
+def main():
+	parser = argparse.ArgumentParser(description="How the SelectionPalette commands scale with layer size.")
+	parser.add_argument("--sizes", type=lambda text: [int(size) for size in text.split(",")], default=list(SIZES), help="node counts, comma-separated")
+	parser.add_argument("--nodes-per-path", type=int, default=48)
+	parser.add_argument("--open-ratio", type=float, default=0.1, help="share of open paths")
+	parser.add_argument("--hints", type=float, default=0.01, help="hints per node")
+	parser.add_argument("--anchors", type=float, default=0.002, help="anchors per node")
+	parser.add_argument("--components", type=float, default=0.001, help="components per node")
+	parser.add_argument("--guides", type=float, default=0.001, help="local guides per node")
+	parser.add_argument("--global-guides", type=float, default=0.001, help="master guides per node")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--repeat", type=int, default=3, help="runs per command and size, the median is reported")
+	parser.add_argument("--cache", choices=("cold", "topology", "warm"), default="topology",
+		help="before each run, read the layer again (cold), drop what was derived from it (topology) or keep everything (warm)")
+	parser.add_argument("--commands", nargs="*", help="only these commands, e.g. 'grow_*' 'anchors/*'")
+	parser.add_argument("--min-ms", type=float, default=0.5, help="sizes faster than this are too noisy to fit")
+	parser.add_argument("--max-exponent", type=float, default=1.5, help="fail when a command grows faster than this")
+	parser.add_argument("--baseline", help="exponents saved with --save-baseline to compare to")
+	parser.add_argument("--tolerance", type=float, default=0.25, help="how much an exponent may grow over the baseline")
+	parser.add_argument("--save-baseline")
+	parser.add_argument("--csv", help="write the scaling curves as CSV")
+	parser.add_argument("--plot", help="plot the scaling curves (needs matplotlib)")
+	parser.add_argument("--differential", action="store_true", help="compare with the reference logic instead of timing")
+	parser.add_argument("--differential-max-nodes", type=int, default=10000)
+	args = parser.parse_args()
+
+	if args.differential:
+		return run_differential(args, all_commands(args.commands, tolerance=0))
+	commands = all_commands(args.commands)
+	return report_timings(args, run_timings(args, commands))
+
+if __name__ == "__main__":
+	sys.exit(main())
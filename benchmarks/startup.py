@@ -0,0 +1,69 @@
+# encoding: utf-8
+
+from __future__ import print_function
+import argparse
+import os
+import subprocess
+import sys
+
+#
+# Startup budget
+#
+# Imports each engine module in a fresh interpreter with `python -X importtime` and reports
+# the cumulative time of the module itself and of everything it pulls in at load. Exits
+# non-zero when a module goes over the budget, e.g. because something heavy like numpy got
+# imported at module level again.
+#
+# plugin.py itself needs Glyphs; inside the app, set
+#   Glyphs.defaults["com.DanielGamage.SelectionPalette.logStartup"] = True
+# to have it print its import, settings() and start() times to the Macro panel.
+#
+
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "SelectionPalette.glyphsPalette", "Contents", "Resources")
+# what plugin.py imports at load, and what its commands import on first use
+MODULES = [
+	"selection_core", "node_filters", "element_index", "spatial_index", "contour_metrics", "selection_history",
+	"selection_transactions", "command_metrics", "precompute", "layer_sets",
+]
+LAZY_MODULES = ["node_similarity", "batch_query", "named_selections", "layer_snapshot", "selection_audit", "selection_model"]
+
+def import_times(module):
+	# every line is "import time: self [us] | cumulative | imported package", innermost first
+	output = subprocess.run(
+		[sys.executable, "-X", "importtime", "-c", "import %s" % module],
+		cwd=RESOURCES, stderr=subprocess.PIPE, universal_newlines=True, check=True,
+	).stderr
+	times = {}
+	for line in output.splitlines():
+		if not line.startswith("import time:") or "[us]" in line:
+			continue
+		selfTime, cumulative, name = line[len("import time:"):].split("|")
+		times[name.strip()] = int(cumulative)
+	return times
+
+def main():
+	parser = argparse.ArgumentParser(description="Import time of the SelectionPalette engine modules.")
+	parser.add_argument("--budget-ms", type=float, default=50, help="fail when a module takes longer than this to import")
+	parser.add_argument("--repeat", type=int, default=3, help="imports per module, the fastest is reported")
+	parser.add_argument("modules", nargs="*", default=MODULES + LAZY_MODULES)
+	args = parser.parse_args()
+
+	failed = []
+	for module in args.modules:
+		runs = [import_times(module) for _ in range(args.repeat)]
+		milliseconds = min(times[module] for times in runs) / 1000.0
+		heavy = sorted(
+			(name for name in runs[0] if name.split(".")[0] in ("numpy", "AppKit", "vanilla", "objc")),
+			key=lambda name: -runs[0][name],
+		)
+		print("%-20s %7.1f ms%s" % (module, milliseconds, "  (imports %s)" % ", ".join(heavy[:3]) if heavy else ""))
+		if milliseconds > args.budget_ms:
+			failed.append(module)
+
+	if failed:
+		print("over the %.0f ms budget: %s" % (args.budget_ms, ", ".join(failed)))
+		return 1
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
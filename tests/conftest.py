@@ -0,0 +1,27 @@
+# encoding: utf-8
+
+import os
+import sys
+
+import pytest
+
+# the engine modules live in the plugin bundle and import each other by name
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "SelectionPalette.glyphsPalette", "Contents", "Resources")
+sys.path.insert(0, os.path.abspath(RESOURCES))
+
+from selection_history import history
+from selection_model import make_font
+
+@pytest.fixture(autouse=True)
+def clear_history():
+	history.clear()
+	yield
+	history.clear()
+
+@pytest.fixture
+def font():
+	return make_font(4, 2)
+
+@pytest.fixture
+def layer(font):
+	return font.glyphs[0].layers[0]
@@ -0,0 +1,50 @@
+# encoding: utf-8
+
+import pytest
+
+import node_classifier
+from selection_core import topology_for
+from batch_query import evaluate_query, find_nodes, apply_matches, open_in_tab, layer_data, layer_from_data, iter_layers
+
+QUERIES = [
+	[("smooth_nodes", "all")],
+	[("sharp_nodes", "non_extremes")],
+	[("smooth_nodes", "extremes"), ("sharp_nodes", "all")],
+	[("handle_nodes", "all"), ("line_nodes", "all")],
+]
+
+def without_numpy(monkeypatch):
+	monkeypatch.setattr(node_classifier, "np", None)
+	monkeypatch.setattr(node_classifier, "_numpyChecked", True)
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_layer_data_evaluates_like_the_layer(font, query):
+	for glyphName, layer in iter_layers(font):
+		assert evaluate_query(layer_from_data(layer_data(glyphName, layer)), query, 0) == evaluate_query(layer, query, 0)
+
+@pytest.mark.skipif(not node_classifier.numpy_available(), reason="compares against the numpy path")
+@pytest.mark.parametrize("query", QUERIES)
+def test_the_reference_loop_finds_the_same_nodes(font, query, monkeypatch):
+	expected = list(find_nodes(font, query, workers=0, tolerance=0))
+	without_numpy(monkeypatch)
+	assert list(find_nodes(font, query, workers=0, tolerance=0)) == expected
+
+def test_worker_processes_find_the_same_nodes(font):
+	query = QUERIES[1]
+	assert list(find_nodes(font, query, workers=2, chunkSize=3)) == list(find_nodes(font, query, workers=0))
+
+def test_only_master_layers_unless_asked(font):
+	glyph = font.glyphs[0]
+	glyph.layers[1].layerId = "backup"
+	assert [match.layerId for match in find_nodes(font, QUERIES[0], workers=0, glyphNames=[glyph.name])] == ["m01"]
+	assert len(list(find_nodes(font, QUERIES[0], workers=0, glyphNames=[glyph.name], masterLayersOnly=False))) == 2
+
+def test_matches_are_selected_and_opened_once_per_glyph(font):
+	matches = list(find_nodes(font, QUERIES[0], workers=0))
+	apply_matches(font, matches)
+	for match in matches:
+		layer = font.glyphs[match.glyphName].layers[match.layerId]
+		assert layer.selection == [topology_for(layer).nodes[index] for index in match.indices]
+	names = open_in_tab(font, matches)
+	assert names == [glyph.name for glyph in font.glyphs]
+	assert font.tabs == ["/" + "/".join(names)]
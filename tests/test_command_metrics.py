@@ -0,0 +1,29 @@
+# encoding: utf-8
+
+import gc
+
+from command_metrics import CommandMetrics
+
+class Readout(object):
+	def __init__(self):
+		self.runs = []
+	def update(self, run):
+		self.runs.append(run.name)
+
+def test_listeners_are_called_with_each_command():
+	metrics = CommandMetrics()
+	readout = Readout()
+	metrics.add_listener(readout.update)
+	with metrics.command("grow_selection"):
+		pass
+	assert readout.runs == ["grow_selection"]
+
+def test_listeners_go_away_with_their_owner():
+	metrics = CommandMetrics()
+	readout = Readout()
+	metrics.add_listener(readout.update)
+	del readout
+	gc.collect()
+	with metrics.command("grow_selection"):
+		pass
+	assert metrics.listeners == []
@@ -0,0 +1,67 @@
+# encoding: utf-8
+
+import pytest
+from selection_core import LINE, CURVE, OFFCURVE, topology_for
+from selection_model import Node, Path, Layer
+from node_classifier import numpy_available
+from contour_metrics import _metrics_numpy, _metrics_python, contour_paths, duplicate_paths
+
+def polygon(points, closed=True):
+	return Path([Node(LINE, x, y) for x, y in points], closed=closed)
+
+# a closed path with two cubic segments and a line
+def curvy(start=0):
+	nodes = [
+		Node(CURVE, 0, 0), Node(OFFCURVE, 30, -20), Node(OFFCURVE, 70, -20), Node(CURVE, 100, 0),
+		Node(LINE, 100, 100), Node(OFFCURVE, 60, 130), Node(OFFCURVE, 40, 130),
+	]
+	nodes = nodes[start:] + nodes[:start]
+	return Path(nodes)
+
+# the same outline drawn the other way around: the curve nodes are the other ends of the
+# curve segments now
+def reversed_curvy():
+	return Path([
+		Node(CURVE, 0, 0), Node(OFFCURVE, 40, 130), Node(OFFCURVE, 60, 130), Node(CURVE, 100, 100),
+		Node(LINE, 100, 0), Node(OFFCURVE, 70, -20), Node(OFFCURVE, 30, -20),
+	])
+
+def duplicates(*paths):
+	return duplicate_paths(topology_for(Layer(paths=paths)))
+
+def test_a_copy_is_a_duplicate():
+	assert duplicates(curvy(), curvy()) == [1]
+
+def test_another_start_node_is_a_duplicate():
+	assert duplicates(curvy(), curvy(start=3)) == [1]
+
+def test_the_other_direction_is_a_duplicate():
+	assert duplicates(curvy(), reversed_curvy()) == [1]
+
+def test_the_same_points_in_another_order_are_not_a_duplicate():
+	# same nodes, bounds and area, but a different contour
+	square = [(0, 0), (4, 0), (4, 4), (0, 4), (2, 1)]
+	other = [(0, 0), (4, 0), (2, 1), (4, 4), (0, 4)]
+	assert duplicates(polygon(square), polygon(other)) == []
+
+def test_open_paths_only_match_from_either_end():
+	points = [(0, 0), (100, 0), (100, 100), (0, 100)]
+	assert duplicates(polygon(points, closed=False), polygon(points[::-1], closed=False)) == [1]
+	assert duplicates(polygon(points, closed=False), polygon(points[1:] + points[:1], closed=False)) == []
+
+# a loop of one curve whose handles lie on the line through its node: the area cancels out
+# only up to rounding error
+def flat_loop(x):
+	return Path([Node(OFFCURVE, x, 6.28), Node(OFFCURVE, x, -6.28), Node(CURVE, x, 0.0)])
+
+METRICS = [_metrics_python] + ([_metrics_numpy] if numpy_available() else [])
+
+@pytest.mark.parametrize("metrics", METRICS)
+def test_a_flat_contour_has_no_area(metrics):
+	topology = topology_for(Layer(paths=[flat_loop(x) for x in (1700.0, 12200, 35300)]))
+	assert metrics(topology).area == [0, 0, 0]
+
+def test_a_flat_contour_is_neither_outer_nor_a_counter():
+	topology = topology_for(Layer(paths=[flat_loop(1700.0), curvy()]))
+	assert contour_paths(topology, "outer") == [1]
+	assert contour_paths(topology, "counters") == []
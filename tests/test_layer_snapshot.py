@@ -0,0 +1,52 @@
+# encoding: utf-8
+
+from selection_model import Anchor, Component, Guide
+from layer_snapshot import snapshot_for
+from spatial_index import ANCHORS, COMPONENTS, select_within_radius
+
+def add_elements(layer):
+	layer.anchors.append(Anchor("top", 5000, 5000))
+	layer.components.append(Component("acute", 6000, 6000))
+	layer.guides.append(Guide(0, 100))
+	for element in layer.anchors + layer.components + layer.guides:
+		element.parent = layer
+
+def test_snapshot_is_reused_while_nothing_changes(layer):
+	add_elements(layer)
+	assert snapshot_for(layer) is snapshot_for(layer)
+
+def test_renaming_an_anchor_replaces_the_snapshot(layer):
+	add_elements(layer)
+	snapshot = snapshot_for(layer)
+	layer.anchors[-1].name = "bottom"
+	assert snapshot_for(layer) is not snapshot
+	assert snapshot_for(layer).anchorRecords[-1].name == "bottom"
+
+def test_locking_replaces_the_snapshot(layer):
+	add_elements(layer)
+	snapshot = snapshot_for(layer)
+	layer.components[-1].locked = True
+	assert snapshot_for(layer).componentRecords[-1].locked
+	layer.guides[-1].locked = True
+	assert snapshot_for(layer).guideRecords[-1].locked
+	assert snapshot_for(layer) is not snapshot
+
+def test_moving_an_anchor_or_component_replaces_the_snapshot(layer):
+	add_elements(layer)
+	snapshot = snapshot_for(layer)
+	layer.anchors[-1].x = 5100
+	record = snapshot_for(layer).anchorRecords[-1]
+	assert (record.x, record.y) == (5100, 5000)
+	layer.components[-1].y = 6100
+	record = snapshot_for(layer).componentRecords[-1]
+	assert (record.x, record.y) == (6000, 6100)
+	assert snapshot_for(layer) is not snapshot
+
+def test_spatial_queries_see_moved_elements(layer):
+	add_elements(layer)
+	anchor = layer.anchors[-1]
+	component = layer.components[-1]
+	layer.selection = [anchor]
+	assert select_within_radius(layer, 10, ANCHORS | COMPONENTS) == [anchor]
+	component.x, component.y = anchor.x + 5, anchor.y
+	assert component in select_within_radius(layer, 10, ANCHORS | COMPONENTS)
@@ -0,0 +1,58 @@
+# encoding: utf-8
+
+from selection_core import CURVE, LINE, topology_for
+from selection_model import populate_layer
+from named_selections import USERDATA_KEY, save_named_selection, delete_named_selection, named_selection_names, named_selection_elements, is_stale
+
+def test_a_saved_selection_comes_back(layer):
+	populate_layer(layer, anchors=2, components=1)
+	nodes = topology_for(layer).nodes
+	layer.selection = nodes[2:6] + [nodes[30], layer.anchors[1], layer.components[0]]
+	assert save_named_selection(layer, "stems") == [layer]
+	selection = list(layer.selection)
+	layer.selection = []
+	assert named_selection_names(layer) == ["stems"]
+	assert named_selection_elements(layer, "stems") == selection
+
+def test_compatible_masters_get_the_same_nodes(font):
+	glyph = font.glyphs[0]
+	layer, other = glyph.layers
+	layer.selection = topology_for(layer).nodes[10:14]
+	assert save_named_selection(layer, "bowl", glyph.layers) == [layer, other]
+	assert named_selection_elements(other, "bowl") == topology_for(other).nodes[10:14]
+
+def test_an_incompatible_layer_is_skipped(font):
+	layer, other = font.glyphs[0].layers[0], font.glyphs[1].layers[0]
+	other.paths = other.paths[1:]
+	layer.selection = topology_for(layer).nodes[:3]
+	assert save_named_selection(layer, "bowl", [other]) == [layer]
+	# looked up from the layer it was saved on, but the outline doesn't match
+	assert named_selection_elements(other, "bowl", sourceLayer=layer) is None
+
+def test_moving_nodes_keeps_the_selection(layer):
+	nodes = topology_for(layer).nodes
+	layer.selection = nodes[:4]
+	save_named_selection(layer, "corner")
+	nodes[0].x += 25
+	assert not is_stale(layer, "corner")
+	assert named_selection_elements(layer, "corner") == nodes[:4]
+
+def test_changing_a_node_type_makes_it_stale(layer):
+	nodes = topology_for(layer).nodes
+	layer.selection = nodes[:4]
+	save_named_selection(layer, "corner")
+	node = next(node for node in nodes if node.type == CURVE)
+	node.type = LINE
+	assert is_stale(layer, "corner")
+	assert named_selection_elements(layer, "corner") is None
+
+def test_deleting_the_last_one_clears_the_user_data(layer):
+	layer.selection = topology_for(layer).nodes[:1]
+	save_named_selection(layer, "a")
+	save_named_selection(layer, "b")
+	assert delete_named_selection(layer, "a")
+	assert not delete_named_selection(layer, "a")
+	assert named_selection_names(layer) == ["b"]
+	assert delete_named_selection(layer, "b")
+	assert USERDATA_KEY not in layer.userData
+	assert is_stale(layer, "b") is None
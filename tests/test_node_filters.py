@@ -0,0 +1,27 @@
+# encoding: utf-8
+
+import pytest
+
+from selection_core import OFFCURVE
+from selection_model import make_layer
+from selection_reference import select_nodes_by_type
+from node_filters import ROW_EXPRESSIONS, ROW_TYPES, FILTER_TERMS, filter_nodes, preset_expression
+
+@pytest.mark.parametrize("row", list(ROW_EXPRESSIONS))
+@pytest.mark.parametrize("typeFilter", list(FILTER_TERMS))
+def test_rows_match_the_reference_loop(row, typeFilter):
+	layer = make_layer(2000, nodesPerPath=24, openRatio=0.2)
+	type, smooth = ROW_TYPES[row]
+	expected = {id(node) for node in select_nodes_by_type(layer, type, smooth, typeFilter)}
+	assert {id(node) for node in filter_nodes(layer, preset_expression(row, typeFilter))} == expected
+
+def test_extremes_are_exact_unless_given_a_tolerance(layer):
+	node = next(node for node in filter_nodes(layer, "extreme & oncurve") if node.nextNode.type == OFFCURVE)
+	handle = node.nextNode
+	# a degree and a half off the axis
+	if handle.y == node.y:
+		handle.y += abs(handle.x - node.x) * 0.026
+	else:
+		handle.x += abs(handle.y - node.y) * 0.026
+	assert node not in filter_nodes(layer, "extreme")
+	assert node in filter_nodes(layer, "extreme", tolerance=2)
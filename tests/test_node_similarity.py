@@ -0,0 +1,34 @@
+# encoding: utf-8
+
+import pytest
+
+from selection_core import topology_for
+from selection_model import make_layer
+from node_classifier import extremes_for, extreme_flags, numpy_available
+from node_similarity import _features_numpy, _features_python
+
+pytestmark = pytest.mark.skipif(not numpy_available(), reason="compares against the numpy path")
+
+def odd_layer():
+	layer = make_layer(1500, nodesPerPath=20, openRatio=0.3, seed=3)
+	# node types the palette doesn't know, next to handles
+	for index, node in enumerate(layer.nodes()):
+		if index % 37 == 0 and node.type != "offcurve":
+			node.type = "qcurve"
+	return layer
+
+@pytest.mark.parametrize("tolerance, italicAngle", [(0, 0), (0.5, 0), (0, 12), (1, -8)])
+def test_extreme_flags_match_the_numpy_mask(tolerance, italicAngle):
+	topology = topology_for(odd_layer())
+	assert extreme_flags(topology, tolerance, italicAngle) == extremes_for(topology, tolerance, italicAngle).tolist()
+
+@pytest.mark.parametrize("tolerance, italicAngle", [(0, 0), (1, 12)])
+def test_feature_paths_agree(tolerance, italicAngle):
+	topology = topology_for(odd_layer())
+	withNumpy = _features_numpy(topology, extremes_for(topology, tolerance, italicAngle))
+	withoutNumpy = _features_python(topology, extreme_flags(topology, tolerance, italicAngle))
+	assert withoutNumpy.types == withNumpy.types
+	assert withoutNumpy.smooth == withNumpy.smooth
+	assert withoutNumpy.extreme == withNumpy.extreme
+	for field in ("inLength", "outLength", "angle"):
+		assert getattr(withoutNumpy, field) == pytest.approx(getattr(withNumpy, field), abs=1e-9), field
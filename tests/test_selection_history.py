@@ -0,0 +1,71 @@
+# encoding: utf-8
+
+from selection_core import CURVE, topology_for
+from selection_history import SelectionHistory, snapshot_selection, restore_snapshot
+from selection_model import populate_layer
+
+def select(history, layer, elements):
+	history.record(layer)
+	layer.selection = elements
+
+def test_undo_and_redo_step_through_the_selections(layer):
+	history = SelectionHistory()
+	nodes = topology_for(layer).nodes
+	select(history, layer, nodes[:2])
+	select(history, layer, nodes[:5])
+	assert history.undo(layer) == nodes[:2]
+	layer.selection = nodes[:2]
+	assert history.undo(layer) == []
+	assert not history.can_undo(layer)
+	layer.selection = []
+	assert history.redo(layer) == nodes[:2]
+	assert history.can_redo(layer)
+
+def test_a_new_command_drops_the_redo_steps(layer):
+	history = SelectionHistory()
+	nodes = topology_for(layer).nodes
+	select(history, layer, nodes[:2])
+	layer.selection = history.undo(layer)
+	select(history, layer, nodes[3:4])
+	assert not history.can_redo(layer)
+	assert history.redo(layer) is None
+
+def test_snapshots_keep_anchors_components_and_hints(layer):
+	populate_layer(layer, hints=3, anchors=2, components=2)
+	nodes = topology_for(layer).nodes
+	selection = nodes[4:9] + [nodes[20], layer.anchors[1], layer.components[0], layer.hints[2]]
+	layer.selection = selection
+	assert restore_snapshot(layer, snapshot_selection(layer)) == selection
+
+def test_a_snapshot_from_before_an_edit_is_dropped(layer):
+	history = SelectionHistory()
+	nodes = topology_for(layer).nodes
+	select(history, layer, nodes[:1])
+	select(history, layer, nodes[:2])
+	next(node for node in nodes if node.type != CURVE).type = CURVE
+	assert history.undo(layer) is None
+	# everything older was taken before the edit too
+	assert not history.can_undo(layer)
+
+def test_depth_keeps_the_newest_steps(layer):
+	history = SelectionHistory(depth=3)
+	nodes = topology_for(layer).nodes
+	for count in range(1, 6):
+		select(history, layer, nodes[:count])
+	undone = []
+	while history.can_undo(layer):
+		undone.append(len(history.undo(layer)))
+	assert undone == [4, 3, 2]
+
+def test_memory_limit_evicts_the_least_recently_used_layer_first(font):
+	first, second = font.glyphs[0].layers[0], font.glyphs[1].layers[0]
+	history = SelectionHistory()
+	select(history, first, topology_for(first).nodes[::2])
+	select(history, second, topology_for(second).nodes[::2])
+	select(history, first, [])
+	select(history, second, [])
+	history.memoryLimit = history.nbytes - 1
+	history._evict()
+	assert not history.can_undo(first)
+	assert history.can_undo(second)
+	assert history.nbytes <= history.memoryLimit
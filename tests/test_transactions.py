@@ -0,0 +1,80 @@
+# encoding: utf-8
+
+from selection_core import topology_for
+from selection_history import history
+from selection_transactions import SelectionTransactions
+
+class Clock(object):
+	def __init__(self):
+		self.now = 0.0
+	def __call__(self):
+		return self.now
+
+# a burst window whose scheduled flush never comes, like a dropped delayed perform
+def burst_transactions():
+	clock = Clock()
+	transactions = SelectionTransactions(window=0.15, clock=clock)
+	transactions.scheduleFlush = lambda delay: None
+	return transactions, clock
+
+def test_commits_in_a_burst_are_one_undo_step(font, layer):
+	transactions, clock = burst_transactions()
+	nodes = topology_for(layer).nodes
+	for count in (1, 2, 3):
+		transactions.commit([(layer, nodes[:count])], font)
+		clock.now += 0.05
+	assert history.undo(layer) == []
+	assert not history.can_undo(layer)
+
+def test_commit_closes_changes_before_returning(font, layer):
+	transactions, clock = burst_transactions()
+	transactions.commit([(layer, topology_for(layer).nodes[:2])], font)
+	assert transactions.isOpen
+	assert font.updateInterfaceDisabled == 0
+	assert layer.changeDepth == 0
+
+def test_burst_ends_after_the_window(font, layer):
+	transactions, clock = burst_transactions()
+	nodes = topology_for(layer).nodes
+	transactions.commit([(layer, nodes[:1])], font)
+	clock.now += 1
+	transactions.commit([(layer, nodes[:2])], font)
+	assert history.undo(layer) == nodes[:1]
+
+def test_command_after_undo_in_the_same_burst_can_be_undone(font, layer):
+	transactions, clock = burst_transactions()
+	nodes = topology_for(layer).nodes
+	transactions.commit([(layer, nodes[:1])], font)
+	clock.now += 0.05
+	transactions.commit([(layer, history.undo(layer))], font, record=False)
+	assert layer.selection == []
+	clock.now += 0.05
+	transactions.commit([(layer, nodes[5:7])], font)
+	assert not history.can_redo(layer)
+	clock.now += 0.05
+	transactions.commit([(layer, history.undo(layer))], font, record=False)
+	assert layer.selection == []
+
+def test_redo_is_a_burst_of_its_own(font, layer):
+	transactions, clock = burst_transactions()
+	nodes = topology_for(layer).nodes
+	transactions.commit([(layer, nodes[:1])], font)
+	transactions.commit([(layer, history.undo(layer))], font, record=False)
+	transactions.commit([(layer, history.redo(layer))], font, record=False)
+	assert layer.selection == nodes[:1]
+	transactions.commit([(layer, nodes[:3])], font)
+	transactions.commit([(layer, history.undo(layer))], font, record=False)
+	assert layer.selection == nodes[:1]
+
+def test_every_commit_is_one_update_per_layer_and_one_redraw(font):
+	transactions, clock = burst_transactions()
+	layers = list(font.glyphs[0].layers)
+	for count in (1, 2):
+		transactions.commit([(layer, topology_for(layer).nodes[:count]) for layer in layers], font)
+	assert [layer.changeCount for layer in layers] == [2, 2]
+	assert font.interfaceUpdates == 2
+	assert transactions.stats["layerUpdates"] == 4
+	assert transactions.stats["redraws"] == 2
+	assert transactions.stats["bursts"] == 0
+	transactions.flush()
+	assert transactions.stats["bursts"] == 1